@@ -1,12 +1,26 @@
 # app.py
+import gc
+import time
+_start = time.perf_counter()
+
 from flask import Flask, jsonify
 from flask_cors import CORS
-from retriever import get_patient_info   # <-- you must implement this
+import config
+import metrics
+from retriever import get_patient_info, preload   # <-- you must implement this
 import os
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})  # ✅ Allow cross-origin (for React)
 
+# Models load lazily on first request unless PRELOAD_MODELS is set. Under
+# `gunicorn --preload` this runs once in the master; gc.freeze() keeps the loaded
+# objects out of GC passes so workers don't dirty (and copy) the shared pages.
+if config.PRELOAD_MODELS:
+    preload(warm_cache=config.WARM_SUGGESTION_CACHE)
+    gc.freeze()
+metrics.record_timing("app_startup_seconds", time.perf_counter() - _start)
+
 # -----------------------------
 # ROOT ROUTE
 # -----------------------------
@@ -14,6 +28,13 @@ CORS(app, resources={r"/*": {"origins": "*"}})  # ✅ Allow cross-origin (for Re
 def home():
     return "✅ Care Management API running on port 5001. Use /patient/<id> to get insights."
 
+# -----------------------------
+# STARTUP / MODEL LOAD METRICS
+# -----------------------------
+@app.route("/metrics", methods=["GET"])
+def startup_metrics():
+    return jsonify(metrics.snapshot())
+
 # -----------------------------
 # PATIENT INSIGHTS ROUTE
 # -----------------------------
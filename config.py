@@ -14,6 +14,15 @@ import os
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "pcsk_21v5L9_KcXSiqLsDwZLxMYdz5aHu6vvh9EtPAvLZDTBAQqGdwAKMEgPJ7GFsk1VGavdhh2")
 PINECONE_ENV = os.getenv("PINECONE_ENV", "us-east1-gcp")  # replace if needed
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "demo")
+PINECONE_MAX_CONCURRENCY = int(os.getenv("PINECONE_MAX_CONCURRENCY", "8"))  # parallel queries per batch
+
+# Vector store backend: "pinecone" (hosted) or "local" (on-disk numpy index, no network)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "vector_index")
+LOCAL_INDEX_MODE = os.getenv("LOCAL_INDEX_MODE", "flat").lower()  # flat (exact) | ivf | hnsw (needs faiss)
+IVF_NLIST = int(os.getenv("IVF_NLIST", "64"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
 
 # Embedding model (sentence-transformers)
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
@@ -30,6 +39,16 @@ CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
 # Retrieval config
 TOP_K = int(os.getenv("TOP_K", "4"))
 
+# Suggestion cache (per-disease suggestions, invalidated on re-index)
+USE_SUGGESTION_CACHE = os.getenv("USE_SUGGESTION_CACHE", "true").lower() in ("true", "1", "yes")
+SUGGESTION_CACHE_PATH = os.getenv("SUGGESTION_CACHE_PATH", "suggestion_cache.sqlite")
+
 # Generator model (optional local summarizer)
 GENERATIVE_MODEL = os.getenv("GENERATIVE_MODEL", "google/flan-t5-small")  # small & fast for demo
+GENERATOR_BATCH_SIZE = int(os.getenv("GENERATOR_BATCH_SIZE", "8"))  # prompts per padded generate call
 USE_LOCAL_GENERATOR = os.getenv("USE_LOCAL_GENERATOR", "true").lower() in ("true", "1", "yes")
+
+# Startup: load models at app import instead of on first request.
+# Combine with `gunicorn --preload app:app` so forked workers share the weights copy-on-write.
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "false").lower() in ("true", "1", "yes")
+WARM_SUGGESTION_CACHE = os.getenv("WARM_SUGGESTION_CACHE", "false").lower() in ("true", "1", "yes")
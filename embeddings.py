@@ -1,35 +1,20 @@
 """
-Index the cleaned medical text into Pinecone.
+Index the cleaned medical text into the configured vector store (Pinecone or local).
 Run this script once (or whenever you update the medical text).
 """
 
 import os
-import time
 from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone, ServerlessSpec
 import config 
+from suggestion_cache import SuggestionCache
+from vector_store import get_vector_store
 
 # Load embedding model
 print("Loading embedding model:", config.EMBEDDING_MODEL)
 embedder = SentenceTransformer(config.EMBEDDING_MODEL)
 
-# Initialize Pinecone client
-pc = Pinecone(api_key=config.PINECONE_API_KEY)
-
-# Check if index exists, else create
-if config.PINECONE_INDEX_NAME not in pc.list_indexes().names():
-    print(f"Creating index {config.PINECONE_INDEX_NAME} (dim={config.EMBEDDING_DIM}) ...")
-    pc.create_index(
-        name=config.PINECONE_INDEX_NAME,
-        dimension=config.EMBEDDING_DIM,
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-west-2")  # change region if needed
-    )
-    # Give Pinecone a moment
-    time.sleep(5)
-
-# Connect to index
-index = pc.Index(config.PINECONE_INDEX_NAME)
+# Connect to the vector store (creates the Pinecone index if it doesn't exist)
+index = get_vector_store(create=True, region="us-west-2") if config.VECTOR_BACKEND == "pinecone" else get_vector_store()
 
 
 def chunk_text(text, chunk_size=config.CHUNK_SIZE, overlap=config.CHUNK_OVERLAP):
@@ -74,6 +59,9 @@ def upload_chunks(file_path=config.MEDICAL_TEXT_PATH, batch_size=16):
         index.upsert(vectors=batch)
         print(f"Upserted {len(batch)} vectors (last id={batch[-1]['id']})")
 
+    index.flush()
+    # cached suggestions were built from the previous index contents
+    SuggestionCache(config.SUGGESTION_CACHE_PATH).bump_index_version()
     print("Indexing complete.")
 
 if __name__ == "__main__":
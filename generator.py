@@ -1,23 +1,44 @@
 from typing import List, Dict
+import threading
 import config
 import re
+from metrics import timed
 
 USE_LOCAL = config.USE_LOCAL_GENERATOR and config.GENERATIVE_MODEL
 
-# Lazy import to avoid heavy startup if not used
+# Lazy load: the model is built on first use (or via preload()), not at import
 generator_pipeline = None
 tokenizer_for_trunc = None
-if USE_LOCAL:
-    try:
-        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
-        print("Loading generator model:", config.GENERATIVE_MODEL)
-        tokenizer_for_trunc = AutoTokenizer.from_pretrained(config.GENERATIVE_MODEL)
-        model = AutoModelForSeq2SeqLM.from_pretrained(config.GENERATIVE_MODEL)
-        generator_pipeline = pipeline("text2text-generation", model=model, tokenizer=tokenizer_for_trunc, device=-1)
-    except Exception as e:
-        print("⚠️ Could not initialize local generator model:", e)
-        generator_pipeline = None
-        tokenizer_for_trunc = None
+_load_attempted = False
+_load_lock = threading.Lock()
+
+def get_generator_pipeline():
+    """Return the text2text pipeline, loading it once (thread-safe). None if disabled or failed."""
+    global generator_pipeline, tokenizer_for_trunc, _load_attempted
+    if _load_attempted:
+        return generator_pipeline
+    with _load_lock:
+        if _load_attempted:
+            return generator_pipeline
+        if USE_LOCAL:
+            try:
+                with timed("generator_model_load_seconds"):
+                    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
+                    print("Loading generator model:", config.GENERATIVE_MODEL)
+                    tokenizer = AutoTokenizer.from_pretrained(config.GENERATIVE_MODEL)
+                    model = AutoModelForSeq2SeqLM.from_pretrained(config.GENERATIVE_MODEL)
+                    generator_pipeline = pipeline("text2text-generation", model=model, tokenizer=tokenizer, device=-1)
+                    tokenizer_for_trunc = tokenizer
+            except Exception as e:
+                print("⚠️ Could not initialize local generator model:", e)
+                generator_pipeline = None
+                tokenizer_for_trunc = None
+        _load_attempted = True
+    return generator_pipeline
+
+def is_available() -> bool:
+    """True if the model is loaded, or enabled and not loaded yet (doesn't trigger a load)."""
+    return generator_pipeline is not None if _load_attempted else bool(USE_LOCAL)
 
 def clean_suggestions(text: str) -> str:
     """Remove duplicate lines and excessive repetition (preserve order)."""
@@ -63,40 +84,56 @@ def _shorten_context_by_chars(text: str, max_chars=1500) -> str:
         return text[:max_chars]
     return text[:cut+1]
 
-def summarize_context(disease: str, retrieved_texts: List[str], max_new_tokens=128) -> Dict:
-    """
-    Produces a structured summary dict:
-      { "disease": disease, "suggestion": "<string>", "source_chunks": retrieved_texts }
-    - Prefer model-based structured output (Diagnosis/Treatment/Prevention) on a SHORT context.
-    - If model missing or output is generic/garbled, fallback to extractive_fallback (original sentences).
-    """
+def _build_prompt(disease: str, retrieved_texts: List[str]) -> str:
     concatenated = "\n\n".join(retrieved_texts).strip()
     if not concatenated:
-        return {"disease": disease, "suggestion": "", "source_chunks": retrieved_texts}
+        return ""
 
     # Keep context short so model input tokens remain within model limits
     truncated_context = _shorten_context_by_chars(concatenated, max_chars=1500)
 
-    prompt = (
+    return (
         f"Using only the text in Context, extract concise bullets under three headers for '{disease}'.\n\n"
         f"Context:\n{truncated_context}\n\n"
         f"Output exactly like:\nDiagnosis:\n- point\nTreatment:\n- point\nPrevention:\n- point\n\n"
         f"Do NOT add information not present in the context. If a section lacks info, put 'Not available.'\n"
     )
 
+def _postprocess(generated: str, retrieved_texts: List[str]) -> str:
+    suggestion = clean_suggestions(generated.strip())
+    # quick sanity checks: if output is too short or contains placeholder 'Point', fallback
+    if (len(suggestion) < 20) or ("point 1" in suggestion.lower()) or ("- point" in suggestion.lower()):
+        suggestion = extractive_fallback(retrieved_texts)
+    return suggestion
+
+def _finalize(disease: str, suggestion: str, retrieved_texts: List[str]) -> Dict:
+    # final clean-up: avoid extremely long repetition
+    if len(suggestion) > 1200:
+        suggestion = suggestion[:1200] + "..."
+    return {"disease": disease, "suggestion": suggestion, "source_chunks": retrieved_texts}
+
+def summarize_context(disease: str, retrieved_texts: List[str], max_new_tokens=128) -> Dict:
+    """
+    Produces a structured summary dict:
+      { "disease": disease, "suggestion": "<string>", "source_chunks": retrieved_texts }
+    - Prefer model-based structured output (Diagnosis/Treatment/Prevention) on a SHORT context.
+    - If model missing or output is generic/garbled, fallback to extractive_fallback (original sentences).
+    """
+    prompt = _build_prompt(disease, retrieved_texts)
+    if not prompt:
+        return {"disease": disease, "suggestion": "", "source_chunks": retrieved_texts}
+
     suggestion = ""
-    if generator_pipeline:
+    pipe = get_generator_pipeline()
+    if pipe:
         try:
-            out = generator_pipeline(
+            out = pipe(
                 prompt,
                 max_new_tokens=max_new_tokens,
                 do_sample=False,
                 num_return_sequences=1
             )[0].get("generated_text", "")
-            suggestion = clean_suggestions(out.strip())
-            # quick sanity checks: if output is too short or contains placeholder 'Point', fallback
-            if (len(suggestion) < 20) or ("point 1" in suggestion.lower()) or ("- point" in suggestion.lower()):
-                suggestion = extractive_fallback(retrieved_texts)
+            suggestion = _postprocess(out, retrieved_texts)
         except Exception as e:
             # model error -> fallback extractive
             suggestion = f"(generator error) {e}\n\n" + extractive_fallback(retrieved_texts)
@@ -104,8 +141,55 @@ def summarize_context(disease: str, retrieved_texts: List[str], max_new_tokens=1
         # no model available — do extractive fallback
         suggestion = extractive_fallback(retrieved_texts)
 
-    # final clean-up: avoid extremely long repetition
-    if len(suggestion) > 1200:
-        suggestion = suggestion[:1200] + "..."
+    return _finalize(disease, suggestion, retrieved_texts)
 
-    return {"disease": disease, "suggestion": suggestion, "source_chunks": retrieved_texts}
+def _prompt_length(prompt: str) -> int:
+    if tokenizer_for_trunc is not None:
+        return len(tokenizer_for_trunc(prompt, truncation=False)["input_ids"])
+    return len(prompt)
+
+def summarize_many(disease_to_texts: Dict[str, List[str]], max_new_tokens=128,
+                   batch_size=config.GENERATOR_BATCH_SIZE) -> Dict[str, Dict]:
+    """
+    Batched summarize_context for several diseases: {disease: retrieved_texts} -> {disease: summary dict}.
+    Prompts are sorted by token length and grouped into padded batches of `batch_size`
+    so each generator_pipeline call pads to similar lengths. Post-processing and the
+    extractive fallback are the same as summarize_context, per item.
+    """
+    results = {}
+    prompts = {}
+    pipe = get_generator_pipeline()
+    for disease, texts in disease_to_texts.items():
+        prompt = _build_prompt(disease, texts)
+        if not prompt:
+            results[disease] = {"disease": disease, "suggestion": "", "source_chunks": texts}
+        elif not pipe:
+            results[disease] = _finalize(disease, extractive_fallback(texts), texts)
+        else:
+            prompts[disease] = prompt
+
+    # length bucketing: neighbours in this order have similar lengths
+    ordered = sorted(prompts, key=lambda d: _prompt_length(prompts[d]))
+    for start in range(0, len(ordered), max(1, batch_size)):
+        batch = ordered[start:start + batch_size]
+        try:
+            outputs = pipe(
+                [prompts[d] for d in batch],
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                num_return_sequences=1,
+                batch_size=len(batch)
+            )
+        except Exception as e:
+            for d in batch:
+                texts = disease_to_texts[d]
+                results[d] = _finalize(d, f"(generator error) {e}\n\n" + extractive_fallback(texts), texts)
+            continue
+        for d, out in zip(batch, outputs):
+            # pipeline returns [{...}] per input (or {...} when it unwraps single sequences)
+            if isinstance(out, list):
+                out = out[0] if out else {}
+            texts = disease_to_texts[d]
+            results[d] = _finalize(d, _postprocess(out.get("generated_text", ""), texts), texts)
+
+    return {d: results[d] for d in disease_to_texts}
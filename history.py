@@ -1,4 +1,5 @@
 import pandas as pd
+from snapshots import EventIndex, coverage_windows, label_snapshots, quarterly_index_dates
 
 # --- 1. LOAD DATA ---
 
@@ -11,13 +12,8 @@ inpatient_claims.rename(columns={'CLM_ADMSN_DT': 'admission_date'}, inplace=True
 
 # --- 2. APPROXIMATE ENROLLMENT DATES FROM COVERAGE MONTHS ---
 
-def approx_enrollment_dates(row, year=2008):
-    enroll_start = pd.Timestamp(f'{year}-01-01')
-    months_covered = row.get('BENE_HI_CVRAGE_TOT_MONS', 0)  # use your actual column
-    enroll_end = enroll_start + pd.Timedelta(days=months_covered * 30)
-    return pd.Series([enroll_start, enroll_end])
-
-beneficiaries[['coverage_start_date', 'coverage_end_date']] = beneficiaries.apply(approx_enrollment_dates, axis=1)
+# coverage_start_date = Jan 1, coverage_end_date = start + months * 30 days (computed column-wise)
+beneficiaries = coverage_windows(beneficiaries, year=2008, months_col='BENE_HI_CVRAGE_TOT_MONS')  # use your actual column
 
 # Filter to only beneficiaries with valid coverage (end after start)
 beneficiaries = beneficiaries[beneficiaries['coverage_end_date'] > beneficiaries['coverage_start_date']]
@@ -26,45 +22,24 @@ print(f'Valid beneficiaries after filtering coverage: {len(beneficiaries)}')
 
 # --- 3. GENERATE QUARTERLY INDEX DATES ---
 
-def generate_quarterly_index_dates(row):
-    start_date = row['coverage_start_date'] + pd.Timedelta(days=180)  # start 6 months after enrollment start
-    end_date = row['coverage_end_date']
-    if end_date < start_date:
-        return []
-    dates = []
-    current = start_date
-    while current <= end_date:
-        dates.append(current)
-        current += pd.Timedelta(days=90)
-    return dates
-
-index_date_rows = []
-for _, row in beneficiaries.iterrows():
-    q_dates = generate_quarterly_index_dates(row)
-    for d in q_dates:
-        index_date_rows.append({'DESYNPUF_ID': row['DESYNPUF_ID'], 'index_date': d})
-
-member_snapshots = pd.DataFrame(index_date_rows)
+# Index dates start 6 months after enrollment start and repeat every 90 days until coverage ends.
+# Built with np.repeat/arange; for very large populations use iter_quarterly_index_dates to stream chunks.
+member_snapshots = quarterly_index_dates(beneficiaries, start_offset_days=180, step_days=90)
 
 print(f'Number of member index dates generated: {len(member_snapshots)}')
 print(member_snapshots.head())
 
 # --- 4. LABEL CREATION ---
 
-def label_hospitalization(row):
-    member = row['DESYNPUF_ID']
-    idx_date = row['index_date']
-    window_end = idx_date + pd.Timedelta(days=90)
-    admissions = inpatient_claims[
-        (inpatient_claims['DESYNPUF_ID'] == member) &
-        (inpatient_claims['admission_date'] > idx_date) &
-        (inpatient_claims['admission_date'] <= window_end)
-    ]
-    return 1 if not admissions.empty else 0
+# Claims are sorted once by (member, admission_date); each label is then a searchsorted
+# lookup instead of a scan of inpatient_claims per snapshot (see snapshots.py).
+inpatient_events = EventIndex(inpatient_claims, date_col='admission_date')
 
 # Safety check for empty member_snapshots before applying
 if not member_snapshots.empty:
-    member_snapshots['label'] = member_snapshots.apply(label_hospitalization, axis=1)
+    # label = any admission in (index_date, index_date + 90 days]
+    member_snapshots = label_snapshots(member_snapshots, inpatient_events, forward_days=(90,), backward_days=())
+    member_snapshots = member_snapshots.rename(columns={'label_90d': 'label'}).drop(columns=['adm_next_90d'])
     print(member_snapshots.head())
 
     # Save output labeled data
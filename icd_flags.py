@@ -0,0 +1,131 @@
+"""
+Chronic-condition flags from ICD-9 diagnosis columns.
+
+A row gets HAS_<X> = 1 if any of its diagnosis codes starts with one of the
+condition's prefixes. Each condition is compiled to one anchored regex
+(^(?:428|398|402)) and all flags are emitted together from a single pass:
+
+  - pandas:  diagnosis columns are melted once, prefixes are matched on the
+             unique codes only, then broadcast back to rows
+  - polars:  one horizontal any() per condition, works on DataFrame or LazyFrame
+  - duckdb:  one projection over a relation (e.g. read_parquet('inpatient_*.parquet'))
+"""
+import re
+import numpy as np
+import pandas as pd
+
+# Diagnosis columns on SynPUF inpatient claims (carrier uses LINE_ICD9_DGNS_CD_1..13)
+DIAG_COLS = [f"ICD9_DGNS_CD_{i}" for i in range(1, 9)]
+
+# ICD-9 prefixes per chronic condition (examples; expand as needed)
+CONDITION_CODES = {
+    "HAS_ALZ": ["331", "290"],
+    "HAS_CHF": ["428", "398", "402"],
+    "HAS_KIDNEY": ["585"],
+    "HAS_CANCER": ["140", "141", "142"],
+    "HAS_COPD": ["490", "491", "492"],
+    "HAS_DIABETES": ["250"],
+    "HAS_IHD": ["410", "411", "412", "413", "414"],
+    "HAS_OSTEO": ["733"],
+    "HAS_RAO": ["714", "715"],
+    "HAS_STROKE": ["430", "431", "432"],
+}
+
+
+def condition_patterns(conditions=None):
+    """{flag: '^(?:p1|p2|...)'} regex per condition."""
+    conditions = conditions or CONDITION_CODES
+    return {
+        flag: "^(?:" + "|".join(re.escape(p) for p in prefixes) + ")"
+        for flag, prefixes in conditions.items()
+    }
+
+
+def flag_conditions_pandas(df, diag_cols=None, conditions=None):
+    diag_cols = [c for c in (diag_cols or DIAG_COLS) if c in df.columns]
+    patterns = condition_patterns(conditions)
+    n = len(df)
+    out = df.copy()
+    if not diag_cols or n == 0:
+        for flag in patterns:
+            out[flag] = 0
+        return out
+
+    # melt once: (row position, code) for every non-empty diagnosis cell
+    values = df[diag_cols].to_numpy(dtype=object).ravel()
+    rows = np.repeat(np.arange(n), len(diag_cols))
+    present = pd.notna(values)
+    codes = pd.Series(values[present]).astype(str).str.strip()
+    valid = ((codes != "") & (codes != "nan")).to_numpy()
+    codes, rows = codes[valid], rows[present][valid]
+
+    # match prefixes on the distinct codes only, then map back to rows
+    code_idx, uniques = pd.factorize(codes)
+    uniques = pd.Series(uniques, dtype=object)
+    for flag, pattern in patterns.items():
+        hit = uniques.str.match(pattern).to_numpy(dtype=bool)[code_idx]
+        out[flag] = (np.bincount(rows[hit], minlength=n) > 0).astype(int)
+    return out
+
+
+def flag_conditions_polars(frame, diag_cols=None, conditions=None):
+    import polars as pl
+
+    columns = frame.collect_schema().names() if isinstance(frame, pl.LazyFrame) else frame.columns
+    diag_cols = [c for c in (diag_cols or DIAG_COLS) if c in columns]
+    exprs = []
+    for flag, pattern in condition_patterns(conditions).items():
+        if diag_cols:
+            hit = pl.any_horizontal([
+                pl.col(c).cast(pl.Utf8).str.strip_chars().str.contains(pattern).fill_null(False)
+                for c in diag_cols
+            ])
+        else:
+            hit = pl.lit(False)
+        exprs.append(hit.cast(pl.Int8).alias(flag))
+    return frame.with_columns(exprs)
+
+
+def duckdb_flag_expressions(diag_cols=None, conditions=None):
+    """{flag: SQL expression} for the flags."""
+    diag_cols = diag_cols or DIAG_COLS
+    exprs = {}
+    for flag, pattern in condition_patterns(conditions).items():
+        tests = " OR ".join(
+            f"COALESCE(regexp_matches(TRIM(CAST({c} AS VARCHAR)), '{pattern}'), FALSE)"
+            for c in diag_cols
+        ) or "FALSE"
+        exprs[flag] = f"CAST(({tests}) AS INTEGER)"
+    return exprs
+
+
+def flag_conditions_duckdb(relation, diag_cols=None, conditions=None):
+    diag_cols = [c for c in (diag_cols or DIAG_COLS) if c in relation.columns]
+    exprs = duckdb_flag_expressions(diag_cols, conditions)
+    # flags already on the input are overwritten in place (like the pandas / polars paths)
+    replaced = [f"{expr} AS {flag}" for flag, expr in exprs.items() if flag in relation.columns]
+    added = [f"{expr} AS {flag}" for flag, expr in exprs.items() if flag not in relation.columns]
+    star = f"* REPLACE ({', '.join(replaced)})" if replaced else "*"
+    return relation.project(", ".join([star] + added))
+
+
+def flag_parquet(in_path, out_path, diag_cols=None, conditions=None):
+    """Stream a claims Parquet file (or glob) through DuckDB and write it back with the HAS_* flags."""
+    import duckdb
+
+    con = duckdb.connect()
+    try:
+        rel = con.read_parquet(str(in_path))
+        flag_conditions_duckdb(rel, diag_cols, conditions).write_parquet(str(out_path), compression="zstd")
+    finally:
+        con.close()
+
+
+def flag_conditions(data, diag_cols=None, conditions=None):
+    """Add all HAS_* flags to a pandas DataFrame, polars (Lazy)Frame or DuckDB relation."""
+    module = type(data).__module__
+    if module.startswith("polars"):
+        return flag_conditions_polars(data, diag_cols, conditions)
+    if "duckdb" in module:
+        return flag_conditions_duckdb(data, diag_cols, conditions)
+    return flag_conditions_pandas(data, diag_cols, conditions)
@@ -1,16 +1,15 @@
 # ingest.py
 import os
-from pinecone import Pinecone, ServerlessSpec
 from sentence_transformers import SentenceTransformer
 from config import (
-    PINECONE_API_KEY,
-    PINECONE_INDEX_NAME,
     EMBEDDING_MODEL,
-    EMBEDDING_DIM,
     MEDICAL_TEXT_PATH,
     CHUNK_SIZE,
-    CHUNK_OVERLAP
+    CHUNK_OVERLAP,
+    SUGGESTION_CACHE_PATH
 )
+from suggestion_cache import SuggestionCache
+from vector_store import get_vector_store
 
 # -----------------------------
 # Helper: split text into chunks
@@ -27,27 +26,16 @@ def chunk_text(text, chunk_size=450, overlap=50):
     return chunks
 
 # -----------------------------
-# Step 1: Load model & Pinecone
+# Step 1: Load model
 # -----------------------------
 print("Loading embedding model...")
 embedder = SentenceTransformer(EMBEDDING_MODEL)
 
-print("Connecting to Pinecone...")
-pc = Pinecone(api_key=PINECONE_API_KEY)
-
 # -----------------------------
-# Step 2: Create index (if not exists)
+# Step 2: Connect vector store (creates the Pinecone index if it doesn't exist)
 # -----------------------------
-if PINECONE_INDEX_NAME not in pc.list_indexes().names():
-    print(f"Creating Pinecone index: {PINECONE_INDEX_NAME}")
-    pc.create_index(
-        name=PINECONE_INDEX_NAME,
-        dimension=EMBEDDING_DIM,
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1")  # change region if needed
-    )
-
-index = pc.Index(PINECONE_INDEX_NAME)
+print("Connecting to vector store...")
+index = get_vector_store(create=True)
 
 # -----------------------------
 # Step 3: Load medical text and embed
@@ -62,15 +50,19 @@ print(f"Total chunks created: {len(chunks)}")
 # -----------------------------
 # Step 4: Upsert embeddings
 # -----------------------------
-print("Generating embeddings and uploading to Pinecone...")
+print("Generating embeddings and uploading to vector store...")
 vectors = []
 for i, chunk in enumerate(chunks):
     emb = embedder.encode(chunk).tolist()
     vectors.append((f"chunk-{i}", emb, {"text": chunk}))
 
-# Batch upload to Pinecone
+# Batch upload
 for i in range(0, len(vectors), 100):
     batch = vectors[i:i+100]
     index.upsert(batch)
+index.flush()
+
+# Invalidate suggestions cached against the old index
+SuggestionCache(SUGGESTION_CACHE_PATH).bump_index_version()
 
-print("✅ Ingestion complete! Data is now stored in Pinecone.")
+print("✅ Ingestion complete! Data is now stored in the vector store.")
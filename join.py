@@ -1,4 +1,5 @@
 import pandas as pd
+from snapshots import EventIndex, materialize_features
 
 # --- 1. LOAD ALL DATASETS ---
 
@@ -62,21 +63,15 @@ member_snapshots = pd.read_csv(labeled_snapshots_file, parse_dates=['index_date'
 
 df = member_snapshots.merge(beneficiaries, on='DESYNPUF_ID', how='left')
 
-# --- 3. EXTRACT INPATIENT ADMISSION COUNT IN PAST 6 MONTHS FOR EACH SNAPSHOT ---
+# --- 3. POINT-IN-TIME INPATIENT FEATURES FOR EACH SNAPSHOT ---
 
-def count_inpatient_admissions(row):
-    member_id = row['DESYNPUF_ID']
-    idx_date = row['index_date']
-    lookback_start = idx_date - pd.Timedelta(days=180)  # 6 months lookback
-
-    past_admissions = inpatient_claims[
-        (inpatient_claims['DESYNPUF_ID'] == member_id) &
-        (inpatient_claims['admission_date'] >= lookback_start) &
-        (inpatient_claims['admission_date'] < idx_date)
-    ]
-    return past_admissions.shape[0]
-
-df['past_6mo_inpatient_adm_count'] = df.apply(count_inpatient_admissions, axis=1)
+# Only admissions in [index_date - w, index_date) are used, so nothing leaks from the label
+# window. Counts, paid amounts and days since last admission come from one sorted index
+# with prefix sums over all snapshots at once (see snapshots.py); the online path calls
+# snapshots.features_as_of with the same EventIndex to get identical values for today.
+inpatient_events = EventIndex(inpatient_claims, date_col='admission_date', value_cols=['CLM_PMT_AMT'])
+df = materialize_features(df, {'ip': inpatient_events}, windows=(30, 90, 180, 365))
+df['past_6mo_inpatient_adm_count'] = df['ip_count_180d']
 
 # --- 4. INSPECT RESULT ---
 
@@ -0,0 +1,28 @@
+"""
+Process-level timing metrics (model load times, app startup) exposed by app.py at /metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+timings = {}
+
+
+def record_timing(name, seconds):
+    with _lock:
+        timings[name] = round(float(seconds), 4)
+
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - start)
+
+
+def snapshot():
+    with _lock:
+        return dict(timings)
@@ -0,0 +1,78 @@
+"""
+In-memory patient index over the combined features CSV.
+The CSV is parsed once and re-parsed only when the file's mtime changes.
+"""
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+
+class PatientStore:
+    """
+    Holds the patient CSV in memory with:
+      - a hash index DESYNPUF_ID -> row position (first occurrence wins)
+      - the disease flag columns bit-packed into a (n_rows, ceil(n_flags/8)) uint8 array
+    Lookups are O(1); the file is stat'ed on each call and reloaded if it changed.
+    """
+
+    def __init__(self, path, flag_cols):
+        self.path = path
+        self.flag_cols = list(flag_cols)
+        self._lock = threading.Lock()
+        self._mtime = None
+        # (df, index, flag_bits) swapped as one tuple so readers never see a half-reload
+        self._state = (None, {}, np.zeros((0, 0), dtype=np.uint8))
+
+    def _load(self):
+        df = pd.read_csv(self.path, dtype=str)
+        flags = np.zeros((len(df), len(self.flag_cols)), dtype=bool)
+        for j, col in enumerate(self.flag_cols):
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
+                flags[:, j] = df[col].to_numpy() == 1
+
+        ids = df["DESYNPUF_ID"].astype(str).tolist()
+        # iterate in reverse so the first row for a duplicated ID is the one kept
+        index = {pid: i for i, pid in reversed(list(enumerate(ids)))}
+
+        self._state = (df, index, np.packbits(flags, axis=1, bitorder="little"))
+
+    def _snapshot(self):
+        self._ensure_fresh()
+        return self._state
+
+    def _ensure_fresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Patient CSV not found at {self.path}")
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime != self._mtime:
+                self._load()
+                self._mtime = mtime
+
+    def __len__(self):
+        return len(self._snapshot()[1])
+
+    def __contains__(self, desynpuf_id):
+        return str(desynpuf_id) in self._snapshot()[1]
+
+    def get_row(self, desynpuf_id):
+        """Return the patient row as a dict, or None if the ID is unknown."""
+        df, index, _ = self._snapshot()
+        pos = index.get(str(desynpuf_id))
+        if pos is None:
+            return None
+        return df.iloc[pos].to_dict()
+
+    def get_flags(self, desynpuf_id):
+        """Return the list of flag columns set to 1 for the patient, or None if unknown."""
+        _, index, bits = self._snapshot()
+        pos = index.get(str(desynpuf_id))
+        if pos is None:
+            return None
+        row = np.unpackbits(bits[pos], count=len(self.flag_cols), bitorder="little")
+        return [col for col, bit in zip(self.flag_cols, row) if bit]
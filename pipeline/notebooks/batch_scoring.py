@@ -0,0 +1,173 @@
+"""
+Vectorized batch scoring for the risk models trained in tg.py.
+
+Instead of one predict / SHAP / plot call per member:
+  - every model predicts the whole feature matrix in one call
+  - SHAP values are computed for the whole matrix (in chunks to bound memory)
+  - top drivers come from an argsort over |SHAP|, stories are assembled column-wise
+  - figures are optional: SHAP values are stored with the scores, so a waterfall can be
+    rendered later for just the members someone opens (render_figures)
+  - results are written as Parquet partitioned by predicted tier
+
+    scores = score_population(df, {"Risk_30": xgb30, "Risk_60": xgb60, "Risk_90": xgb90},
+                              FEATURES, tier_model=xgbTier,
+                              explainers={"Risk_30": shap_explainer_30, ...})
+    write_scores(scores, os.path.join(ARTIFACT_DIR, "predictions"))
+"""
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+SHAP_PREFIX = "shap__"
+
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+def _short(name):
+    """'Risk_30' -> 'Risk30' (column suffix used by tg.predict_and_explain_by_id)."""
+    return name.replace("_", "")
+
+
+def _horizon_label(name):
+    digits = "".join(ch for ch in name if ch.isdigit())
+    return f"{digits}-day" if digits else name
+
+
+def _format_column(feature, values):
+    """Same value formatting as tg.top_shap_phrases, applied to a whole column."""
+    if "visit" in feature or "severity" in feature:
+        return np.array([f"{v:.0f}" for v in values], dtype=object)
+    if "comorbidity" in feature or "persistent" in feature:
+        return np.array([f"{int(v)}" for v in values], dtype=object)
+    return np.array([f"{v}" for v in values], dtype=object)
+
+
+def shap_matrix(explainer, X, chunk_size=50_000):
+    """SHAP values for every row of X as an (n_rows, n_features) array."""
+    parts = []
+    for start in range(0, len(X), chunk_size):
+        sv = explainer(X.iloc[start:start + chunk_size], check_additivity=False)
+        parts.append(np.asarray(sv.values if hasattr(sv, "values") else sv))
+    return np.vstack(parts) if parts else np.zeros((0, X.shape[1]))
+
+
+def driver_phrases(shap_vals, X, features, friendly=None, k=5):
+    """(n_rows, k) array of 'Name = value (increases risk)' phrases for the top-|SHAP| features."""
+    friendly = friendly or {}
+    names = np.array([friendly.get(f, f.replace("_", " ")) for f in features], dtype=object)
+    # X.to_numpy() upcasts like X_row.iloc[0] does in the per-row path, so values print the same
+    values = X.to_numpy()
+    formatted = np.column_stack([_format_column(f, values[:, j]) for j, f in enumerate(features)])
+
+    k = min(k, len(features))
+    top = np.argsort(-np.abs(shap_vals), axis=1, kind="stable")[:, :k]
+    rows = np.arange(len(X))[:, None]
+    direction = np.where(shap_vals[rows, top] > 0, "increases", "decreases")
+    return names[top] + " = " + formatted[rows, top] + " (" + direction + " risk)"
+
+
+def _join_rows(phrases, sep):
+    return np.array([sep.join(p) for p in phrases], dtype=object)
+
+
+# -----------------------------
+# SCORING
+# -----------------------------
+def score_population(df, regressors, features, tier_model=None, explainers=None,
+                     id_col="DESYNPUF_ID", friendly=None, tier_actions=None, k=5,
+                     chunk_size=50_000, keep_shap=True):
+    """
+    Score every row of df. Returns one row per member with the same columns as
+    tg.predict_and_explain_by_id (Pred_Risk_*, Pred_Tier, Top_Drivers_*, SHAP_Story_*,
+    Recommended_Action) plus shap__<model>__<feature> columns when keep_shap is set.
+    Waterfall_*_Path columns stay empty until render_figures is called.
+    """
+    explainers = explainers or {}
+    X = df[features]
+    out = pd.DataFrame({"Beneficiary_ID": df[id_col].to_numpy()})
+
+    for name, model in regressors.items():
+        out[f"Pred_{name}"] = np.round(model.predict(X).astype(float), 2)
+    if tier_model is not None:
+        out["Pred_Tier"] = np.asarray(tier_model.predict(X)).astype(int)
+
+    # story note used by tg.build_shap_story
+    new_2010 = X["new_comorbidities_2010"].fillna(0).astype(int).to_numpy() if "new_comorbidities_2010" in X else np.zeros(len(X), int)
+    note = np.where(
+        new_2010 > 0,
+        "Notably, the patient has " + new_2010.astype(str) + " new diagnosis(es) in 2010 which raises near-term risk. ",
+        "",
+    ).astype(object)
+
+    for name, explainer in explainers.items():
+        sv = shap_matrix(explainer, X, chunk_size)
+        phrases = driver_phrases(sv, X, features, friendly, k)
+        short = _short(name)
+        out[f"Top_Drivers_{short}"] = _join_rows(phrases, " | ")
+        story = (f"For the {_horizon_label(name)} window, the model predicts risk primarily driven by: "
+                 + _join_rows(phrases, "; ") + ". " + note)
+        out[f"SHAP_Story_{short}"] = pd.Series(story).str.strip().to_numpy()
+        out[f"Waterfall_{short}_Path"] = None
+        if keep_shap:
+            for j, f in enumerate(features):
+                out[f"{SHAP_PREFIX}{name}__{f}"] = sv[:, j]
+
+    if tier_actions is not None and "Pred_Tier" in out:
+        actions = {t: "; ".join(a) for t, a in tier_actions.items()}
+        out["Recommended_Action"] = out["Pred_Tier"].map(actions).fillna(actions.get(0, ""))
+    return out
+
+
+# -----------------------------
+# OUTPUT
+# -----------------------------
+def write_scores(scores, out_dir, partition_cols=("Pred_Tier",)):
+    """
+    Write scores as a Parquet dataset partitioned by tier. The dataset is written to a temp
+    directory and swapped in, so it holds exactly this run's partitions (a tier with no
+    members this time does not keep last run's files).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    partition_cols = [c for c in partition_cols if c in scores.columns]
+    out_dir = os.path.abspath(out_dir)
+    tmp_dir = f"{out_dir}.{os.getpid()}.tmp"
+    old_dir = f"{out_dir}.{os.getpid()}.old"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    pq.write_to_dataset(
+        pa.Table.from_pandas(scores, preserve_index=False),
+        root_path=tmp_dir,
+        partition_cols=partition_cols or None,
+    )
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return out_dir
+
+
+def render_figures(scores, features, make_figure, models=None, ids=None, explainers=None):
+    """
+    Render waterfalls only for the requested members (default: all) and fill the
+    Waterfall_*_Path columns. make_figure(shap_row, bene_id, model_name) -> path, e.g.
+    tg.make_waterfall with an Explanation built from the stored shap__ columns.
+    """
+    import shap
+
+    models = models or [c[len("Pred_"):] for c in scores.columns if c.startswith("Pred_Risk")]
+    rows = scores if ids is None else scores[scores["Beneficiary_ID"].isin(ids)]
+    for name in models:
+        cols = [f"{SHAP_PREFIX}{name}__{f}" for f in features]
+        if not set(cols) <= set(scores.columns):
+            continue
+        base = None
+        if explainers and name in explainers:
+            base = float(np.ravel(explainers[name].expected_value)[0])
+        for i, row in rows.iterrows():
+            explanation = shap.Explanation(values=row[cols].to_numpy(dtype=float),
+                                           base_values=base, feature_names=features)
+            scores.at[i, f"Waterfall_{_short(name)}_Path"] = make_figure(explanation, row["Beneficiary_ID"], name)
+    return scores
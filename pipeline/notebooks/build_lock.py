@@ -0,0 +1,59 @@
+"""
+Cross-process "single builder" lock for derived files (risk table, member store sidecars).
+
+Every Flask worker notices a changed feature store at about the same time; only the one
+that creates the lock file rebuilds, the others keep serving what they have and pick up
+the result once it has been renamed into place.
+
+    with exclusive_build(path + ".lock") as owner:
+        if owner:
+            build()
+"""
+import os
+import time
+from contextlib import contextmanager
+
+
+def _acquire(lock_path, stale_after):
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            age = time.time() - os.stat(lock_path).st_mtime
+        except OSError:
+            return False
+        if age < stale_after:
+            return False
+        # left behind by a builder that died: take it over
+        try:
+            os.unlink(lock_path)
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError:
+            return False
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    return True
+
+
+@contextmanager
+def exclusive_build(lock_path, stale_after=3600):
+    """Yields True in the one process that should build, False in every other one."""
+    owner = _acquire(lock_path, stale_after)
+    try:
+        yield owner
+    finally:
+        if owner:
+            try:
+                os.unlink(lock_path)
+            except OSError:
+                pass
+
+
+def wait_for_release(lock_path, timeout=300, poll=0.5):
+    """Block until no build holds lock_path (or timeout); returns True if released."""
+    deadline = time.monotonic() + timeout
+    while os.path.exists(lock_path):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(poll)
+    return True
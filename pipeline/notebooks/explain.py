@@ -0,0 +1,182 @@
+"""
+Per-request SHAP explanations without rebuilding an explainer every call.
+
+ModelExplainer wraps one fitted tree model and is meant to be created once at startup:
+  - XGBoost  → Booster.predict(DMatrix, pred_contribs=True)   (native TreeSHAP)
+  - LightGBM → predict(X, pred_contrib=True)                  (native TreeSHAP)
+  - anything else → a shap.TreeExplainer built once and reused
+
+explain() returns a shap.Explanation, so existing consumers keep working:
+build_story (see/ui.py), top_shap_phrases / make_waterfall (tg.py), shap.plots.*.
+top_drivers() gives the top-k {feature, shap_value, feature_value} list those stories are built from.
+
+    explainers = {"Risk_30": ModelExplainer(xgb30, FEATURES), ...}
+    sv = explainers["Risk_30"].explain(X)          # X: DataFrame with FEATURES columns
+    drivers = top_drivers(sv[0], k=5)
+
+Latency per model (rebuild-per-call vs cached TreeExplainer vs native contributions):
+    python pipeline/notebooks/explain.py <artifact_dir> [--runs 50]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+import shap
+
+
+# -----------------------------
+# BACKENDS
+# -----------------------------
+def _backend(model):
+    module = type(model).__module__
+    if module.startswith("xgboost"):
+        return "xgboost"
+    if module.startswith("lightgbm"):
+        return "lightgbm"
+    return "shap"
+
+
+def _xgb_contribs(model, X):
+    import xgboost as xgb
+
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    out = booster.predict(xgb.DMatrix(X), pred_contribs=True)
+    # (n, F+1) for one output, (n, C, F+1) for multiclass; last column is the bias
+    return out if out.ndim == 3 else out[:, None, :]
+
+
+def _lgb_contribs(model, X):
+    booster = getattr(model, "booster_", model)
+    out = np.asarray(booster.predict(X, pred_contrib=True))
+    n_features = X.shape[1]
+    # multiclass comes back as (n, C * (F+1)), grouped by class
+    return out.reshape(len(X), -1, n_features + 1)
+
+
+class ModelExplainer:
+    """One tree model + the fastest available SHAP path for it."""
+
+    def __init__(self, model, feature_names=None, method="auto"):
+        self.model = model
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.method = _backend(model) if method == "auto" else method
+        self._tree_explainer = shap.TreeExplainer(model) if self.method == "shap" else None
+
+    def _frame(self, X):
+        if isinstance(X, pd.DataFrame):
+            return X[self.feature_names] if self.feature_names else X
+        return pd.DataFrame(np.atleast_2d(X), columns=self.feature_names)
+
+    def contributions(self, X):
+        """SHAP values as (n, C, F) plus base values (n, C); C = 1 for single-output models."""
+        X = self._frame(X)
+        if self.method == "xgboost":
+            out = _xgb_contribs(self.model, X)
+            return out[:, :, :-1], out[:, :, -1]
+        if self.method == "lightgbm":
+            out = _lgb_contribs(self.model, X)
+            return out[:, :, :-1], out[:, :, -1]
+
+        values = self._tree_explainer.shap_values(X, check_additivity=False)
+        if isinstance(values, list):                    # older shap: one (n, F) array per class
+            values = np.stack(values, axis=1)
+        elif values.ndim == 3:                          # newer shap: (n, F, C)
+            values = values.transpose(0, 2, 1)
+        else:
+            values = values[:, None, :]
+        base = np.broadcast_to(np.ravel(self._tree_explainer.expected_value), values.shape[:2])
+        return values, np.array(base, dtype=float)
+
+    def explain(self, X, class_index=None):
+        """
+        shap.Explanation for the rows of X. For multiclass models pass class_index
+        (an int, or "predicted" for each row's predicted class); otherwise all classes
+        are returned as (n, F, C) like shap does.
+        """
+        X = self._frame(X)
+        values, base = self.contributions(X)
+        if values.shape[1] == 1:
+            values, base = values[:, 0, :], base[:, 0]
+        elif class_index is not None:
+            if class_index == "predicted":
+                proba = self.model.predict_proba(X) if hasattr(self.model, "predict_proba") else None
+                cls = np.argmax(proba, axis=1) if proba is not None else np.asarray(self.model.predict(X)).astype(int)
+            else:
+                cls = np.full(len(X), int(class_index))
+            rows = np.arange(len(X))
+            values, base = values[rows, cls, :], base[rows, cls]
+        else:
+            values = values.transpose(0, 2, 1)
+        return shap.Explanation(values=values, base_values=base,
+                                data=X.to_numpy(), feature_names=list(X.columns))
+
+
+def top_drivers(explanation, k=5):
+    """Top-k features of one row by |SHAP|, largest first (same order as build_story)."""
+    vals = np.asarray(explanation.values).ravel()
+    data = np.asarray(explanation.data).ravel() if explanation.data is not None else [None] * len(vals)
+    idx = np.argsort(np.abs(vals))[-k:][::-1]
+    return [
+        {"feature": explanation.feature_names[i], "shap_value": float(vals[i]), "feature_value": data[i]}
+        for i in idx
+    ]
+
+
+# -----------------------------
+# BENCHMARK
+# -----------------------------
+def _median_ms(fn, runs):
+    fn()  # warm-up
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return round(statistics.median(times) * 1000, 3)
+
+
+def benchmark(models, X, runs=50):
+    """Median single-row latency (ms) per model for each explanation path."""
+    row = X.iloc[[0]]
+    results = {}
+    for name, model in models.items():
+        cached = ModelExplainer(model, list(X.columns), method="shap")
+        fast = ModelExplainer(model, list(X.columns))
+        results[name] = {
+            "rebuild_per_call": _median_ms(lambda: shap.TreeExplainer(model)(row, check_additivity=False), runs),
+            "cached_tree_explainer": _median_ms(lambda: cached.explain(row), runs),
+            f"native_{fast.method}": _median_ms(lambda: fast.explain(row), runs),
+        }
+    return results
+
+
+def main():
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Benchmark SHAP explanation paths for the saved risk models.")
+    parser.add_argument("artifact_dir", help="directory with test_xgb_risk*.joblib and test_features.json")
+    parser.add_argument("--runs", type=int, default=50, help="calls per path (median is reported)")
+    args = parser.parse_args()
+
+    with open(os.path.join(args.artifact_dir, "test_features.json")) as f:
+        features = json.load(f)
+    models = {h: joblib.load(os.path.join(args.artifact_dir, f"test_xgb_risk{h}.joblib")) for h in (30, 60, 90)}
+    X = pd.DataFrame(np.zeros((1, len(features))), columns=features)
+
+    results = benchmark({f"Risk_{h}": m for h, m in models.items()}, X, args.runs)
+    for name, paths in results.items():
+        print(name)
+        for path, ms in paths.items():
+            print(f"  {path:<24}{ms:>10} ms")
+    out = os.path.join(args.artifact_dir, f"bench_explain_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
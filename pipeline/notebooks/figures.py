@@ -0,0 +1,168 @@
+"""
+SHAP figures rendered off the request path.
+
+FigureService.submit() returns the PNG filename straight away and renders the plot on a
+background thread pool. Files are content-addressed by (model version, feature vector,
+title), so a member seen before is served from disk without rendering again; the title is
+part of the key because it is drawn into the image (tg.py puts the member id in it):
+
+    <fig_dir>/<kind>_<label>_<sha1(model version + features + title)[:20]>.png
+
+Drawing uses the object-oriented matplotlib API (Figure + Agg canvas, no pyplot), which
+is safe to run from several threads at once, unlike pyplot's global state machine.
+
+    figures = FigureService(FIG_DIR, model_version=model_version(path_to_model))
+    name = figures.submit("bar", explanation_row, X.iloc[0], label="Risk30")
+    ...
+    path = figures.wait(name)     # /figs/<name>: blocks only while the figure is still rendering
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+POS_COLOR = "#ff0051"   # shap's red / blue
+NEG_COLOR = "#008bfb"
+
+
+def model_version(*paths):
+    """Short hash of the model files, so figures are invalidated when a model is retrained."""
+    h = hashlib.sha1()
+    for p in paths:
+        with open(p, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:12]
+
+
+def figure_key(version, feature_values, title=None):
+    values = np.ascontiguousarray(np.asarray(feature_values, dtype=float))
+    return hashlib.sha1(version.encode() + values.tobytes() + (title or "").encode()).hexdigest()[:20]
+
+
+# -----------------------------
+# DRAWING (object-oriented API)
+# -----------------------------
+def _top(values, names, max_display):
+    idx = np.argsort(np.abs(values))[::-1]
+    shown = idx[:max_display]
+    rest = values[idx[max_display:]].sum() if len(idx) > max_display else None
+    return shown, rest
+
+
+def draw_bar(ax, values, names, data=None, max_display=10):
+    shown, rest = _top(values, names, max_display)
+    labels = [names[i] if data is None else f"{names[i]} = {data[i]:g}" for i in shown]
+    vals = list(values[shown])
+    if rest is not None:
+        labels.append(f"{len(values) - len(shown)} other features")
+        vals.append(rest)
+    y = np.arange(len(vals))[::-1]
+    ax.barh(y, vals, color=[POS_COLOR if v > 0 else NEG_COLOR for v in vals])
+    ax.set_yticks(y, labels)
+    ax.axvline(0, color="#999999", linewidth=0.8)
+    ax.set_xlabel("SHAP value (impact on model output)")
+
+
+def draw_waterfall(ax, values, names, base_value, data=None, max_display=10):
+    shown, rest = _top(values, names, max_display)
+    order = list(shown[::-1])                       # smallest impact first, from E[f(x)] upwards
+    labels = [names[i] if data is None else f"{names[i]} = {data[i]:g}" for i in order]
+    vals = [values[i] for i in order]
+    if rest is not None:
+        labels.insert(0, f"{len(values) - len(shown)} other features")
+        vals.insert(0, rest)
+
+    start = float(base_value)
+    for y, v in enumerate(vals):
+        ax.barh(y, v, left=start, color=POS_COLOR if v > 0 else NEG_COLOR)
+        ax.text(start + v, y, f" {v:+.2f}", va="center", ha="left" if v > 0 else "right", fontsize=8)
+        start += v
+    ax.set_yticks(np.arange(len(vals)), labels)
+    ax.margins(x=0.15)                              # room for the value labels
+    ax.axvline(float(base_value), color="#999999", linestyle="--", linewidth=0.8)
+    ax.axvline(start, color="#333333", linewidth=0.8)
+    ax.set_xlabel(f"E[f(x)] = {float(base_value):.2f}  →  f(x) = {start:.2f}")
+
+
+def render(path, kind, values, names, base_value=0.0, data=None, title=None, max_display=10):
+    """Render one plot to path (written to a temp file first, then renamed into place)."""
+    fig = Figure(figsize=(8, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    if kind == "waterfall":
+        draw_waterfall(ax, values, names, base_value, data, max_display)
+    else:
+        draw_bar(ax, values, names, data, max_display)
+    if title:
+        ax.set_title(title)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    fig.savefig(tmp, dpi=150, bbox_inches="tight", format="png")
+    os.replace(tmp, path)
+    return path
+
+
+# -----------------------------
+# SERVICE
+# -----------------------------
+class FigureService:
+    def __init__(self, fig_dir, model_version="", max_workers=2, friendly_names=None):
+        self.fig_dir = fig_dir
+        self.model_version = model_version
+        self.friendly_names = friendly_names or {}
+        os.makedirs(fig_dir, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="figures")
+        self._pending = {}
+        self._lock = threading.RLock()   # add_done_callback runs inline if the render already finished
+
+    def filename(self, kind, feature_values, label="", title=None):
+        return f"{kind}_{label + '_' if label else ''}{figure_key(self.model_version, feature_values, title)}.png"
+
+    def submit(self, kind, explanation, feature_values=None, label="", title=None):
+        """
+        Queue a "bar" or "waterfall" plot for one explained row and return its filename.
+        Nothing is rendered when the file is already on disk or already queued.
+        feature_values defaults to explanation.data (or the SHAP values when there is none).
+        """
+        if feature_values is None:
+            feature_values = explanation.data if explanation.data is not None else explanation.values
+        name = self.filename(kind, feature_values, label, title)
+        path = os.path.join(self.fig_dir, name)
+        with self._lock:
+            if name in self._pending or os.path.exists(path):
+                return name
+            values = np.asarray(explanation.values, dtype=float).ravel()
+            names = [self.friendly_names.get(f, f) for f in explanation.feature_names]
+            data = None if explanation.data is None else np.asarray(explanation.data, dtype=float).ravel()
+            base = float(np.ravel(explanation.base_values)[0]) if explanation.base_values is not None else 0.0
+            future = self._pool.submit(render, path, kind, values, names, base, data, title)
+            self._pending[name] = future
+            future.add_done_callback(lambda _: self._done(name))
+        return name
+
+    def _done(self, name):
+        with self._lock:
+            self._pending.pop(name, None)
+
+    def status(self, name):
+        with self._lock:
+            if name in self._pending:
+                return "pending"
+        return "ready" if os.path.exists(os.path.join(self.fig_dir, name)) else "missing"
+
+    def wait(self, name, timeout=10):
+        """Path of a figure once rendered (waits for a queued render), or None if unknown / failed."""
+        with self._lock:
+            future = self._pending.get(name)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception as e:
+                print(f"⚠️ Figure {name} failed: {e}")
+                return None
+        path = os.path.join(self.fig_dir, name)
+        return path if os.path.exists(path) else None
@@ -0,0 +1,113 @@
+"""
+Append-only store for patients scored from uploaded CSVs (see/ui.py /predict).
+
+Every scored row is appended to one SQLite table instead of rewriting
+beneficiary_with_labels.csv, so an upload of thousands of members costs one INSERT batch.
+Writers are serialized by a lock (SQLite allows a single writer); WAL mode lets readers
+run while an upload is being appended. The newest row per id wins on lookup.
+
+Which ids were uploaded (and when) is also kept in memory, so the /predict hot path can
+ask uploaded_at(id) without touching SQLite; rows appended by other worker processes are
+picked up when the database files change.
+
+    uploads = UploadStore(os.path.join(ARTIFACT_DIR, "uploaded_patients.sqlite"))
+    uploads.append(records, results)     # engineered input rows + /predict results
+    uploads.uploaded_at("new_patient_42")        # time of the newest upload, or None
+    record = uploads.latest("new_patient_42")    # dict (input + result columns) or None
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+RESULT_COLUMNS = ["Risk_30", "Risk_60", "Risk_90", "Tier"]
+
+
+def _json_default(value):
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class UploadStore:
+    def __init__(self, db_path, table="uploaded_patients", key="DESYNPUF_ID"):
+        self.db_path = db_path
+        self.table = table
+        self.key = key
+        self._lock = threading.Lock()
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table}" ('
+                f'"{key}" TEXT, uploaded_at REAL, Risk_30 REAL, Risk_60 REAL, Risk_90 REAL, '
+                f'Tier INTEGER, story TEXT, record TEXT)'
+            )
+            con.execute(f'CREATE INDEX IF NOT EXISTS "{table}_{key}" ON "{table}" ("{key}")')
+        self._insert = f'INSERT INTO "{table}" VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+        self._latest = f'SELECT record FROM "{table}" WHERE "{key}" = ? ORDER BY rowid DESC LIMIT 1'
+        self._since = f'SELECT rowid, "{key}", uploaded_at FROM "{table}" WHERE rowid > ? ORDER BY rowid'
+        self._uploaded_at = {}    # id -> time of its newest upload
+        self._last_rowid = 0
+        self._files_version_seen = None
+        self._refresh_ids()
+
+    def _connect(self):
+        # one short-lived connection per call: sqlite3 connections are not shared across threads
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def append(self, records, results):
+        """Append one row per (input record, result) pair; returns the number of rows written."""
+        now = time.time()
+        rows = [
+            (
+                str(result[self.key]), now,
+                *(result[c] for c in RESULT_COLUMNS),
+                result.get("story"),
+                json.dumps({**record, **result}, default=_json_default),
+            )
+            for record, result in zip(records, results)
+        ]
+        with self._lock, self._connect() as con:
+            con.executemany(self._insert, rows)
+            for row in rows:
+                self._uploaded_at[row[0]] = now
+        return len(rows)
+
+    def _files_version(self):
+        versions = []
+        for path in (self.db_path, f"{self.db_path}-wal"):
+            try:
+                st = os.stat(path)
+                versions.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                versions.append(None)
+        return tuple(versions)
+
+    def _refresh_ids(self):
+        """Pick up rows appended since the last look (by any process), if the database changed."""
+        version = self._files_version()
+        if version == self._files_version_seen:
+            return
+        with self._lock:
+            con = self._connect()
+            try:
+                rows = con.execute(self._since, [self._last_rowid]).fetchall()
+            finally:
+                con.close()
+            for rowid, member_id, uploaded_at in rows:
+                self._uploaded_at[member_id] = uploaded_at
+                self._last_rowid = rowid
+            self._files_version_seen = version
+
+    def uploaded_at(self, member_id):
+        """Time (epoch seconds) of the newest upload for member_id, or None if it was never uploaded."""
+        self._refresh_ids()
+        return self._uploaded_at.get(str(member_id))
+
+    def latest(self, member_id):
+        """Most recent uploaded record for member_id (input + result columns), or None."""
+        con = self._connect()
+        try:
+            row = con.execute(self._latest, [str(member_id)]).fetchone()
+        finally:
+            con.close()
+        return json.loads(row[0]) if row else None
@@ -0,0 +1,69 @@
+"""
+In-memory recency lookups for see/ui.py (/recency/<id> and /recency?ids=...).
+
+beneficiary_with_recency.csv is read once into a DataFrame plus an id → row position dict.
+A lookup is a dict probe and one take() over the columns, for one id or many. The file's
+(mtime, size) is checked at most every check_every seconds; when it changed, the new frame
+is loaded completely and then swapped in, so requests never see a half-loaded file.
+
+    recency = RecencyStore(RECENCY_PATH)
+    row = recency.get("00013D2EFD8E45D1")           # dict or None
+    rows, missing = recency.get_many(["id1", "id2"])
+"""
+import os
+import threading
+import time
+
+import pandas as pd
+
+
+class RecencyStore:
+    def __init__(self, csv_path, key="DESYNPUF_ID", check_every=5.0):
+        self.csv_path = csv_path
+        self.key = key
+        self.check_every = check_every
+        self._lock = threading.Lock()
+        self._state = None          # (frame, {id: position}), replaced as a whole
+        self._version = None
+        self._checked_at = 0.0
+
+    def _file_version(self):
+        try:
+            st = os.stat(self.csv_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _current(self):
+        """(frame, index) for the newest file, or None if it does not exist."""
+        now = time.monotonic()
+        if self._state is not None and now - self._checked_at < self.check_every:
+            return self._state
+        with self._lock:
+            version = self._file_version()
+            if version is None:
+                self._state, self._version = None, None
+            elif version != self._version:
+                df = pd.read_csv(self.csv_path).drop_duplicates(self.key).reset_index(drop=True)
+                index = {member_id: i for i, member_id in enumerate(df[self.key])}
+                self._state, self._version = (df, index), version
+            self._checked_at = now
+            return self._state
+
+    def available(self):
+        return self._current() is not None
+
+    def get(self, member_id):
+        """Row for member_id as a dict, or None."""
+        rows, _ = self.get_many([member_id])
+        return rows[0] if rows else None
+
+    def get_many(self, member_ids):
+        """(rows as dicts in request order, ids that were not found)."""
+        state = self._current()
+        if state is None:
+            return [], list(member_ids)
+        df, index = state
+        positions = [index[m] for m in member_ids if m in index]
+        missing = [m for m in member_ids if m not in index]
+        return df.take(positions).to_dict(orient="records"), missing
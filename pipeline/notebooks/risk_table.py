@@ -0,0 +1,210 @@
+"""
+Materialized per-member risk table for the Flask /predict endpoints.
+
+Scores, tiers and top SHAP drivers only change when the nightly ETL rewrites the feature
+store, so they are computed for every member in one batch and served by id:
+
+    table = build_risk_table(features_df, {"Risk_30": xgb30, ...}, FEATURES,
+                             explainers={"Risk_30": ModelExplainer(xgb30, FEATURES)},
+                             tier_fn=lambda t: ..., keep_shap=("Risk_30",))
+    write_risk_table(table, RISK_TABLE_PATH)
+
+    risk = RiskTableWatcher(RISK_TABLE_PATH, sources=[FEATURE_STORE_PATH], rebuild=build_fn)
+    hit = risk.get(bene_id)      # dict or None, O(1)
+
+RiskTableWatcher loads the table on disk at startup and then polls on a daemon thread.
+When a source (the feature store Parquet) is newer than the table it calls rebuild() in
+the background, and whenever the table file changes it loads the new one completely
+before swapping the reference, so requests never see a half-built table. Only one worker
+process rebuilds (lock file next to the table), and a failing build is retried with an
+exponential backoff instead of on every poll. Members missing from the table (new /
+uploaded patients) are the only ones that go through the live model path.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from build_lock import exclusive_build
+
+SHAP_PREFIX = "shap__"
+BASE_PREFIX = "base__"
+
+
+# -----------------------------
+# BUILD
+# -----------------------------
+def build_risk_table(df, models, features, explainers=None, tier_fn=None, engine=None,
+                     id_col="DESYNPUF_ID", k=5, class_index=None, keep_shap=(), chunk_size=50_000):
+    """
+    One row per member: <model> score columns, Tier (tier_fn(table) if given),
+    drivers__<model> (JSON list of the top-k {feature, shap_value, feature_value}),
+    the model feature values, and shap__<model>__<feature> / base__<model> for keep_shap models.
+
+    features: list shared by all models, or {model name: list}.
+    engine: optional tree_infer.CompiledForest scoring every model in one pass.
+    """
+    per_model = features if isinstance(features, dict) else {name: features for name in models}
+    all_features = list(dict.fromkeys(f for cols in per_model.values() for f in cols))
+    explainers = explainers or {}
+
+    table = df[[id_col, *all_features]].reset_index(drop=True)
+    preds = engine.predict(table) if engine is not None else {
+        name: model.predict(table[per_model[name]]) for name, model in models.items()
+    }
+    for name in models:
+        table[name] = np.asarray(preds[name])
+    if tier_fn is not None:
+        table["Tier"] = np.asarray(tier_fn(table)).astype(int)
+
+    for name, explainer in explainers.items():
+        cols = per_model[name]
+        drivers, shap_parts, base_parts = [], [], []
+        for start in range(0, len(table), chunk_size):
+            X = table[cols].iloc[start:start + chunk_size]
+            sv = explainer.explain(X, class_index=class_index)
+            vals = np.asarray(sv.values, dtype=float)
+            top = np.argsort(np.abs(vals), axis=1)[:, ::-1][:, :k]
+            data = X.to_numpy()
+            drivers += [
+                json.dumps([{"feature": cols[j], "shap_value": float(v[j]), "feature_value": float(x[j])} for j in idx])
+                for v, x, idx in zip(vals, data, top)
+            ]
+            shap_parts.append(vals)
+            base_parts.append(np.broadcast_to(np.asarray(sv.base_values, dtype=float).reshape(-1), len(X)))
+        table[f"drivers__{name}"] = drivers
+        if name in keep_shap:
+            shap_vals = np.vstack(shap_parts).astype(np.float32)
+            for j, f in enumerate(cols):
+                table[f"{SHAP_PREFIX}{name}__{f}"] = shap_vals[:, j]
+            table[f"{BASE_PREFIX}{name}"] = np.concatenate(base_parts)
+    return table
+
+
+def write_risk_table(table, path):
+    """Write to a temp file and rename, so readers only ever see a complete table."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    table.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+# -----------------------------
+# READ
+# -----------------------------
+class RiskTable:
+    def __init__(self, path, id_col="DESYNPUF_ID"):
+        self.built_at = os.path.getmtime(path)    # stat first: the file is only ever replaced by a newer one
+        df = pd.read_parquet(path)
+        self.columns = list(df.columns)
+        self._rows = df.to_dict(orient="records")
+        self._index = {member_id: i for i, member_id in enumerate(df[id_col])}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, member_id):
+        """Row as a dict (drivers__* parsed to lists), or None."""
+        i = self._index.get(member_id)
+        if i is None:
+            return None
+        row = dict(self._rows[i])
+        for col in self.columns:
+            if col.startswith("drivers__"):
+                row[col] = json.loads(row[col])
+        return row
+
+    def explanation(self, row, name):
+        """shap.Explanation for one stored row (for figures), or None if SHAP was not kept."""
+        return row_explanation(row, name)
+
+
+def row_explanation(row, name):
+    """shap.Explanation from a build_risk_table row dict kept with keep_shap, or None."""
+    import shap
+
+    prefix = f"{SHAP_PREFIX}{name}__"
+    cols = [c for c in row if c.startswith(prefix)]
+    if not cols:
+        return None
+    features = [c[len(prefix):] for c in cols]
+    return shap.Explanation(
+        values=np.array([row[c] for c in cols], dtype=float),
+        base_values=float(row[f"{BASE_PREFIX}{name}"]),
+        data=np.array([row[f] for f in features], dtype=float),
+        feature_names=features,
+    )
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class RiskTableWatcher:
+    """Keeps the newest RiskTable loaded; rebuilds it in the background when the sources change."""
+
+    def __init__(self, path, sources=(), rebuild=None, interval=30.0, id_col="DESYNPUF_ID"):
+        self.path = path
+        self.sources = list(sources)
+        self.rebuild = rebuild
+        self.interval = interval
+        self.id_col = id_col
+        self.table = None
+        self._loaded_mtime = None
+        try:
+            self._load()    # serve whatever table is on disk; any rebuild happens off the startup path
+        except Exception as e:
+            print(f"⚠️ Could not load risk table {path}: {e}")
+        threading.Thread(target=self._run, name="risk-table-watcher", daemon=True).start()
+
+    def _load(self):
+        table_mtime = _mtime(self.path)
+        if table_mtime is not None and table_mtime != self._loaded_mtime:
+            table = RiskTable(self.path, self.id_col)
+            self.table, self._loaded_mtime = table, table_mtime   # swap only once fully loaded
+            print(f"✅ Risk table loaded: {len(table)} members")
+
+    def _stale(self):
+        table_mtime = _mtime(self.path)
+        newest_source = max((m for m in map(_mtime, self.sources) if m is not None), default=None)
+        return newest_source is not None and (table_mtime is None or newest_source > table_mtime)
+
+    def refresh(self):
+        """
+        Rebuild if a source is newer than the table (only in the process holding the lock;
+        the others pick the new table up on a later poll), then load the table if it changed.
+        """
+        if self.rebuild is not None and self._stale():
+            with exclusive_build(f"{self.path}.lock") as owner:
+                if owner and self._stale():
+                    start = time.perf_counter()
+                    self.rebuild()
+                    print(f"🔄 Risk table rebuilt in {time.perf_counter() - start:.1f}s: {self.path}")
+        self._load()
+
+    def _run(self, max_backoff=3600.0):
+        failures = 0
+        while True:
+            try:
+                self.refresh()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"⚠️ Risk table refresh failed ({failures}x): {e}")
+            time.sleep(min(self.interval * 2 ** failures, max_backoff))
+
+    def get(self, member_id):
+        table = self.table
+        return table.get(member_id) if table is not None else None
+
+    def built_at(self):
+        """Modification time of the loaded table file (epoch seconds), or None before the first load."""
+        table = self.table
+        return table.built_at if table is not None else None
@@ -1,15 +1,20 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 import os
+import sys
 import json
+import uuid
 import joblib
 import pandas as pd
 import numpy as np
-import shap
-import matplotlib
 
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from explain import ModelExplainer, top_drivers
+from figures import FigureService, model_version
+from tree_infer import CompiledForest
+from risk_table import RiskTableWatcher, build_risk_table, row_explanation, write_risk_table
+from patient_uploads import UploadStore
+from recency_store import RecencyStore
 
 # -----------------------------
 # CONFIG
@@ -26,11 +31,25 @@ xgb30 = joblib.load(os.path.join(ARTIFACT_DIR, "test_xgb_risk30.joblib"))
 xgb60 = joblib.load(os.path.join(ARTIFACT_DIR, "test_xgb_risk60.joblib"))
 xgb90 = joblib.load(os.path.join(ARTIFACT_DIR, "test_xgb_risk90.joblib"))
 
+# SHAP plots render in the background and are cached on disk by (model version, features)
+FIGURES = FigureService(FIG_DIR, model_version=model_version(os.path.join(ARTIFACT_DIR, "test_xgb_risk30.joblib")))
+
 # Feature list
 with open(os.path.join(ARTIFACT_DIR, "test_features.json"), "r") as f:
     FEATURES = json.load(f)
 
-# Existing patients
+# All three horizons scored in one fused pass over compiled tree arrays (../tree_infer.py)
+RISK_ENGINE = CompiledForest.from_models({"Risk_30": xgb30, "Risk_60": xgb60, "Risk_90": xgb90}, FEATURES)
+
+# One explainer per model, built once (native XGBoost pred_contribs, see ../explain.py)
+EXPLAINERS = {
+    "Risk_30": ModelExplainer(xgb30, FEATURES),
+    "Risk_60": ModelExplainer(xgb60, FEATURES),
+    "Risk_90": ModelExplainer(xgb90, FEATURES),
+}
+
+# Existing patients. /predict scores them with the models (risk table, or live from the
+# feature store); this CSV only supplies features for members the feature store lacks.
 DATA_PATH = os.path.join(ARTIFACT_DIR, "../../../beneficiary_with_labels.csv") # os.path.join(ARTIFACT_DIR, ".", "beneficiary_with_labels.csv")
 DATA_PATH = os.path.abspath(DATA_PATH)
 if os.path.exists(DATA_PATH):
@@ -38,6 +57,28 @@ if os.path.exists(DATA_PATH):
 else:
     df_existing = pd.DataFrame()
 
+# Member feature store (pipeline/scripts/04_build_feature_store.py): model features for
+# existing members are read from here instead of being recomputed
+FEATURE_STORE_PATH = os.path.abspath(os.path.join(ARTIFACT_DIR, "../../feature_store/member_features.parquet"))
+if os.path.exists(FEATURE_STORE_PATH):
+    df_features = pd.read_parquet(FEATURE_STORE_PATH).set_index("DESYNPUF_ID")
+else:
+    df_features = pd.DataFrame()
+
+# Precomputed risks, tiers and Risk_30 drivers for every member in the feature store
+# (../risk_table.py). Rebuilt in the background when the nightly ETL rewrites the store and
+# swapped in once complete; uploaded / unknown patients still go through the live models.
+RISK_TABLE_PATH = os.path.join(ARTIFACT_DIR, "risk_table.parquet")
+
+# Patients scored from uploaded CSVs: appended to SQLite under a lock (../patient_uploads.py)
+# instead of rewriting beneficiary_with_labels.csv on every upload
+UPLOADS = UploadStore(os.path.join(ARTIFACT_DIR, "uploaded_patients.sqlite"))
+UPLOAD_CHUNK_ROWS = 1_000
+
+# Recency rows: CSV loaded once with an id index, reloaded when the file changes (../recency_store.py)
+RECENCY_PATH = os.path.abspath(os.path.join(ARTIFACT_DIR, "../beneficiary_with_recency.csv"))
+RECENCY = RecencyStore(RECENCY_PATH)
+
 # -----------------------------
 # HELPERS
 # -----------------------------
@@ -75,8 +116,8 @@ def compute_tier(risk30, risk60, risk90):
 
 def engineer_features(df_raw):
     disease_cols = [col for col in df_raw.columns if "SP_" in col]
-    for col in disease_cols:
-        df_raw[col] = df_raw[col].apply(lambda x: 1 if x == 1 else 0)
+    if disease_cols:
+        df_raw[disease_cols] = (df_raw[disease_cols] == 1).astype(int)
 
     disease_cols_2010 = [c for c in disease_cols if "_2010" in c]
     df_raw["comorbidity_count_2010"] = df_raw[disease_cols_2010].sum(axis=1) if disease_cols_2010 else 0
@@ -120,43 +161,78 @@ def engineer_features(df_raw):
         df_raw["recent_visits_30"] + df_raw["recent_visits_60"] + df_raw["recent_visits_90"]
     )
 
-    df_raw["visit_ratio_30_to_90"] = df_raw.apply(
-        lambda x: x["recent_visits_30"] / x["recent_visits_90"] if x["recent_visits_90"] > 0 else 0,
-        axis=1
+    visits_90 = df_raw["recent_visits_90"]
+    df_raw["visit_ratio_30_to_90"] = np.where(
+        visits_90 > 0, df_raw["recent_visits_30"] / visits_90.where(visits_90 > 0), 0
     )
     return df_raw
 
-def build_story(shap_values, features, row):
-    vals = shap_values.values[0] if hasattr(shap_values, "values") else shap_values[0]
-    top_idx = np.argsort(np.abs(vals))[-5:][::-1]
+def build_story(drivers):
     phrases = []
-    for i in top_idx:
-        feat = features[i]
+    for driver in drivers:
+        feat = driver["feature"]
         fname = FRIENDLY_NAMES.get(feat, feat.replace("_", " ").title())
-        val = row[feat]
-        impact = "increases" if vals[i] > 0 else "decreases"
+        val = driver["feature_value"]
+        impact = "increases" if driver["shap_value"] > 0 else "decreases"
         phrases.append(f"{fname} ({val}) → {impact} risk")
     return "Key drivers: " + "; ".join(phrases)
 
 def compute_story_and_recommendations(X, bene_id, risks, tier):
-    explainer = shap.TreeExplainer(xgb30)
-    shap_values = explainer(X)
+    shap_values = EXPLAINERS["Risk_30"].explain(X)
 
-    # Save SHAP bar plot
-    shap_img_name = f"{bene_id}_Risk30_shap.png"
-    fig, ax = plt.subplots(figsize=(8, 6))
-    shap.plots.bar(shap_values, show=False)
-    plt.savefig(os.path.join(FIG_DIR, shap_img_name), bbox_inches="tight")
-    plt.close(fig)
+    # SHAP bar plot is queued, not rendered here; /figs/<name> serves it once ready
+    shap_img_name = FIGURES.submit("bar", shap_values[0], label="Risk30")
 
-    story = build_story(shap_values, FEATURES, X.iloc[0])
+    story = build_story(top_drivers(shap_values[0], k=5))
     return story, TIER_ACTIONS.get(tier, ["Routine care"]), shap_img_name
 
+def risk_tiers(table):
+    return [compute_tier(*r) for r in table[["Risk_30", "Risk_60", "Risk_90"]].to_numpy()]
+
+def format_result(bene_id, scored, drivers, shap_img=None):
+    """/predict response from a scored row (Risk_30/60/90 + Tier) and its Risk_30 drivers."""
+    tier = int(scored["Tier"])
+    return {
+        "DESYNPUF_ID": bene_id,
+        "Risk_30": round(float(scored["Risk_30"]), 2),
+        "Risk_60": round(float(scored["Risk_60"]), 2),
+        "Risk_90": round(float(scored["Risk_90"]), 2),
+        "Tier": tier,
+        "shap_img": shap_img,
+        "story": build_story(drivers),
+        "recommended": TIER_ACTIONS.get(tier, ["Routine care"]),
+    }
+
+def build_member_risk_table():
+    df = pd.read_parquet(FEATURE_STORE_PATH).reindex(columns=["DESYNPUF_ID", *FEATURES], fill_value=0)
+    table = build_risk_table(
+        df,
+        {"Risk_30": xgb30, "Risk_60": xgb60, "Risk_90": xgb90},
+        FEATURES,
+        explainers={"Risk_30": EXPLAINERS["Risk_30"]},
+        tier_fn=risk_tiers,
+        engine=RISK_ENGINE,
+        keep_shap=("Risk_30",),
+    )
+    write_risk_table(table, RISK_TABLE_PATH)
+
+RISK_TABLE = RiskTableWatcher(RISK_TABLE_PATH, sources=[FEATURE_STORE_PATH], rebuild=build_member_risk_table)
+
+def stored_predictions(bene_id):
+    """Response for a member in the risk table (no model calls), or None."""
+    stored = RISK_TABLE.get(bene_id)
+    if stored is None:
+        return None
+    explanation = RISK_TABLE.table.explanation(stored, "Risk_30")
+    shap_img = FIGURES.submit("bar", explanation, label="Risk30") if explanation is not None else None
+    return format_result(bene_id, stored, stored["drivers__Risk_30"], shap_img)
+
 def get_predictions(features, bene_id="new_patient"):
     X = pd.DataFrame([features], columns=FEATURES)
-    risk30 = float(xgb30.predict(X)[0])
-    risk60 = float(xgb60.predict(X)[0])
-    risk90 = float(xgb90.predict(X)[0])
+    preds = RISK_ENGINE.predict(X)
+    risk30 = float(preds["Risk_30"][0])
+    risk60 = float(preds["Risk_60"][0])
+    risk90 = float(preds["Risk_90"][0])
     tier = compute_tier(risk30, risk60, risk90)
 
     story, recs, shap_img = compute_story_and_recommendations(X, bene_id, (risk30, risk60, risk90), tier)
@@ -172,27 +248,90 @@ def get_predictions(features, bene_id="new_patient"):
         "recommended": recs,
     }
 
+def score_upload(df_new, shap_images=False):
+    """
+    Engineer and score every row of an uploaded frame at once → (input records, results).
+    shap_images: also queue each row's SHAP bar plot (single-patient uploads).
+    """
+    df_new = engineer_features(df_new.copy())
+    scored = build_risk_table(
+        df_new.reindex(columns=["DESYNPUF_ID", *FEATURES], fill_value=0),
+        {"Risk_30": xgb30, "Risk_60": xgb60, "Risk_90": xgb90},
+        FEATURES,
+        explainers={"Risk_30": EXPLAINERS["Risk_30"]},
+        tier_fn=risk_tiers,
+        engine=RISK_ENGINE,
+        keep_shap=("Risk_30",) if shap_images else (),
+    )
+    results = []
+    for row in scored.to_dict(orient="records"):
+        shap_img = FIGURES.submit("bar", row_explanation(row, "Risk_30"), label="Risk30") if shap_images else None
+        results.append(format_result(row["DESYNPUF_ID"], row, json.loads(row["drivers__Risk_30"]), shap_img))
+    return df_new.to_dict(orient="records"), results
+
+def assign_upload_ids(df_new):
+    """Rows without a DESYNPUF_ID get a unique upload_<upload>_<row> id, so each one stays retrievable."""
+    df_new = df_new.copy()
+    prefix = f"upload_{uuid.uuid4().hex[:8]}"
+    generated = pd.Series([f"{prefix}_{i}" for i in range(len(df_new))], index=df_new.index)
+    if "DESYNPUF_ID" not in df_new.columns:
+        df_new["DESYNPUF_ID"] = generated
+    else:
+        ids = df_new["DESYNPUF_ID"]
+        df_new["DESYNPUF_ID"] = ids.where(ids.notna() & (ids.astype(str).str.strip() != ""), generated)
+    return df_new
+
+def stream_upload(df_new):
+    """NDJSON: one result per uploaded row, scored and stored UPLOAD_CHUNK_ROWS at a time."""
+    try:
+        df_new = assign_upload_ids(df_new)
+        for start in range(0, len(df_new), UPLOAD_CHUNK_ROWS):
+            records, results = score_upload(df_new.iloc[start:start + UPLOAD_CHUNK_ROWS])
+            UPLOADS.append(records, results)
+            for result in results:
+                yield json.dumps(result) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": f"Error processing CSV: {str(e)}"}) + "\n"
+
 
 @app.route("/predict", methods=["POST"])
 def predict():
-    global df_existing
-
     # Existing user
     if request.is_json:
         data = request.get_json()
         if "beneficiary_id" in data:
             bene_id = data["beneficiary_id"]
-            row = df_existing[df_existing["DESYNPUF_ID"] == bene_id]
-            if row.empty:
-                return jsonify({"error": "Beneficiary ID not found"}), 404
 
-            features = {col: row.iloc[0].get(col, 0) for col in FEATURES}
+            # an upload wins until a risk table built after it covers the member
+            # (uploaded_at is answered from memory; SQLite is only read for uploaded ids)
+            uploaded_at = UPLOADS.uploaded_at(bene_id)
+            if uploaded_at is None or (RISK_TABLE.built_at() or 0) > uploaded_at:
+                result = stored_predictions(bene_id)
+                if result is not None:
+                    return jsonify(result)
+
+            if uploaded_at is None:
+                # not in the risk table (first build still running, or member added since):
+                # score live from the feature store, or from the labels CSV for members the
+                # store does not have, so the risks and tier match what the table returns
+                if bene_id in df_features.index:
+                    stored = df_features.loc[bene_id]
+                    features = {col: stored.get(col, 0) for col in FEATURES}
+                else:
+                    row = df_existing[df_existing["DESYNPUF_ID"] == bene_id] if not df_existing.empty else df_existing
+                    if row.empty:
+                        return jsonify({"error": "Beneficiary ID not found"}), 404
+                    features = {col: row.iloc[0].get(col, 0) for col in FEATURES}
+                return jsonify(get_predictions(features, bene_id))
+
+            record = UPLOADS.latest(bene_id)
+            features = {col: record.get(col, 0) for col in FEATURES}
             risks = (
-                row.iloc[0].get("Risk_30", 0),
-                row.iloc[0].get("Risk_60", 0),
-                row.iloc[0].get("Risk_90", 0),
+                record.get("Risk_30", 0),
+                record.get("Risk_60", 0),
+                record.get("Risk_90", 0),
             )
-            tier = int(row.iloc[0].get("Tier", compute_tier(*risks)))
+            tier = int(record.get("Tier", compute_tier(*risks)))
 
             X = pd.DataFrame([features], columns=FEATURES)
             story, recs, shap_img = compute_story_and_recommendations(X, bene_id, risks, tier)
@@ -209,26 +348,21 @@ def predict():
             }
             return jsonify(result)
 
-    # New user
+    # New user(s)
     if "patient_csv" in request.files:
         try:
             uploaded_file = request.files["patient_csv"]
             df_new = pd.read_csv(uploaded_file)
-            df_new = engineer_features(df_new)
-            new_row = df_new.iloc[0].to_dict()
-            features = {col: new_row.get(col, 0) for col in FEATURES}
-            bene_id = new_row.get("DESYNPUF_ID", "new_patient")
 
-            result = get_predictions(features, bene_id)
+            # Bulk intake (mode=bulk): every row scored in vectorized chunks, streamed back as NDJSON
+            if request.values.get("mode") == "bulk":
+                return Response(stream_upload(df_new), mimetype="application/x-ndjson")
 
-            df_new_out = pd.DataFrame([{**new_row, **result}])
-            if not df_existing.empty and bene_id in df_existing["DESYNPUF_ID"].values:
-                df_existing.loc[df_existing["DESYNPUF_ID"] == bene_id] = df_new_out.iloc[0]
-            else:
-                df_existing = pd.concat([df_existing, df_new_out], ignore_index=True)
-            df_existing.to_csv(DATA_PATH, index=False)
+            # first row only, with the same id assignment and scoring as the bulk path
+            records, results = score_upload(assign_upload_ids(df_new.iloc[:1]), shap_images=True)
+            UPLOADS.append(records, results)
 
-            return jsonify(result)
+            return jsonify(results[0])
         except Exception as e:
             return jsonify({"error": f"Error processing CSV: {str(e)}"}), 400
 
@@ -236,6 +370,9 @@ def predict():
 
 @app.route("/figs/<filename>")
 def send_shap(filename):
+    # waits only if the figure is still being rendered
+    if FIGURES.wait(filename) is None:
+        return jsonify({"error": "Figure not found"}), 404
     return send_from_directory(FIG_DIR, filename)
 
 @app.route("/recency/<beneficiary_id>", methods=["GET"])
@@ -243,18 +380,31 @@ def get_beneficiary_recency(beneficiary_id):
     """
     Returns the row for the given beneficiary_id from beneficiary_with_recency.csv
     """
-    recency_path = os.path.join(ARTIFACT_DIR, "../beneficiary_with_recency.csv")
-    recency_path = os.path.abspath(recency_path)
-    if not os.path.exists(recency_path):
-        return jsonify({"error": "beneficiary_with_recency.csv not found"}), 404
-
     try:
-        df_recency = pd.read_csv(recency_path)
-        row = df_recency[df_recency["DESYNPUF_ID"] == beneficiary_id]
-        print(row)
-        if row.empty:
+        if not RECENCY.available():
+            return jsonify({"error": "beneficiary_with_recency.csv not found"}), 404
+        row = RECENCY.get(beneficiary_id)
+        if row is None:
             return jsonify({"error": "Beneficiary ID not found"}), 404
-        return jsonify(row.iloc[0].to_dict())
+        return jsonify(row)
+    except Exception as e:
+        return jsonify({"error": f"Error reading recency file: {str(e)}"}), 500
+
+@app.route("/recency", methods=["GET"])
+def get_recency_batch():
+    """
+    Rows for many beneficiaries in one call: /recency?ids=id1,id2 (or repeated ids=...).
+    Returns {"results": {id: row}, "missing": [ids not found]}
+    """
+    ids = [i.strip() for value in request.args.getlist("ids") for i in value.split(",") if i.strip()]
+    if not ids:
+        return jsonify({"error": "Provide ids, e.g. /recency?ids=id1,id2"}), 400
+
+    try:
+        if not RECENCY.available():
+            return jsonify({"error": "beneficiary_with_recency.csv not found"}), 404
+        rows, missing = RECENCY.get_many(list(dict.fromkeys(ids)))
+        return jsonify({"results": {row["DESYNPUF_ID"]: row for row in rows}, "missing": missing})
     except Exception as e:
         return jsonify({"error": f"Error reading recency file: {str(e)}"}), 500
 
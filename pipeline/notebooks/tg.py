@@ -10,10 +10,15 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score, accuracy_score, f1_score
 from sklearn.cluster import KMeans   # ✅ added for clustering
 
+import batch_scoring
+import figures
+
 # -----------------------------
 # CONFIG
 # -----------------------------
-DATA_PATH = r"C:\Users\kesh2\OneDrive\Documents\Cognitives---Member-Risk-Stratification-and-Care-Management\pipeline\notebooks\beneficiary_with_recency.csv"
+# Member feature store (pipeline/scripts/04_build_feature_store.py): chronic flags per year,
+# comorbidity / severity features and 30/60/90-day visit recency are precomputed there
+DATA_PATH = r"C:\Users\kesh2\OneDrive\Documents\Cognitives---Member-Risk-Stratification-and-Care-Management\pipeline\feature_store\member_features.parquet"
 
 # ✅ Define an artifacts folder (not a CSV file!)
 ARTIFACT_DIR = r"C:\Users\kesh2\OneDrive\Documents\Cognitives---Member-Risk-Stratification-and-Care-Management\pipeline\notebooks\artifacts"
@@ -49,6 +54,9 @@ FRIENDLY = {
     "AGE_2010": "Age",
 }
 
+# SHAP waterfalls are rendered on a background pool; model_version is set once the models are saved
+FIGURES = figures.FigureService(FIG_DIR, friendly_names=FRIENDLY)
+
 # Tier -> recommended actions mapping (customize to your org)
 TIER_ACTIONS = {
     4: ["Immediate intensive case management", "Home health assessment", "Medication reconciliation", "Specialist referral"],
@@ -194,32 +202,15 @@ def build_shap_story(shap_vals, features, x_row, horizon_label):
     return sentence.strip()
 
 def make_waterfall(shap_values_row, bene_id, label_name):
-    """Save a SHAP waterfall plot for one patient and one label (returns path)."""
-    try:
-        shap.plots.waterfall(shap_values_row, max_display=10, show=False)
-        out = os.path.join(FIG_DIR, f"{bene_id}_{label_name}_waterfall.png")
-        plt.tight_layout()
-        plt.savefig(out, dpi=150, bbox_inches="tight")
-        plt.close()
-        return out
-    except Exception:
-        vals = shap_values_row.values if hasattr(shap_values_row, "values") else np.array(shap_values_row)
-        idx = np.argsort(np.abs(vals))[-10:][::-1]
-        labels = [FRIENDLY.get(feat, feat) for feat in FEATURES][idx]
-        plt.figure(figsize=(6,4))
-        plt.barh(labels[::-1], vals[idx][::-1])
-        plt.title(f"Top SHAP - {bene_id} - {label_name}")
-        out = os.path.join(FIG_DIR, f"{bene_id}_{label_name}_bar.png")
-        plt.tight_layout()
-        plt.savefig(out, dpi=150, bbox_inches="tight")
-        plt.close()
-        return out
+    """Queue a SHAP waterfall for one patient and one label (returns the path it is written to)."""
+    name = FIGURES.submit("waterfall", shap_values_row, label=label_name, title=f"{bene_id} - {label_name}")
+    return os.path.join(FIG_DIR, name)
 
 # -----------------------------
 # LOAD + PREP
 # -----------------------------
-df = pd.read_csv(DATA_PATH)
-df = compute_engineered_features(df)
+df = pd.read_parquet(DATA_PATH)
+df = compute_engineered_features(df)  # only fills columns the feature store does not provide
 df = maybe_build_proxy_risks(df)
 df = maybe_build_tier(df)
 
@@ -444,6 +435,10 @@ joblib.dump(xgb30, os.path.join(ARTIFACT_DIR, "test_xgb_risk30.joblib"))
 joblib.dump(xgb60, os.path.join(ARTIFACT_DIR, "test_xgb_risk60.joblib"))
 joblib.dump(xgb90, os.path.join(ARTIFACT_DIR, "test_xgb_risk90.joblib"))
 joblib.dump(xgbTier, os.path.join(ARTIFACT_DIR, "test_xgb_tier.joblib"))
+# figures are keyed by model version, so a retrain never serves stale waterfalls
+FIGURES.model_version = figures.model_version(
+    *(os.path.join(ARTIFACT_DIR, f"test_xgb_risk{h}.joblib") for h in (30, 60, 90))
+)
 
 with open(os.path.join(ARTIFACT_DIR, "test_features.json"), "w") as f:
     json.dump(FEATURES, f, indent=2)
@@ -454,17 +449,30 @@ print("✅ Saved TEST models and feature list to:", ARTIFACT_DIR)
 # -----------------------------
 # BATCH PREDICT & EXPORT
 # -----------------------------
-def batch_predict_export():
-    preds = []
-    for _, row in df.iterrows():
-        bene = row[ID_COL]
-        res = predict_and_explain_by_id(bene)
-        preds.append(res)
-    out_df = pd.DataFrame(preds)
-    out_csv = os.path.join(ARTIFACT_DIR, "predictions_with_shap.csv")
-    out_df.to_csv(out_csv, index=False)
-    print("Saved:", out_csv)
-    return out_csv
+def batch_predict_export(render_figures=False):
+    """
+    Score every member in one pass (see batch_scoring.py): one predict call per model,
+    SHAP over the whole matrix, stories from array ops. Writes Parquet partitioned by tier;
+    waterfalls are only rendered when asked (or later via batch_scoring.render_figures).
+    """
+    scores = batch_scoring.score_population(
+        df,
+        {"Risk_30": xgb30, "Risk_60": xgb60, "Risk_90": xgb90},
+        FEATURES,
+        tier_model=xgbTier,
+        explainers={"Risk_30": shap_explainer_30, "Risk_60": shap_explainer_60, "Risk_90": shap_explainer_90},
+        id_col=ID_COL,
+        friendly=FRIENDLY,
+        tier_actions=TIER_ACTIONS,
+    )
+    if render_figures:
+        batch_scoring.render_figures(
+            scores, FEATURES, make_waterfall,
+            explainers={"Risk_30": shap_explainer_30, "Risk_60": shap_explainer_60, "Risk_90": shap_explainer_90},
+        )
+    out_dir = batch_scoring.write_scores(scores, os.path.join(ARTIFACT_DIR, "predictions_with_shap"))
+    print("Saved:", out_dir)
+    return out_dir
 
 preds_path = batch_predict_export()
 
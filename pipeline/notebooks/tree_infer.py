@@ -0,0 +1,494 @@
+"""
+Compiled inference for the risk forests (XGBoost / LightGBM) without the sklearn wrappers.
+
+The trees of every model are exported once into flat NumPy node arrays (feature, threshold,
+left, right, default direction, leaf value) and evaluated together:
+
+  - one contiguous float32 feature buffer holds the union of all models' features
+  - all trees of all models advance one level per step, vectorized over (rows, trees)
+  - leaf values are summed per model output with a single matrix product
+
+so 30/60/90-day scoring is one fused pass instead of three predict() calls, each paying the
+pandas → DMatrix conversion. With numba installed the walk is a compiled, parallel kernel
+(blocks of 64 rows per tree, four rows interleaved); without it a NumPy evaluator steps all
+trees one level at a time over row chunks. Single rows and million-row batches share the code.
+Outputs match the wrappers to float32 rounding (XGBoost sums leaves in float32).
+
+    engine = CompiledForest.from_models({"Risk_30": xgb30, "Risk_60": xgb60, "Risk_90": xgb90})
+    engine.save(os.path.join(ARTIFACT_DIR, "risk_forest.npz"))
+    preds = engine.predict(df)           # {"Risk_30": array, ...}, same values as model.predict
+
+Benchmark against the wrappers:
+    python pipeline/notebooks/tree_infer.py <artifact_dir> [--rows 1000000]
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:  # optional: the NumPy evaluator is used instead
+    numba = None
+else:
+    # kernels are launched from Flask request threads and background refresh threads:
+    # OpenMP is thread-safe, and TBB can hang interpreter exit after use off the main thread
+    if "NUMBA_THREADING_LAYER" not in os.environ:
+        numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+
+# how a node treats NaN (and, for LightGBM "Zero", 0.0)
+MISSING_NAN = 0      # NaN → default direction
+MISSING_ZERO = 1     # NaN or 0.0 → default direction
+MISSING_AS_ZERO = 2  # NaN is compared as 0.0
+
+
+def _logit(p):
+    return float(np.log(p / (1 - p)))
+
+
+def _f32_lt_bound(threshold):
+    """float32 t' with (x <= threshold) == (x < t') for every float32 x."""
+    f32_max = float(np.finfo(np.float32).max)
+    if threshold >= f32_max:
+        return np.float32(np.inf)
+    if threshold < -f32_max:
+        return np.float32(-f32_max)
+    t = np.float32(threshold)
+    if float(t) > threshold:
+        t = np.nextafter(t, np.float32(-np.inf))
+    return np.nextafter(t, np.float32(np.inf))
+
+
+# -----------------------------
+# EXPORT
+# -----------------------------
+class _Builder:
+    """Collects nodes from many trees into flat arrays."""
+
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right = [], [], [], []
+        self.default_left, self.missing, self.value = [], [], []
+        self.roots, self.tree_output, self.tree_depth = [], [], []
+        self.depth = 0     # longest root-to-leaf path of the tree being added
+
+    def add_node(self, feature=-1, threshold=0.0, default_left=True, missing=MISSING_NAN, value=0.0):
+        i = len(self.feature)
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.left.append(i)        # leaves point to themselves, so extra steps are no-ops
+        self.right.append(i)
+        self.default_left.append(default_left)
+        self.missing.append(missing)
+        self.value.append(value)
+        return i
+
+
+def _export_xgboost(builder, model, feature_index, output_offset):
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    if booster.feature_names is None:
+        raise ValueError("XGBoost model has no feature names; fit it on a DataFrame")
+    learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+    gbm = learner["gradient_booster"]
+    if gbm["name"] != "gbtree":
+        raise ValueError(f"Unsupported XGBoost booster: {gbm['name']}")
+    objective = learner["objective"]["name"]
+    n_class = max(int(learner["learner_model_param"].get("num_class", 0)), 1)
+    base = [float(v) for v in learner["learner_model_param"]["base_score"].strip("[]").split(",")]
+    if objective in ("binary:logistic", "reg:logistic"):
+        base = [_logit(b) for b in base]
+    base = np.resize(base, n_class)
+
+    cols = [feature_index[f] for f in booster.feature_names]
+    for tree, group in zip(gbm["model"]["trees"], gbm["model"]["tree_info"]):
+        if any(tree.get("split_type", [])):
+            raise ValueError("Categorical splits are not supported")
+        offset = len(builder.feature)
+        builder.depth = 0
+        depth = [0] * len(tree["left_children"])
+        for i, (lc, rc) in enumerate(zip(tree["left_children"], tree["right_children"])):
+            cond = tree["split_conditions"][i]
+            if lc == -1:
+                builder.add_node(value=cond)
+                builder.depth = max(builder.depth, depth[i])
+            else:
+                # XGBoost goes left when x < threshold (float32 comparison)
+                builder.add_node(cols[tree["split_indices"][i]], np.float32(cond), bool(tree["default_left"][i]))
+                builder.left[offset + i] = offset + lc
+                builder.right[offset + i] = offset + rc
+                depth[lc] = depth[rc] = depth[i] + 1   # children always follow their parent
+        builder.roots.append(offset)
+        builder.tree_output.append(output_offset + group)
+        builder.tree_depth.append(builder.depth)
+
+    if objective.startswith("multi:"):
+        transform = "softmax"
+    elif objective in ("binary:logistic", "reg:logistic"):
+        transform = "sigmoid"
+    else:
+        transform = "identity"
+    return n_class, base, transform, 1.0
+
+
+def _export_lightgbm(builder, model, feature_index, output_offset):
+    booster = getattr(model, "booster_", model)
+    dump = booster.dump_model()
+    cols = [feature_index[f] for f in dump["feature_names"]]
+    n_out = dump["num_tree_per_iteration"]
+    missing_modes = {"None": MISSING_AS_ZERO, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+
+    def add(node, depth=0):
+        if "leaf_value" in node:
+            builder.depth = max(builder.depth, depth)
+            return builder.add_node(value=node["leaf_value"])
+        if node["decision_type"] != "<=":
+            raise ValueError("Categorical splits are not supported")
+        # LightGBM goes left when x <= threshold; stored as x < t' on the float32 buffer
+        i = builder.add_node(cols[node["split_feature"]], _f32_lt_bound(node["threshold"]),
+                             bool(node["default_left"]), missing_modes[node["missing_type"]])
+        builder.left[i] = add(node["left_child"], depth + 1)
+        builder.right[i] = add(node["right_child"], depth + 1)
+        return i
+
+    for k, tree in enumerate(dump["tree_info"]):
+        builder.depth = 0
+        builder.roots.append(add(tree["tree_structure"]))
+        builder.tree_output.append(output_offset + k % n_out)
+        builder.tree_depth.append(builder.depth)
+
+    objective = dump["objective"].split()[0]
+    if objective in ("multiclass", "softmax"):
+        transform = "softmax"
+    elif objective in ("binary", "cross_entropy", "xentropy"):
+        transform = "sigmoid"
+    else:
+        transform = "identity"
+    scale = 1.0 / (len(dump["tree_info"]) // n_out) if dump.get("average_output") else 1.0
+    return n_out, np.zeros(n_out), transform, scale
+
+
+def _model_features(model):
+    if type(model).__module__.startswith("xgboost"):
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        return list(booster.feature_names or [])
+    return list(getattr(model, "booster_", model).feature_name())
+
+
+def _layout(builder):
+    """
+    Renumber nodes breadth-first per tree so both children of a node are adjacent:
+    next = first_child[node] + go_right. Leaves point at themselves with a NaN threshold,
+    so a row that already reached its leaf stays there.
+    """
+    left, right = builder.left, builder.right
+    order, first_child = [], {}
+    for root in builder.roots:
+        queue = [root]
+        order.append(root)
+        while queue:
+            i = queue.pop(0)
+            if left[i] != i:
+                first_child[i] = len(order)
+                order += [left[i], right[i]]
+                queue += [left[i], right[i]]
+    new_id = np.empty(len(order), dtype=np.int64)
+    new_id[order] = np.arange(len(order))
+    old = np.array(order)
+    is_leaf = np.array([left[i] == i for i in order])
+
+    threshold = np.array(builder.threshold, dtype=np.float32)[old]
+    threshold[is_leaf] = np.nan
+    default_left = np.array(builder.default_left, dtype=bool)[old]
+    default_left[is_leaf] = True
+    return {
+        "feature": np.array(builder.feature, dtype=np.intp)[old].clip(min=0),
+        "threshold": threshold,
+        "first_child": np.array([first_child.get(i, new_id[i]) for i in order], dtype=np.intp),
+        "default_left": default_left,
+        "missing": np.array(builder.missing, dtype=np.int8)[old],
+        "value": np.array(builder.value, dtype=np.float64)[old],
+        "roots": new_id[builder.roots].astype(np.intp),
+        "tree_output": np.array(builder.tree_output, dtype=np.intp),
+        "tree_depth": np.array(builder.tree_depth, dtype=np.intp),
+    }
+
+
+def _traverse_dense(X, feature, threshold, first_child, value, roots, tree_output, tree_depth, tree_scale, out):
+    """
+    No missing values: branchless fixed-depth walk (a leaf's NaN threshold keeps it in place).
+    Blocks of 64 rows walk one tree at a time so its nodes stay in cache, four rows interleaved.
+    """
+    n_rows = X.shape[0]
+    for b in numba.prange((n_rows + 63) // 64):
+        stop = min(b * 64 + 64, n_rows)
+        for t in range(roots.shape[0]):
+            root, o, depth, scale = roots[t], tree_output[t], tree_depth[t], tree_scale[t]
+            r = b * 64
+            while r + 4 <= stop:
+                n0 = n1 = n2 = n3 = root
+                for _ in range(depth):
+                    n0 = first_child[n0] + (X[r, feature[n0]] >= threshold[n0])
+                    n1 = first_child[n1] + (X[r + 1, feature[n1]] >= threshold[n1])
+                    n2 = first_child[n2] + (X[r + 2, feature[n2]] >= threshold[n2])
+                    n3 = first_child[n3] + (X[r + 3, feature[n3]] >= threshold[n3])
+                out[r, o] += value[n0] * scale
+                out[r + 1, o] += value[n1] * scale
+                out[r + 2, o] += value[n2] * scale
+                out[r + 3, o] += value[n3] * scale
+                r += 4
+            while r < stop:
+                node = root
+                for _ in range(depth):
+                    node = first_child[node] + (X[r, feature[node]] >= threshold[node])
+                out[r, o] += value[node] * scale
+                r += 1
+
+
+def _traverse_missing(X, feature, threshold, first_child, default_left, missing, value,
+                      roots, tree_output, tree_scale, out):
+    """Row-by-row walk with NaN / LightGBM zero-as-missing handling."""
+    for r in numba.prange(X.shape[0]):
+        for t in range(roots.shape[0]):
+            node = roots[t]
+            while not np.isnan(threshold[node]):
+                x = X[r, feature[node]]
+                mode = missing[node]
+                if np.isnan(x) and mode == MISSING_AS_ZERO:
+                    x = 0.0
+                if np.isnan(x) or (mode == MISSING_ZERO and x == 0.0):
+                    go_right = not default_left[node]
+                else:
+                    go_right = x >= threshold[node]
+                node = first_child[node] + go_right
+            out[r, tree_output[t]] += value[node] * tree_scale[t]
+
+
+if numba is not None:
+    _traverse_dense = numba.njit(parallel=True, cache=True)(_traverse_dense)
+    _traverse_missing = numba.njit(parallel=True, cache=True)(_traverse_missing)
+
+
+# -----------------------------
+# ENGINE
+# -----------------------------
+class CompiledForest:
+    ARRAYS = ("feature", "threshold", "first_child", "default_left", "missing", "value",
+              "roots", "tree_output", "tree_depth", "base")
+
+    def __init__(self, arrays, meta):
+        for k in self.ARRAYS:
+            setattr(self, k, arrays[k])
+        self.meta = meta
+        self.features = meta["features"]
+        # (n_trees, n_outputs) matrix: leaf values @ assign sums every tree into its output
+        self.assign = np.zeros((len(self.roots), len(self.base)))
+        self.assign[np.arange(len(self.roots)), self.tree_output] = 1.0
+        for m in meta["models"]:
+            self.assign[:, m["start"]:m["stop"]] *= m["scale"]
+        # trees are stepped in depth buckets (<=4, <=8, <=16, ...) so shallow XGBoost trees
+        # do not pay for deep LightGBM ones
+        bucket = np.ceil(np.log2(np.maximum(self.tree_depth, 4))).astype(int)
+        self.groups = [(np.flatnonzero(bucket == b), int(self.tree_depth[bucket == b].max()))
+                       for b in np.unique(bucket)]
+        self.any_zero_missing = bool((self.missing == MISSING_ZERO).any())
+        self.tree_scale = self.assign[np.arange(len(self.roots)), self.tree_output]
+        self.backend = "numba" if numba is not None else "numpy"
+
+    @classmethod
+    def from_models(cls, models, features=None):
+        """models: {name: fitted XGBoost / LightGBM model (sklearn wrapper or Booster)}."""
+        features = list(features) if features is not None else []
+        for model in models.values():
+            features += [f for f in _model_features(model) if f not in features]
+        feature_index = {f: i for i, f in enumerate(features)}
+
+        builder = _Builder()
+        meta_models, bases = [], []
+        for name, model in models.items():
+            export = _export_xgboost if type(model).__module__.startswith("xgboost") else _export_lightgbm
+            start = sum(len(b) for b in bases)
+            n_out, base, transform, scale = export(builder, model, feature_index, start)
+            bases.append(np.asarray(base, dtype=float))
+            classes = getattr(model, "classes_", None)
+            meta_models.append({
+                "name": name, "start": start, "stop": start + n_out, "transform": transform, "scale": scale,
+                "classes": None if classes is None else np.asarray(classes).tolist(),
+            })
+
+        arrays = _layout(builder)
+        arrays["base"] = np.concatenate(bases)
+        return cls(arrays, {"features": features, "models": meta_models})
+
+    # ---- persistence
+    def save(self, path):
+        np.savez(path, meta=np.array(json.dumps(self.meta)), **{k: getattr(self, k) for k in self.ARRAYS})
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {k: data[k] for k in data.files if k != "meta"}
+            meta = json.loads(str(data["meta"]))
+        return cls(arrays, meta)
+
+    # ---- evaluation
+    def buffer(self, X):
+        """Contiguous float32 (n_rows, n_features) buffer in engine feature order."""
+        if isinstance(X, pd.DataFrame):
+            cols = X.columns.get_indexer(self.features)
+            fast = None
+            # narrow numeric frames (e.g. df[FEATURES]): one to_numpy + column take, ~10x faster than reindex
+            if (cols >= 0).all() and X.shape[1] <= 2 * len(self.features):
+                try:
+                    fast = X.to_numpy(dtype=np.float32)[:, cols]
+                except (TypeError, ValueError):
+                    fast = None
+            if fast is None:
+                missing = [f for f, c in zip(self.features, cols) if c < 0]
+                if missing:
+                    raise KeyError(f"Missing model features: {missing}")
+                fast = X.iloc[:, cols].to_numpy(dtype=np.float32)
+            X = fast
+        elif isinstance(X, dict):
+            X = np.array([[X.get(f, np.nan) for f in self.features]], dtype=np.float32)
+        return np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+
+    def _leaves(self, X, trees, depth):
+        """Leaf node reached in each of `trees` for every row of X: (n_rows, len(trees))."""
+        n, n_features = X.shape
+        flat = X.ravel()
+        row_offset = (np.arange(n, dtype=np.intp) * n_features)[:, None]
+        node = np.repeat(self.roots[trees][None, :], n, axis=0)
+        missing_path = self.any_zero_missing or bool(np.isnan(X).any())
+        for _ in range(depth):
+            x = flat.take(row_offset + self.feature.take(node))
+            threshold = self.threshold.take(node)
+            if missing_path:
+                mode = self.missing.take(node)
+                miss = np.isnan(x)
+                x = np.where(miss & (mode == MISSING_AS_ZERO), np.float32(0), x)
+                use_default = (miss & (mode != MISSING_AS_ZERO)) | ((mode == MISSING_ZERO) & (x == 0))
+                go_right = np.where(use_default, ~self.default_left.take(node), x >= threshold)
+            else:
+                go_right = x >= threshold          # NaN threshold (leaf) → False → stays
+            node = self.first_child.take(node) + go_right
+        return node
+
+    def _raw_chunk(self, X):
+        out = np.broadcast_to(self.base, (len(X), len(self.base))).copy()
+        for trees, depth in self.groups:
+            out += self.value.take(self._leaves(X, trees, depth)) @ self.assign[trees]
+        return out
+
+    def predict_raw(self, X, chunk_size=4_096, n_jobs=None):
+        """Margins for every model output: (n_rows, n_outputs) float64."""
+        X = self.buffer(X)
+        if self.backend == "numba":
+            out = np.broadcast_to(self.base, (len(X), len(self.base))).copy()
+            if self.any_zero_missing or np.isnan(X).any():
+                _traverse_missing(X, self.feature, self.threshold, self.first_child, self.default_left, self.missing,
+                                  self.value, self.roots, self.tree_output, self.tree_scale, out)
+            else:
+                _traverse_dense(X, self.feature, self.threshold, self.first_child, self.value,
+                                self.roots, self.tree_output, self.tree_depth, self.tree_scale, out)
+            return out
+        if len(X) <= chunk_size:
+            return self._raw_chunk(X)
+        chunks = [X[i:i + chunk_size] for i in range(0, len(X), chunk_size)]
+        # NumPy releases the GIL inside take/compare, so chunks run in parallel on threads
+        with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as pool:
+            return np.vstack(list(pool.map(self._raw_chunk, chunks)))
+
+    def predict(self, X, proba=False, chunk_size=4_096, n_jobs=None):
+        """
+        {model name: predictions} matching each wrapper's predict(): regression values,
+        class labels for classifiers (probabilities with proba=True).
+        """
+        raw = self.predict_raw(X, chunk_size, n_jobs)
+        out = {}
+        for m in self.meta["models"]:
+            margin = raw[:, m["start"]:m["stop"]]
+            if m["transform"] == "identity":
+                out[m["name"]] = margin[:, 0] if margin.shape[1] == 1 else margin
+                continue
+            if m["transform"] == "softmax":
+                e = np.exp(margin - margin.max(axis=1, keepdims=True))
+                p = e / e.sum(axis=1, keepdims=True)
+            else:
+                p1 = 1 / (1 + np.exp(-margin[:, 0]))
+                p = np.column_stack([1 - p1, p1])
+            if proba:
+                out[m["name"]] = p
+            else:
+                labels = np.asarray(m["classes"]) if m["classes"] is not None else np.arange(p.shape[1])
+                out[m["name"]] = labels[p.argmax(axis=1)]
+        return out
+
+
+# -----------------------------
+# BENCHMARK
+# -----------------------------
+def benchmark(models, X, runs=200):
+    """Single-row latency (median µs) and batch throughput: wrappers vs compiled engine."""
+    engine = CompiledForest.from_models(models)
+    row = X.iloc[[0]]
+
+    def median_us(fn, n):
+        fn()
+        times = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+        return round(float(np.median(times)) * 1e6, 1)
+
+    def wrappers(frame):
+        return {name: m.predict(frame[_model_features(m)]) for name, m in models.items()}
+
+    row_buf = engine.buffer(row)
+    single = {
+        "wrappers_us": median_us(lambda: wrappers(row), runs),
+        "compiled_from_frame_us": median_us(lambda: engine.predict(row), runs),
+        "compiled_from_buffer_us": median_us(lambda: engine.predict(row_buf), runs),
+    }
+    buf = engine.buffer(X)
+    t0 = time.perf_counter()
+    wrapped = wrappers(X)
+    t_wrap = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    compiled = engine.predict(buf)
+    t_comp = time.perf_counter() - t0
+    max_diff = {name: float(np.max(np.abs(np.asarray(wrapped[name], dtype=float) - np.asarray(compiled[name], dtype=float))))
+                for name in models}
+    batch = {"rows": len(X), "wrappers_s": round(t_wrap, 3), "compiled_s": round(t_comp, 3), "max_abs_diff": max_diff}
+    return {"single_row": single, "batch": batch}
+
+
+def main():
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Benchmark compiled forest inference against the model wrappers.")
+    parser.add_argument("artifact_dir", help="directory with test_xgb_risk*.joblib and test_features.json")
+    parser.add_argument("--rows", type=int, default=100_000, help="rows for the batch benchmark")
+    parser.add_argument("--runs", type=int, default=200, help="single-row calls (median is reported)")
+    args = parser.parse_args()
+
+    with open(os.path.join(args.artifact_dir, "test_features.json")) as f:
+        features = json.load(f)
+    models = {f"Risk_{h}": joblib.load(os.path.join(args.artifact_dir, f"test_xgb_risk{h}.joblib")) for h in (30, 60, 90)}
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.integers(0, 10, (args.rows, len(features))).astype(np.float32), columns=features)
+
+    results = benchmark(models, X, args.runs)
+    print(json.dumps(results, indent=2))
+    out = os.path.join(args.artifact_dir, f"bench_tree_infer_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
 project_file_path = "/media/jeyanth-s/DevDrive/AI_Workspace/projects/Cognitives---Member-Risk-Stratification-and-Care-Management/pipeline"
+import json
+import os
+import re
+import time
 import polars as pl
 from pathlib import Path
 import yaml
@@ -16,74 +20,263 @@ DB_ROOT = Path(paths["data_root"]) / "db"
 
 NULL_VALUES = ["", "NA", "NULL", "V0481"]
 
-# -------------------------
-# Helper: ingest CSV → Parquet (Polars)
-# -------------------------
-def ingest_one(in_path, out_path):
-    print(f"Ingesting {in_path} → {out_path}")
-    df = pl.scan_csv(in_path, null_values=NULL_VALUES, ignore_errors=True)
-    df.collect().write_parquet(out_path)
+# Parquet writer settings (row group size / compression), see config/paths.yaml
+INGEST_CFG = paths.get("ingest", {})
+COMPRESSION = INGEST_CFG.get("compression", "zstd")
+COMPRESSION_LEVEL = INGEST_CFG.get("compression_level", 3)
+ROW_GROUP_SIZE = INGEST_CFG.get("row_group_size", 250_000)
 
-# -------------------------
-# 1️⃣ Beneficiary (yearly)
-# -------------------------
-for year in [2008, 2009, 2010]:
-    in_path = RAW_ROOT / "beneficiary" / f"{year}_beneficiary.csv"
-    out_path = PARQUET_ROOT / "beneficiary" / f"{year}_beneficiary.parquet"
-    ingest_one(in_path, out_path)
+# Incremental mode: claim files are appended to hive-partitioned datasets instead of rebuilt
+INCREMENTAL_CFG = paths.get("incremental", {})
+INCREMENTAL = INCREMENTAL_CFG.get("enabled", False)
+INCREMENTAL_SOURCES = INCREMENTAL_CFG.get("sources", ["carrier", "inpatient", "outpatient", "pde"])
+BENE_BUCKETS = INCREMENTAL_CFG.get("bene_buckets", 16)
+PARTITIONED_ROOT = Path(paths["data_root"]) / INCREMENTAL_CFG.get("root", "parquet/partitioned")
+# claim date used for the claim_year / claim_month partitions
+PARTITION_DATE_COL = {"carrier": "CLM_FROM_DT", "inpatient": "CLM_FROM_DT",
+                      "outpatient": "CLM_FROM_DT", "pde": "SRVC_DT"}
 
 # -------------------------
-# 2️⃣ Inpatient (single)
+# Explicit schemas (SynPUF column conventions)
 # -------------------------
-in_path = RAW_ROOT / "inpatient" / "inpatient_2008_2010.csv"
-out_path = PARQUET_ROOT / "inpatient" / "inpatient_2008_2010.parquet"
-ingest_one(in_path, out_path)
+# IDs stay strings (leading zeros, no float coercion)
+ID_COLS = {"DESYNPUF_ID", "CLM_ID", "PDE_ID", "PROD_SRVC_ID"}
+# YYYYMMDD integers in the raw files → typed DATE
+DATE_COLS = {"BENE_BIRTH_DT", "BENE_DEATH_DT", "CLM_FROM_DT", "CLM_THRU_DT",
+             "CLM_ADMSN_DT", "NCH_BENE_DSCHRG_DT", "SRVC_DT"}
+# ICD-9 diagnosis/procedure and HCPCS codes → categorical
+CODE_COL_RE = re.compile(r"^(ADMTNG_ICD9_DGNS_CD|(LINE_)?ICD9_(DGNS|PRCDR)_CD_\d+|HCPCS_CD_\d+|CLM_DRG_CD)$")
+
+
+def read_header(in_path):
+    return pl.read_csv(in_path, n_rows=0).columns
+
+
+def csv_schema_overrides(columns):
+    # read every typed column as text first so nothing is inferred from the first rows
+    return {c: pl.Utf8 for c in columns if c in ID_COLS or c in DATE_COLS or CODE_COL_RE.match(c)}
+
+
+def typed_columns(columns):
+    exprs = []
+    for c in columns:
+        if c in DATE_COLS:
+            exprs.append(pl.col(c).str.strptime(pl.Date, "%Y%m%d", strict=False))
+        elif CODE_COL_RE.match(c):
+            exprs.append(pl.col(c).cast(pl.Categorical))
+    return exprs
+
 
 # -------------------------
-# 3️⃣ Outpatient (single)
+# Helper: ingest CSV → Parquet (Polars streaming, never materializes the full file)
 # -------------------------
-in_path = RAW_ROOT / "outpatient" / "outpatient_2008_2010.csv"
-out_path = PARQUET_ROOT / "outpatient" / "outpatient_2008_2010.parquet"
-ingest_one(in_path, out_path)
+def ingest_one(in_path, out_path):
+    print(f"Ingesting {in_path} → {out_path}")
+    columns = read_header(in_path)
+    lf = pl.scan_csv(
+        in_path,
+        null_values=NULL_VALUES,
+        ignore_errors=True,
+        schema_overrides=csv_schema_overrides(columns),
+    )
+    lf.with_columns(typed_columns(columns)).sink_parquet(
+        out_path,
+        compression=COMPRESSION,
+        compression_level=COMPRESSION_LEVEL,
+        row_group_size=ROW_GROUP_SIZE,
+    )
+
+
+def duckdb_typed_select(columns):
+    """SELECT list applying the same typing as typed_columns (DuckDB has no categorical; codes stay VARCHAR)."""
+    return ", ".join(
+        f"TRY_STRPTIME({c}, '%Y%m%d')::DATE AS {c}" if c in DATE_COLS else c
+        for c in columns
+    )
+
+
+def duckdb_read_csv(files, columns):
+    file_list = ", ".join(f"'{f}'" for f in files)
+    types = ", ".join(f"'{c}': 'VARCHAR'" for c in csv_schema_overrides(columns))
+    return f"read_csv([{file_list}], header=true, union_by_name=true, nullstr='V0481', types={{{types}}})"
 
 # -------------------------
-# 4️⃣ Carrier (two parts) → DuckDB ingestion for memory efficiency
+# Carrier (two parts) → DuckDB streaming COPY (no intermediate table)
 # -------------------------
+def ingest_carrier(carrier_parts, carrier_parquet_out):
+    con = duckdb.connect()
+    columns = read_header(carrier_parts[0])
+    print(f"Ingesting {len(carrier_parts)} carrier parts → {carrier_parquet_out}")
+    con.execute(f"""
+        COPY (
+            SELECT {duckdb_typed_select(columns)}
+            FROM {duckdb_read_csv(carrier_parts, columns)}
+        ) TO '{carrier_parquet_out}'
+        (FORMAT PARQUET, COMPRESSION {COMPRESSION}, ROW_GROUP_SIZE {ROW_GROUP_SIZE})
+    """)
+    con.close()
+    print("✅ Carrier ingestion completed!")
+
+
 # -------------------------
-# Carrier (two parts) → DuckDB ingestion
+# Incremental: new raw files → hive-partitioned Parquet
+#   partitioned/<source>/claim_year=YYYY/claim_month=M/bene_bucket=B/batch_<file>-<i>.parquet
+# Every raw file becomes its own "batch" of part files, so a file can be (re)ingested
+# without touching the partitions written by other files. _manifest.json records what
+# has been ingested (size + mtime per file).
 # -------------------------
-carrier_parts = sorted((RAW_ROOT / "carrier").glob("carrier_2008_2010_part*.csv"))
-carrier_parquet_out = PARQUET_ROOT / "carrier" / "carrier_2008_2010.parquet"
+def manifest_path(source):
+    return PARTITIONED_ROOT / source / "_manifest.json"
+
 
-if carrier_parquet_out.exists():
-    carrier_parquet_out.unlink()
+def read_manifest(path):
+    path = Path(path)
+    return json.loads(path.read_text()) if path.exists() else {}
 
-con = duckdb.connect()
 
-for i, f in enumerate(carrier_parts):
-    print(f"Ingesting {f} into DuckDB...")
-    if i == 0:
-        con.execute(f"""
-            CREATE TABLE carrier AS
-            SELECT * FROM read_csv_auto('{f}', nullstr='V0481')
-        """)
-    else:
-        con.execute(f"""
-            INSERT INTO carrier
-            SELECT * FROM read_csv_auto('{f}', nullstr='V0481')
-        """)
+def write_manifest(path, manifest):
+    tmp = Path(f"{path}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, path)
 
-print(f"Exporting Carrier to Parquet → {carrier_parquet_out}")
-con.execute(f"COPY carrier TO '{carrier_parquet_out}' (FORMAT PARQUET)")
-con.close()
-print("✅ Carrier ingestion completed!")
+
+def batch_name(csv_path):
+    return re.sub(r"[^0-9A-Za-z]+", "_", Path(csv_path).stem)
+
+
+def batch_parts(source_dir, batch):
+    """Part files of exactly this batch. "-" never occurs in a batch name, so Sample_1 does not
+    match Sample_10; parts written before the delimiter change (batch_<file>_<i>) are included."""
+    part_re = re.compile(rf"batch_{re.escape(batch)}[-_]\d+\.parquet")
+    return sorted(p for p in Path(source_dir).glob(f"**/batch_{batch}*.parquet") if part_re.fullmatch(p.name))
+
+
+def file_fingerprint(csv_path):
+    st = Path(csv_path).stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def ingest_partitioned(con, source, csv_path, source_dir):
+    """Write one raw file as batch_<file>-*.parquet into the partitioned dataset; returns row count."""
+    batch = batch_name(csv_path)
+    # drop parts from an earlier (changed or interrupted) ingest of the same file
+    for stale in batch_parts(source_dir, batch):
+        stale.unlink()
+
+    columns = read_header(csv_path)
+    date_col = PARTITION_DATE_COL[source]
+    rows = con.execute(f"""
+        COPY (
+            SELECT *,
+                   '{Path(csv_path).name}' AS _source_file,
+                   COALESCE(year({date_col}), 0) AS claim_year,
+                   COALESCE(month({date_col}), 0) AS claim_month,
+                   hash(DESYNPUF_ID) % {BENE_BUCKETS} AS bene_bucket
+            FROM (
+                SELECT {duckdb_typed_select(columns)}
+                FROM {duckdb_read_csv([csv_path], columns)}
+            )
+        ) TO '{source_dir}'
+        (FORMAT PARQUET, COMPRESSION {COMPRESSION}, ROW_GROUP_SIZE {ROW_GROUP_SIZE},
+         PARTITION_BY (claim_year, claim_month, bene_bucket),
+         FILENAME_PATTERN 'batch_{batch}-{{i}}', OVERWRITE_OR_IGNORE)
+    """).fetchone()[0]
+    return rows
+
+
+def ingest_new_files(inputs, manifest_file):
+    """Append raw files that are new (or changed) since the last run; already-ingested files are skipped."""
+    manifest_file = Path(manifest_file)
+    source_dir = manifest_file.parent
+    source = source_dir.name
+    source_dir.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(manifest_file)
+
+    todo = []
+    for f in inputs:
+        entry = manifest.get(Path(f).name, {})
+        if {k: entry.get(k) for k in ("size", "mtime_ns")} != file_fingerprint(f):
+            todo.append(f)
+    if not todo:
+        print(f"⏭️  {source}: no new files")
+        if not manifest_file.exists():
+            write_manifest(manifest_file, manifest)
+        return
+
+    con = duckdb.connect()
+    for f in todo:
+        print(f"Appending {f} → {source_dir}")
+        rows = ingest_partitioned(con, source, f, source_dir)
+        manifest[Path(f).name] = {
+            **file_fingerprint(f),
+            "batch": batch_name(f),
+            "rows": rows,
+            "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        # record after every file so an interrupted run only redoes the file in flight
+        write_manifest(manifest_file, manifest)
+    con.close()
+    print(f"✅ {source}: appended {len(todo)} file(s)")
 
 
 # -------------------------
-# 5️⃣ PDE (single)
+# Task list: one independent task per output file (used by run_pipeline.py)
 # -------------------------
-in_path = RAW_ROOT / "pde" / "pde_2008_2010.csv"
-out_path = PARQUET_ROOT / "pde" / "pde_2008_2010.parquet"
-ingest_one(in_path, out_path)
+def ingest_tasks():
+    """[{name, func, inputs, output}] — func(inputs, output) produces output from inputs."""
+    tasks = []
+
+    # 1️⃣ Beneficiary (yearly)
+    for year in [2008, 2009, 2010]:
+        tasks.append({
+            "name": f"beneficiary_{year}",
+            "func": "ingest_single",
+            "inputs": [RAW_ROOT / "beneficiary" / f"{year}_beneficiary.csv"],
+            "output": PARQUET_ROOT / "beneficiary" / f"{year}_beneficiary.parquet",
+        })
+
+    # Incremental mode: every raw CSV of a claim source, appended to its partitioned dataset
+    if INCREMENTAL:
+        for source in INCREMENTAL_SOURCES:
+            tasks.append({
+                "name": f"{source}_incremental",
+                "func": "ingest_new_files",
+                "inputs": sorted((RAW_ROOT / source).glob("*.csv")),
+                "output": manifest_path(source),
+            })
+
+    # 2️⃣ Inpatient, 3️⃣ Outpatient, 5️⃣ PDE (single files)
+    for source in ["inpatient", "outpatient", "pde"]:
+        if INCREMENTAL and source in INCREMENTAL_SOURCES:
+            continue
+        tasks.append({
+            "name": source,
+            "func": "ingest_single",
+            "inputs": [RAW_ROOT / source / f"{source}_2008_2010.csv"],
+            "output": PARQUET_ROOT / source / f"{source}_2008_2010.parquet",
+        })
+
+    # 4️⃣ Carrier (two parts)
+    if INCREMENTAL and "carrier" in INCREMENTAL_SOURCES:
+        return tasks
+    tasks.append({
+        "name": "carrier",
+        "func": "ingest_carrier",
+        "inputs": sorted((RAW_ROOT / "carrier").glob("carrier_2008_2010_part*.csv")),
+        "output": PARQUET_ROOT / "carrier" / "carrier_2008_2010.parquet",
+    })
+    return tasks
+
+
+def ingest_single(inputs, output):
+    ingest_one(inputs[0], output)
+
+
+def main():
+    for task in ingest_tasks():
+        globals()[task["func"]](task["inputs"], task["output"])
+    print("✅ Full ETL to Parquet completed successfully!")
+
 
-print("✅ Full ETL to Parquet completed successfully!")
+if __name__ == "__main__":
+    main()
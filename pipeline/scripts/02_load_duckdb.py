@@ -1,3 +1,5 @@
+import json
+import re
 import duckdb
 from pathlib import Path
 import yaml
@@ -9,86 +11,223 @@ project_file_path = Path(project_file_path)
 with open(project_file_path / "config/paths.yaml") as f:
     paths = yaml.safe_load(f)
 
-PARQUET_ROOT = Path(paths["data_root"]) / "parquet"
-DB_ROOT = Path(paths["data_root"]) / "db"
-DB_ROOT.mkdir(exist_ok=True, parents=True)
+# absolute: views embed these paths, and DuckDB resolves relative ones against the working
+# directory of whoever opens the database (the UIs run from other directories)
+DATA_ROOT = Path(paths["data_root"]).resolve()
+PARQUET_ROOT = DATA_ROOT / "parquet"
+DB_ROOT = DATA_ROOT / "db"
 DB_FILE = DB_ROOT / "synpuf.duckdb"
 
-# -------------------------
-# Connect DuckDB
-# -------------------------
-con = duckdb.connect(database=str(DB_FILE))
+INCREMENTAL_CFG = paths.get("incremental", {})
+INCREMENTAL = INCREMENTAL_CFG.get("enabled", False)
+INCREMENTAL_SOURCES = INCREMENTAL_CFG.get("sources", ["carrier", "inpatient", "outpatient", "pde"])
+PARTITIONED_ROOT = DATA_ROOT / INCREMENTAL_CFG.get("root", "parquet/partitioned")
+
+# "tables": copy every Parquet file into synpuf.duckdb (original behaviour)
+# "views":  zero-copy catalog — views over the Parquet files; DuckDB prunes row groups
+#           from the Parquet min/max statistics (and hive directories on claim_year /
+#           claim_month in incremental mode), so only HOT_AGGREGATES take space in the db
+LOAD_CFG = paths.get("duckdb_load", {})
+LOAD_MODE = LOAD_CFG.get("mode", "tables")
+
+# Small per-member aggregates that are read often; materialized as tables in both modes
+HOT_AGGREGATES = {
+    "member_inpatient_summary": """
+        SELECT DESYNPUF_ID,
+               COUNT(DISTINCT CLM_ID) AS ip_claims,
+               SUM(CLM_PMT_AMT) AS ip_paid,
+               MAX(CLM_THRU_DT) AS ip_last_thru_dt
+        FROM inpatient
+        GROUP BY DESYNPUF_ID
+    """,
+    "member_outpatient_summary": """
+        SELECT DESYNPUF_ID,
+               COUNT(DISTINCT CLM_ID) AS op_claims,
+               SUM(CLM_PMT_AMT) AS op_paid,
+               MAX(CLM_THRU_DT) AS op_last_thru_dt
+        FROM outpatient
+        GROUP BY DESYNPUF_ID
+    """,
+    "member_pde_summary": """
+        SELECT DESYNPUF_ID,
+               COUNT(*) AS rx_fills,
+               SUM(TOT_RX_CST_AMT) AS rx_cost,
+               MAX(SRVC_DT) AS rx_last_srvc_dt
+        FROM pde
+        GROUP BY DESYNPUF_ID
+    """,
+}
+MATERIALIZE = LOAD_CFG.get("materialize", list(HOT_AGGREGATES))
+
+
+def replace_object(con, name, kind, select_sql):
+    """CREATE OR REPLACE <kind> name AS select_sql, dropping a same-named object of the other kind."""
+    if kind == "VIEW":
+        if con.execute("SELECT 1 FROM duckdb_tables() WHERE table_name = ?", [name]).fetchone():
+            con.execute(f"DROP TABLE {name}")
+    elif con.execute("SELECT 1 FROM duckdb_views() WHERE view_name = ? AND NOT internal", [name]).fetchone():
+        con.execute(f"DROP VIEW {name}")
+    con.execute(f"CREATE OR REPLACE {kind} {name} AS {select_sql}")
+
+
+def batch_parts(source_dir, batch):
+    """Part files of exactly this batch (same rule as 01_ingest_to_parquet.batch_parts)."""
+    part_re = re.compile(rf"batch_{re.escape(batch)}[-_]\d+\.parquet")
+    return sorted(p for p in Path(source_dir).glob(f"**/batch_{batch}*.parquet") if part_re.fullmatch(p.name))
+
 
 # -------------------------
-# 1️⃣ Beneficiary (yearly)
+# Incremental load: append only the batches listed in the partition manifest
+# that are not yet in _loaded_files. Each batch is swapped in one transaction
+# (DELETE its rows, INSERT the new ones), so re-running is a no-op and a changed
+# raw file replaces its own rows only.
 # -------------------------
-beneficiary_dir = PARQUET_ROOT / "beneficiary"
-for year_file in sorted(beneficiary_dir.glob("*.parquet")):
-    table_name = f"beneficiary_{year_file.stem.split('_')[0]}"
-    print(f"Loading {year_file} → DuckDB table {table_name}")
-    con.execute(f"""
-        CREATE OR REPLACE TABLE {table_name} AS
-        SELECT * FROM read_parquet('{year_file}')
+def load_partitioned(con, table):
+    source_dir = PARTITIONED_ROOT / table
+    manifest_file = source_dir / "_manifest.json"
+    manifest = json.loads(manifest_file.read_text()) if manifest_file.exists() else {}
+
+    if con.execute("SELECT 1 FROM duckdb_views() WHERE view_name = ? AND NOT internal", [table]).fetchone():
+        con.execute(f"DROP VIEW {table}")  # previously loaded in views mode
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS _loaded_files (
+            source VARCHAR, file VARCHAR, batch VARCHAR,
+            size BIGINT, mtime_ns BIGINT, rows BIGINT, loaded_at TIMESTAMP
+        )
     """)
+    existing = {r[0] for r in con.execute(
+        "SELECT column_name FROM duckdb_columns() WHERE table_name = ?", [table]
+    ).fetchall()}
+    if existing and "_source_file" not in existing:
+        # table was built by a full (non-incremental) load: rebuild it from the partitions once
+        print(f"Table {table} was not loaded incrementally; rebuilding from {source_dir}")
+        con.execute(f"DROP TABLE {table}")
+        con.execute("DELETE FROM _loaded_files WHERE source = ?", [table])
 
-# Optionally, merge all years into a single table
-print("Merging all Beneficiary years into table 'beneficiary_all'")
-con.execute(f"""
-    CREATE OR REPLACE TABLE beneficiary_all AS
-    SELECT * FROM read_parquet('{beneficiary_dir}/2008_beneficiary.parquet')
-    UNION ALL
-    SELECT * FROM read_parquet('{beneficiary_dir}/2009_beneficiary.parquet')
-    UNION ALL
-    SELECT * FROM read_parquet('{beneficiary_dir}/2010_beneficiary.parquet')
-""")
+    loaded = {
+        file: (size, mtime_ns)
+        for file, size, mtime_ns in con.execute(
+            "SELECT file, size, mtime_ns FROM _loaded_files WHERE source = ?", [table]
+        ).fetchall()
+    }
+    todo = {f: e for f, e in manifest.items() if loaded.get(f) != (e["size"], e["mtime_ns"])}
+    if not todo:
+        print(f"⏭️  {table}: no new batches")
+        return
 
-# -------------------------
-# 2️⃣ Inpatient
-# -------------------------
-inpatient_file = PARQUET_ROOT / "inpatient" / "inpatient_2008_2010.parquet"
-print(f"Loading {inpatient_file} → DuckDB table inpatient")
-con.execute(f"""
-    CREATE OR REPLACE TABLE inpatient AS
-    SELECT * FROM read_parquet('{inpatient_file}')
-""")
+    for file, entry in sorted(todo.items()):
+        parts = batch_parts(source_dir, entry["batch"])
+        if not parts:
+            print(f"⚠️ No part files for batch {file} in {source_dir}; skipping")
+            continue
+        part_list = ", ".join(f"'{p}'" for p in parts)
+        batch = f"read_parquet([{part_list}], hive_partitioning=true, union_by_name=true)"
+        print(f"Appending batch {file} → DuckDB table {table}")
+        con.execute("BEGIN TRANSACTION")
+        try:
+            con.execute(f"CREATE TABLE IF NOT EXISTS {table} AS SELECT * FROM {batch} LIMIT 0")
+            con.execute(f"DELETE FROM {table} WHERE _source_file = ?", [file])
+            con.execute(f"INSERT INTO {table} BY NAME SELECT * FROM {batch} WHERE _source_file = ?", [file])
+            con.execute("DELETE FROM _loaded_files WHERE source = ? AND file = ?", [table, file])
+            con.execute(
+                "INSERT INTO _loaded_files VALUES (?, ?, ?, ?, ?, ?, now())",
+                [table, file, entry["batch"], entry["size"], entry["mtime_ns"], entry.get("rows")],
+            )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
 
-# -------------------------
-# 3️⃣ Outpatient
-# -------------------------
-outpatient_file = PARQUET_ROOT / "outpatient" / "outpatient_2008_2010.parquet"
-print(f"Loading {outpatient_file} → DuckDB table outpatient")
-con.execute(f"""
-    CREATE OR REPLACE TABLE outpatient AS
-    SELECT * FROM read_parquet('{outpatient_file}')
-""")
 
-# -------------------------
-# 4️⃣ Carrier
-# -------------------------
-carrier_file = PARQUET_ROOT / "carrier" / "carrier_2008_2010.parquet"
-print(f"Loading {carrier_file} → DuckDB table carrier")
-con.execute(f"""
-    CREATE OR REPLACE TABLE carrier AS
-    SELECT * FROM read_parquet('{carrier_file}')
-""")
+def load_table(con, table, parquet_file, mode=LOAD_MODE):
+    if INCREMENTAL and table in INCREMENTAL_SOURCES:
+        if mode == "views":
+            print(f"Registering {PARTITIONED_ROOT / table} → DuckDB view {table}")
+            replace_object(con, table, "VIEW", f"""
+                SELECT * FROM read_parquet('{PARTITIONED_ROOT / table}/**/*.parquet',
+                                           hive_partitioning=true, union_by_name=true)
+            """)
+        else:
+            load_partitioned(con, table)
+        return
+    kind = "VIEW" if mode == "views" else "TABLE"
+    parquet_file = Path(parquet_file).resolve()
+    print(f"Loading {parquet_file} → DuckDB {kind.lower()} {table}")
+    replace_object(con, table, kind, f"SELECT * FROM read_parquet('{parquet_file}')")
 
-# -------------------------
-# 5️⃣ PDE
-# -------------------------
-pde_file = PARQUET_ROOT / "pde" / "pde_2008_2010.parquet"
-print(f"Loading {pde_file} → DuckDB table pde")
-con.execute(f"""
-    CREATE OR REPLACE TABLE pde AS
-    SELECT * FROM read_parquet('{pde_file}')
-""")
 
-# -------------------------
-# Optional: check row counts
-# -------------------------
-tables = ["beneficiary_all", "inpatient", "outpatient", "carrier", "pde"]
-for t in tables:
-    count = con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
-    print(f"Table {t} has {count} rows")
+def materialize_hot_aggregates(con, names=None):
+    for name in names if names is not None else MATERIALIZE:
+        print(f"Materializing {name}")
+        replace_object(con, name, "TABLE", HOT_AGGREGATES[name])
+
+
+def main(mode=LOAD_MODE, db_file=DB_FILE):
+    if mode not in ("tables", "views"):
+        raise ValueError(f"Unknown duckdb_load.mode: {mode}")
+    kind = "VIEW" if mode == "views" else "TABLE"
+    Path(db_file).parent.mkdir(exist_ok=True, parents=True)
+
+    # -------------------------
+    # Connect DuckDB
+    # -------------------------
+    con = duckdb.connect(database=str(db_file))
+
+    # -------------------------
+    # 1️⃣ Beneficiary (yearly)
+    # -------------------------
+    beneficiary_dir = PARQUET_ROOT / "beneficiary"
+    for year_file in sorted(beneficiary_dir.glob("*.parquet")):
+        table_name = f"beneficiary_{year_file.stem.split('_')[0]}"
+        print(f"Loading {year_file} → DuckDB {kind.lower()} {table_name}")
+        replace_object(con, table_name, kind, f"SELECT * FROM read_parquet('{year_file}')")
+
+    # Optionally, merge all years into a single table
+    print(f"Merging all Beneficiary years into {kind.lower()} 'beneficiary_all'")
+    replace_object(con, "beneficiary_all", kind, f"""
+        SELECT * FROM read_parquet('{beneficiary_dir}/2008_beneficiary.parquet')
+        UNION ALL
+        SELECT * FROM read_parquet('{beneficiary_dir}/2009_beneficiary.parquet')
+        UNION ALL
+        SELECT * FROM read_parquet('{beneficiary_dir}/2010_beneficiary.parquet')
+    """)
+
+    # -------------------------
+    # 2️⃣ Inpatient
+    # -------------------------
+    load_table(con, "inpatient", PARQUET_ROOT / "inpatient" / "inpatient_2008_2010.parquet", mode)
+
+    # -------------------------
+    # 3️⃣ Outpatient
+    # -------------------------
+    load_table(con, "outpatient", PARQUET_ROOT / "outpatient" / "outpatient_2008_2010.parquet", mode)
+
+    # -------------------------
+    # 4️⃣ Carrier
+    # -------------------------
+    load_table(con, "carrier", PARQUET_ROOT / "carrier" / "carrier_2008_2010.parquet", mode)
+
+    # -------------------------
+    # 5️⃣ PDE
+    # -------------------------
+    load_table(con, "pde", PARQUET_ROOT / "pde" / "pde_2008_2010.parquet", mode)
+
+    # -------------------------
+    # Hot aggregates (materialized in both modes)
+    # -------------------------
+    materialize_hot_aggregates(con)
+
+    # -------------------------
+    # Optional: check row counts
+    # -------------------------
+    tables = ["beneficiary_all", "inpatient", "outpatient", "carrier", "pde"]
+    for t in tables:
+        count = con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+        print(f"Table {t} has {count} rows")
+
+    con.close()
+    print(f"✅ All Parquet files loaded into DuckDB ({mode}): {db_file}")
+
 
-con.close()
-print(f"✅ All Parquet files loaded into DuckDB: {DB_FILE}")
+if __name__ == "__main__":
+    main()
@@ -7,47 +7,127 @@ with open(project_file_path / "config/paths.yaml") as f:
     paths = yaml.safe_load(f)
 
 DB_PATH = Path(paths["data_root"]) / "db" / "synpuf.duckdb"
-conn = duckdb.connect(DB_PATH)
-
-# Example: aggregate Carrier claims by Part A / Part B
-conn.execute("""
-CREATE OR REPLACE TABLE carrier_part_a AS
-SELECT 
-    DESYNPUF_ID,
-    COUNT(DISTINCT CLM_ID) AS part_a_claims,
-    SUM(
-        COALESCE(LINE_NCH_PMT_AMT_1,0) + COALESCE(LINE_NCH_PMT_AMT_2,0)
-        -- add all LINE_NCH_PMT_AMT_3..13 similarly
-    ) AS part_a_spend
-FROM carrier
-GROUP BY DESYNPUF_ID
-""")
-
-conn.execute("""
-CREATE OR REPLACE TABLE carrier_part_b AS
-SELECT 
-    DESYNPUF_ID,
-    COUNT(DISTINCT CLM_ID) AS part_b_claims,
-    SUM(
-        COALESCE(LINE_BENE_PTB_DDCTBL_AMT_1,0) + COALESCE(LINE_BENE_PTB_DDCTBL_AMT_2,0)
-        -- add all LINE_BENE_PTB_DDCTBL_AMT_3..13 similarly
-    ) AS part_b_spend
-FROM carrier
-GROUP BY DESYNPUF_ID
-""")
-
-# Join with Beneficiary and other tables for ML features
-conn.execute("""
-CREATE OR REPLACE TABLE ml_features AS
-SELECT b.DESYNPUF_ID,
-       b.BENE_BIRTH_DT, b.BENE_SEX_IDENT_CD, b.BENE_RACE_CD,
-       ca.part_a_claims, ca.part_a_spend,
-       cb.part_b_claims, cb.part_b_spend
-FROM beneficiary_all b
-LEFT JOIN carrier_part_a ca USING(DESYNPUF_ID)
-LEFT JOIN carrier_part_b cb USING(DESYNPUF_ID)
-""")
-
-# Export ML-ready Parquet
-conn.execute("COPY ml_features TO '/media/jeyanth-s/DevDrive/AI_Workspace/projects/Cognitives---Member-Risk-Stratification-and-Care-Management/pipeline/features/ml_features.parquet' (FORMAT PARQUET)")
-conn.close()
+FEATURES_OUT = Path(paths["data_root"]) / paths["features"]
+
+# DuckDB parallelism for the feature build (0 = all cores)
+FEATURE_CFG = paths.get("feature_engine", {})
+THREADS = FEATURE_CFG.get("threads", 0)
+MEMORY_LIMIT = FEATURE_CFG.get("memory_limit")
+
+# -------------------------
+# Carrier line columns (SynPUF has 13 lines per claim: <prefix>_1 .. <prefix>_13)
+# -------------------------
+N_LINES = 13
+# amount columns → summed per member
+LINE_AMOUNTS = {
+    "LINE_NCH_PMT_AMT": "nch_pmt",
+    "LINE_BENE_PTB_DDCTBL_AMT": "ptb_ddctbl",
+    "LINE_BENE_PRMRY_PYR_PD_AMT": "prmry_pyr_pd",
+    "LINE_COINSRNC_AMT": "coinsrnc",
+    "LINE_ALOWD_CHRG_AMT": "alowd_chrg",
+}
+# code columns → filled lines and distinct codes per member
+LINE_CODES = {
+    "HCPCS_CD": "hcpcs",
+    "LINE_ICD9_DGNS_CD": "line_icd9",
+}
+
+
+def line_columns(available):
+    """{measure: [column for line 1..13]} restricted to the columns present in carrier."""
+    out = {}
+    for prefix, measure in {**LINE_AMOUNTS, **LINE_CODES}.items():
+        cols = [f"{prefix}_{i}" for i in range(1, N_LINES + 1)]
+        if any(c in available for c in cols):
+            out[measure] = [c if c in available else None for c in cols]
+    return out
+
+
+def carrier_features_sql(available):
+    """
+    One scan of carrier: every line column is unpivoted to (claim, line) rows and
+    all member aggregates come out of a single GROUP BY.
+    """
+    columns = line_columns(available)
+    measures = list(columns)
+
+    # UNPIVOT drops a line as soon as one of its values is NULL, so nothing may be NULL here:
+    # amounts default to 0 and codes to '' (counted with NULLIF below)
+    def typed(measure, col):
+        if measure in LINE_AMOUNTS.values():
+            return f"COALESCE(CAST({col} AS DOUBLE), 0)" if col else "0.0"
+        return f"COALESCE(TRIM(CAST({col} AS VARCHAR)), '')" if col else "''"
+
+    # per line: (nch_pmt_1, ptb_ddctbl_1, ..., hcpcs_1, ...) AS "1"
+    typed_cols = ",\n            ".join(
+        f"{typed(m, columns[m][i])} AS {m}_{i + 1}" for i in range(N_LINES) for m in measures
+    )
+    unpivot_on = ",\n            ".join(
+        "(" + ", ".join(f"{m}_{i + 1}" for m in measures) + f") AS \"{i + 1}\""
+        for i in range(N_LINES)
+    )
+
+    aggregates = ["COUNT(DISTINCT CLM_ID) AS carrier_claims"]
+    for m in LINE_AMOUNTS.values():
+        if m in columns:
+            aggregates.append(f"SUM({m}) AS carrier_{m}_amt")
+    for m in LINE_CODES.values():
+        if m in columns:
+            aggregates.append(f"COUNT(NULLIF({m}, '')) AS carrier_{m}_lines")
+            aggregates.append(f"COUNT(DISTINCT NULLIF({m}, '')) AS carrier_{m}_distinct")
+    # the old part_a_* / part_b_* features were these same carrier aggregates under other names
+    # (carrier_claims, carrier_nch_pmt_amt, carrier_ptb_ddctbl_amt), so they are not repeated
+    select_list = ",\n           ".join(aggregates)
+
+    return f"""
+    WITH claims AS (
+        SELECT DESYNPUF_ID, CLM_ID,
+            {typed_cols}
+        FROM carrier
+    ),
+    lines AS (
+        UNPIVOT claims
+        ON {unpivot_on}
+        INTO NAME line_num VALUE {", ".join(measures)}
+    )
+    SELECT DESYNPUF_ID,
+           {select_list}
+    FROM lines
+    GROUP BY DESYNPUF_ID
+    """
+
+
+def main():
+    FEATURES_OUT.parent.mkdir(parents=True, exist_ok=True)
+    conn = duckdb.connect(str(DB_PATH))
+    if THREADS:
+        conn.execute(f"SET threads = {int(THREADS)}")
+    if MEMORY_LIMIT:
+        conn.execute(f"SET memory_limit = '{MEMORY_LIMIT}'")
+
+    # All carrier line-level aggregates in one pass (wide 13-line columns → long → GROUP BY)
+    available = {c for (c,) in conn.execute(
+        "SELECT column_name FROM (DESCRIBE carrier)"
+    ).fetchall()}
+    conn.execute(f"CREATE OR REPLACE TABLE carrier_features AS {carrier_features_sql(available)}")
+
+    # Join with Beneficiary and other tables for ML features
+    feature_cols = [c for (c,) in conn.execute(
+        "SELECT column_name FROM (DESCRIBE carrier_features) WHERE column_name != 'DESYNPUF_ID'"
+    ).fetchall()]
+    conn.execute(f"""
+    CREATE OR REPLACE TABLE ml_features AS
+    SELECT b.DESYNPUF_ID,
+           b.BENE_BIRTH_DT, b.BENE_SEX_IDENT_CD, b.BENE_RACE_CD,
+           {", ".join(f"cf.{c}" for c in feature_cols)}
+    FROM beneficiary_all b
+    LEFT JOIN carrier_features cf USING(DESYNPUF_ID)
+    """)
+
+    # Export ML-ready Parquet
+    conn.execute(f"COPY ml_features TO '{FEATURES_OUT}' (FORMAT PARQUET)")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Member feature store: the full per-member feature vector, computed once per as-of date.
+
+Every claim source is scanned once (inpatient / outpatient / carrier as visits, PDE as
+fills) and joined to the yearly beneficiary chronic flags in a single DuckDB query.
+The result is written as Parquet keyed by DESYNPUF_ID:
+
+    <data_root>/feature_store/as_of=YYYY-MM-DD/member_features.parquet
+    <data_root>/feature_store/member_features.parquet     (copy of the latest as-of date)
+
+and registered in synpuf.duckdb as the view `member_features`. Models and UIs read these
+columns instead of recomputing them (ui/app.py, notebooks/tg.py, notebooks/see/ui.py).
+
+Features (years = beneficiary years <= as-of year, last = latest of them):
+  SP_<X>_<year>, SP_<X>          binary chronic flags per year / latest year
+  chronic_count_<year>           chronic flags set in that year
+  comorbidity_count_<last>, chronic_sum, chronic_trend (last - first year)
+  new_comorbidities_<year>, persistent_conditions, severity_score
+  AGE, AGE_<last>
+  inpatient_/outpatient_/carrier_ count + cost, recent_inpatient_date
+  total_visits, total_amount, last_visit_date, days_since_last_visit
+  recent_visits_30/60/90 (visits in the last N days), total_recent_visits, visit_ratio_30_to_90
+  spend_per_visit, log_total_amount, log_avg_claim, visits_per_chronic
+  drug_refills, days_supply_avg, total_drug_cost
+"""
+import os
+import re
+import shutil
+import duckdb
+from pathlib import Path
+import yaml
+project_file_path = "/media/jeyanth-s/DevDrive/AI_Workspace/projects/Cognitives---Member-Risk-Stratification-and-Care-Management/pipeline"
+project_file_path = Path(project_file_path)
+with open(project_file_path / "config/paths.yaml") as f:
+    paths = yaml.safe_load(f)
+
+DB_PATH = Path(paths["data_root"]) / "db" / "synpuf.duckdb"
+STORE_CFG = paths.get("feature_store", {})
+STORE_ROOT = Path(paths["data_root"]) / STORE_CFG.get("dir", "feature_store")
+AS_OF_DATES = [str(d) for d in STORE_CFG.get("as_of", ["2010-12-31"])]
+LATEST_OUT = STORE_ROOT / "member_features.parquet"
+
+CHRONIC_COLS = [
+    "SP_ALZHDMTA", "SP_CHF", "SP_CHRNKIDN", "SP_CNCR", "SP_COPD", "SP_DEPRESSN",
+    "SP_DIABETES", "SP_ISCHMCHT", "SP_OSTEOPRS", "SP_RA_OA", "SP_STRKETIA",
+]
+# weights on the latest year's flags
+SEVERITY_WEIGHTS = {
+    "SP_CHF": 3, "SP_CHRNKIDN": 3, "SP_COPD": 2, "SP_DIABETES": 2,
+    "SP_CNCR": 2, "SP_STRKETIA": 2, "SP_ALZHDMTA": 2, "SP_DEPRESSN": 1,
+}
+RECENCY_DAYS = (30, 60, 90)
+VISIT_SOURCES = ["inpatient", "outpatient", "carrier"]
+N_CARRIER_LINES = 13
+
+
+def store_path(as_of):
+    return STORE_ROOT / f"as_of={as_of}" / "member_features.parquet"
+
+
+def relation_columns(con, name):
+    return [c for (c,) in con.execute(f"SELECT column_name FROM (DESCRIBE {name})").fetchall()]
+
+
+def beneficiary_years(con, as_of):
+    names = con.execute("""
+        SELECT table_name FROM duckdb_tables()
+        UNION SELECT view_name FROM duckdb_views() WHERE NOT internal
+    """).fetchall()
+    years = sorted(int(m.group(1)) for (n,) in names if (m := re.fullmatch(r"beneficiary_(\d{4})", n)))
+    return [y for y in years if y <= int(as_of[:4])]
+
+
+def claim_amount(source, columns):
+    if source == "carrier":
+        lines = [f"COALESCE(LINE_NCH_PMT_AMT_{i}, 0)" for i in range(1, N_CARRIER_LINES + 1)
+                 if f"LINE_NCH_PMT_AMT_{i}" in columns]
+        return " + ".join(lines) or "0"
+    return "COALESCE(CLM_PMT_AMT, 0)" if "CLM_PMT_AMT" in columns else "0"
+
+
+def feature_sql(con, as_of):
+    years = beneficiary_years(con, as_of)
+    if not years:
+        raise ValueError(f"No beneficiary_<year> tables at or before {as_of}")
+    first, last = years[0], years[-1]
+    chronic = [c for c in CHRONIC_COLS if c in relation_columns(con, f"beneficiary_{last}")]
+    as_of_sql = f"DATE '{as_of}'"
+
+    # ---- beneficiary: one row per member, chronic flags pivoted per year (1 = yes, 2 = no in SynPUF)
+    bene_union = "\n        UNION ALL BY NAME\n        ".join(
+        f"SELECT DESYNPUF_ID, BENE_BIRTH_DT, BENE_SEX_IDENT_CD, BENE_RACE_CD, "
+        f"{', '.join(chronic) + ', ' if chronic else ''}{y} AS year FROM beneficiary_{y}"
+        for y in years
+    )
+    flag_cols = [
+        f"COALESCE(MAX(CASE WHEN year = {y} THEN CAST({c} = 1 AS INTEGER) END), 0) AS {c}_{y}"
+        for y in years for c in chronic
+    ]
+
+    # ---- claims: every visit source in one UNION ALL, aggregated once
+    visit_union = []
+    for source in VISIT_SOURCES:
+        cols = relation_columns(con, source)
+        thru = "CLM_THRU_DT" if "CLM_THRU_DT" in cols else "CLM_FROM_DT"
+        visit_union.append(
+            f"SELECT DESYNPUF_ID, '{source}' AS source, CLM_FROM_DT AS dt, {thru} AS thru_dt, "
+            f"CAST({claim_amount(source, cols)} AS DOUBLE) AS amt "
+            f"FROM {source} WHERE CLM_FROM_DT <= {as_of_sql}"
+        )
+    visit_aggs = []
+    for source in VISIT_SOURCES:
+        visit_aggs += [
+            f"COUNT(*) FILTER (WHERE source = '{source}') AS {source}_count",
+            f"COALESCE(SUM(amt) FILTER (WHERE source = '{source}'), 0) AS {source}_cost",
+        ]
+    visit_aggs.append("MAX(thru_dt) FILTER (WHERE source = 'inpatient') AS recent_inpatient_date")
+    visit_aggs += [f"COUNT(*) FILTER (WHERE dt > {as_of_sql} - INTERVAL {d} DAY) AS recent_visits_{d}"
+                   for d in RECENCY_DAYS]
+    visit_aggs += ["COUNT(*) AS total_visits", "COALESCE(SUM(amt), 0) AS total_amount", "MAX(dt) AS last_visit_date"]
+
+    # ---- derived features
+    def count(y):
+        return " + ".join(f"{c}_{y}" for c in chronic) or "0"
+
+    derived = [f"{c}_{last} AS {c}" for c in chronic]
+    derived += [f"{count(y)} AS chronic_count_{y}" for y in years]
+    derived += [
+        f"{count(last)} AS comorbidity_count_{last}",
+        f"{' + '.join(f'({count(y)})' for y in years)} AS chronic_sum",
+        f"({count(last)}) - ({count(first)}) AS chronic_trend",
+    ]
+    for prev, y in zip(years, years[1:]):
+        derived.append(" + ".join(f"GREATEST({c}_{y} - {c}_{prev}, 0)" for c in chronic or ["0"]) + f" AS new_comorbidities_{y}")
+    if len(years) > 1:
+        prev = years[-2]
+        derived.append(" + ".join(f"CAST({c}_{prev} + {c}_{last} = 2 AS INTEGER)" for c in chronic or ["0"]) + " AS persistent_conditions")
+    else:
+        derived.append("0 AS persistent_conditions")
+    severity = " + ".join(f"{w} * {c}_{last}" for c, w in SEVERITY_WEIGHTS.items() if c in chronic)
+    derived.append(f"{severity or '0'} AS severity_score")
+    derived += [
+        f"year({as_of_sql}) - year(BENE_BIRTH_DT) AS AGE",
+        f"year({as_of_sql}) - year(BENE_BIRTH_DT) AS AGE_{last}",
+        f"{' + '.join(f'recent_visits_{d}' for d in RECENCY_DAYS)} AS total_recent_visits",
+        f"CASE WHEN recent_visits_{RECENCY_DAYS[-1]} > 0 "
+        f"THEN recent_visits_{RECENCY_DAYS[0]} / recent_visits_{RECENCY_DAYS[-1]} ELSE 0 END AS visit_ratio_{RECENCY_DAYS[0]}_to_{RECENCY_DAYS[-1]}",
+        "total_amount / GREATEST(total_visits, 1) AS spend_per_visit",
+        "ln(1 + GREATEST(total_amount, 0)) AS log_total_amount",
+        "ln(1 + GREATEST(total_amount / GREATEST(total_visits, 1), 0)) AS log_avg_claim",
+        f"total_visits / (1 + {count(last)}) AS visits_per_chronic",
+        f"date_diff('day', last_visit_date, {as_of_sql}) AS days_since_last_visit",
+    ]
+
+    visit_cols = [f"{s}_{m}" for s in VISIT_SOURCES for m in ("count", "cost")]
+    visit_cols += [f"recent_visits_{d}" for d in RECENCY_DAYS] + ["total_visits", "total_amount"]
+
+    col_sep = ",\n               "
+    flag_select = "".join(f"{col_sep}{c}" for c in flag_cols)
+    visit_select = col_sep.join(visit_aggs)
+    visit_from = "\n            UNION ALL\n            ".join(visit_union)
+    base_select = col_sep.join(f"COALESCE(v.{c}, 0) AS {c}" for c in visit_cols)
+    derived_select = ",\n           ".join(derived)
+    return f"""
+    WITH bene AS (
+        SELECT DESYNPUF_ID,
+               MIN(BENE_BIRTH_DT) AS BENE_BIRTH_DT,
+               ANY_VALUE(BENE_SEX_IDENT_CD) AS BENE_SEX_IDENT_CD,
+               ANY_VALUE(BENE_RACE_CD) AS BENE_RACE_CD{flag_select}
+        FROM (
+        {bene_union}
+        )
+        GROUP BY DESYNPUF_ID
+    ),
+    visits AS (
+        SELECT DESYNPUF_ID,
+               {visit_select}
+        FROM (
+            {visit_from}
+        )
+        GROUP BY DESYNPUF_ID
+    ),
+    rx AS (
+        SELECT DESYNPUF_ID,
+               COUNT(*) AS drug_refills,
+               AVG(DAYS_SUPLY_NUM) AS days_supply_avg,
+               SUM(TOT_RX_CST_AMT) AS total_drug_cost
+        FROM pde
+        WHERE SRVC_DT <= {as_of_sql}
+        GROUP BY DESYNPUF_ID
+    ),
+    base AS (
+        SELECT b.*,
+               {base_select},
+               v.recent_inpatient_date,
+               v.last_visit_date,
+               COALESCE(rx.drug_refills, 0) AS drug_refills,
+               COALESCE(rx.days_supply_avg, 0) AS days_supply_avg,
+               COALESCE(rx.total_drug_cost, 0) AS total_drug_cost
+        FROM bene b
+        LEFT JOIN visits v USING (DESYNPUF_ID)
+        LEFT JOIN rx USING (DESYNPUF_ID)
+    )
+    SELECT *,
+           DATE '{as_of}' AS as_of_date,
+           {derived_select}
+    FROM base
+    ORDER BY DESYNPUF_ID
+    """
+
+
+def build(con, as_of):
+    out = store_path(as_of)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    print(f"Building member features as of {as_of} → {out}")
+    con.execute(f"COPY ({feature_sql(con, as_of)}) TO '{out}' (FORMAT PARQUET, COMPRESSION zstd)")
+    return out
+
+
+def main():
+    conn = duckdb.connect(str(DB_PATH))
+    outputs = {as_of: build(conn, as_of) for as_of in AS_OF_DATES}
+
+    # stable path for readers: the most recent as-of date. Copied next to it and renamed into
+    # place, so the UIs watching this file never open a half-written Parquet.
+    latest = outputs[max(outputs)]
+    tmp = LATEST_OUT.with_name(f"{LATEST_OUT.name}.{os.getpid()}.tmp")
+    shutil.copyfile(latest, tmp)
+    os.replace(tmp, LATEST_OUT)
+    # absolute path: DuckDB resolves a view's relative paths against the reader's working directory
+    conn.execute(f"CREATE OR REPLACE VIEW member_features AS SELECT * FROM read_parquet('{LATEST_OUT.resolve()}')")
+    rows = conn.execute("SELECT COUNT(*) FROM member_features").fetchone()[0]
+    conn.close()
+    print(f"✅ Feature store written: {LATEST_OUT} ({rows} members)")
+
+
+if __name__ == "__main__":
+    main()
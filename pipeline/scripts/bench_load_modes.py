@@ -0,0 +1,92 @@
+"""
+Benchmark 02_load_duckdb.py copy mode ("tables") against the zero-copy catalog ("views").
+
+For each mode a fresh database is built from the same Parquet files, then we report
+load time, database size on disk and median latency of a few typical queries.
+
+    python pipeline/scripts/bench_load_modes.py            # both modes, 5 runs per query
+    python pipeline/scripts/bench_load_modes.py --runs 10 --keep
+"""
+import argparse
+import importlib
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+load = importlib.import_module("02_load_duckdb")
+
+QUERIES = {
+    # point lookup: row-group pruning on DESYNPUF_ID
+    "member_lookup": """
+        SELECT * FROM carrier
+        WHERE DESYNPUF_ID = (SELECT MIN(DESYNPUF_ID) FROM beneficiary_2008)
+    """,
+    # range filter on claim date
+    "claims_2009": "SELECT COUNT(*) FROM carrier WHERE CLM_FROM_DT BETWEEN DATE '2009-01-01' AND DATE '2009-12-31'",
+    # full scan + group by (what 03_build_features.py does)
+    "member_spend": "SELECT DESYNPUF_ID, SUM(CLM_PMT_AMT) FROM inpatient GROUP BY DESYNPUF_ID",
+    # materialized hot aggregate
+    "hot_aggregate": "SELECT * FROM member_inpatient_summary ORDER BY ip_paid DESC LIMIT 20",
+}
+
+
+def db_size(db_file):
+    files = [Path(db_file), Path(f"{db_file}.wal")]
+    return sum(f.stat().st_size for f in files if f.exists())
+
+
+def bench_mode(mode, runs):
+    db_file = load.DB_ROOT / f"bench_{mode}.duckdb"
+    for f in (db_file, Path(f"{db_file}.wal")):
+        f.unlink(missing_ok=True)
+
+    start = time.perf_counter()
+    load.main(mode=mode, db_file=db_file)
+    load_s = time.perf_counter() - start
+
+    con = duckdb.connect(str(db_file), read_only=True)
+    latencies = {}
+    for name, sql in QUERIES.items():
+        times = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            con.execute(sql).fetchall()
+            times.append(time.perf_counter() - t0)
+        latencies[name] = round(statistics.median(times) * 1000, 2)
+    con.close()
+    return db_file, {"load_s": round(load_s, 2), "db_mb": round(db_size(db_file) / 1e6, 1), "query_ms": latencies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare DuckDB copy mode with Parquet views.")
+    parser.add_argument("--runs", type=int, default=5, help="runs per query (median is reported)")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark databases")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("tables", "views"):
+        db_file, results[mode] = bench_mode(mode, args.runs)
+        if not args.keep:
+            for f in (db_file, Path(f"{db_file}.wal")):
+                f.unlink(missing_ok=True)
+
+    print(f"\n{'':<16}{'tables':>12}{'views':>12}")
+    print(f"{'load (s)':<16}{results['tables']['load_s']:>12}{results['views']['load_s']:>12}")
+    print(f"{'db size (MB)':<16}{results['tables']['db_mb']:>12}{results['views']['db_mb']:>12}")
+    for name in QUERIES:
+        print(f"{name + ' (ms)':<16}{results['tables']['query_ms'][name]:>12}{results['views']['query_ms'][name]:>12}")
+
+    log_dir = Path(load.paths["data_root"]) / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    out = log_dir / f"bench_load_modes_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    out.write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
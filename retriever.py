@@ -1,17 +1,36 @@
-import os
 import re
-import pandas as pd
-from sentence_transformers import SentenceTransformer
+import threading
 import config
 import generator
-from pinecone import Pinecone
+from metrics import timed
+from patient_store import PatientStore
+from suggestion_cache import SuggestionCache
+from vector_store import get_vector_store
 
-# Load embedding model for queries
-embedder = SentenceTransformer(config.EMBEDDING_MODEL)
+# Embedding model and vector store (Pinecone or local, see config.VECTOR_BACKEND)
+# are built on first use so importing this module stays cheap; see preload().
+embedder = None
+index = None
+_init_lock = threading.Lock()
 
-# Init Pinecone
-pc = Pinecone(api_key=config.PINECONE_API_KEY)
-index = pc.Index(config.PINECONE_INDEX_NAME)
+def get_embedder():
+    global embedder
+    if embedder is None:
+        with _init_lock:
+            if embedder is None:
+                with timed("embedding_model_load_seconds"):
+                    from sentence_transformers import SentenceTransformer
+                    embedder = SentenceTransformer(config.EMBEDDING_MODEL)
+    return embedder
+
+def get_index():
+    global index
+    if index is None:
+        with _init_lock:
+            if index is None:
+                with timed("vector_store_connect_seconds"):
+                    index = get_vector_store()
+    return index
 
 # Map CSV flags to human disease names
 DISEASE_MAP = {
@@ -28,6 +47,12 @@ DISEASE_MAP = {
     "SP_STRKETIA": "Stroke/TIA"
 }
 
+# Patient CSV is parsed once and kept indexed by DESYNPUF_ID (reloads when the file changes)
+patient_store = PatientStore(config.PATIENT_CSV_PATH, DISEASE_MAP.keys())
+
+# Per-disease suggestions are reused across patients until the index is rebuilt
+suggestion_cache = SuggestionCache(config.SUGGESTION_CACHE_PATH) if config.USE_SUGGESTION_CACHE else None
+
 # simple sentence splitter - keeps punctuation
 _SENT_SPLIT_RE = re.compile(r'(?<=[\.\?\!])\s+')
 
@@ -52,15 +77,6 @@ def split_into_sentences(text: str):
     # strip each sentence
     return [s.strip() for s in sentences if s.strip()]
 
-def load_patient_data(path=config.PATIENT_CSV_PATH):
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Patient CSV not found at {path}")
-    df = pd.read_csv(path, dtype=str)
-    for col in DISEASE_MAP:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
-    return df
-
 def get_patient_diseases(row):
     diseases = []
     for flag_col, name in DISEASE_MAP.items():
@@ -88,25 +104,8 @@ def _get_text_from_match(m):
         txt = m.get("text") or m.get("content") or ""
     return txt or ""
 
-def retrieve_chunks_for_disease(disease, top_k=config.TOP_K, max_sentences=6):
-    """
-    Retrieve relevant sentences/chunks for a disease.
-    Filtering approach:
-      1) Query Pinecone for top_k matches.
-      2) For each matched chunk, split into sentences.
-      3) Keep sentences that mention the disease or important keywords (treat/diagnos/prevent/etc.).
-      4) Stop when we have up to max_sentences unique sentences.
-    """
-    query_text = disease
-    q_emb = embedder.encode(query_text).tolist()
-    try:
-        resp = index.query(vector=q_emb, top_k=top_k * 3, include_metadata=True)  # retrieve a few more and filter
-    except Exception as e:
-        print("❌ Pinecone query error:", e)
-        return []
-
-    matches = _get_matches_from_response(resp)
-
+def _select_sentences(disease, matches, top_k, max_sentences):
+    """Sentence filtering applied to the vector store matches for one disease."""
     # keywords to pick up treatment/diagnosis/prevention sentences
     keywords = [
         disease.lower(), "treat", "treatment", "manage", "management", "diagnos", "symptom",
@@ -146,25 +145,114 @@ def retrieve_chunks_for_disease(disease, top_k=config.TOP_K, max_sentences=6):
     # final dedupe keep order
     return results[:max_sentences]
 
+def retrieve_chunks_for_disease(disease, top_k=config.TOP_K, max_sentences=6):
+    """
+    Retrieve relevant sentences/chunks for a disease.
+    Filtering approach:
+      1) Query the vector store for top_k matches.
+      2) For each matched chunk, split into sentences.
+      3) Keep sentences that mention the disease or important keywords (treat/diagnos/prevent/etc.).
+      4) Stop when we have up to max_sentences unique sentences.
+    """
+    return retrieve_chunks_for_diseases([disease], top_k=top_k, max_sentences=max_sentences)[disease]
+
+def retrieve_chunks_for_diseases(diseases, top_k=config.TOP_K, max_sentences=6):
+    """
+    Batched version of retrieve_chunks_for_disease: one embedding call and one
+    multi-query against the vector store for all diseases, then per-disease filtering.
+    Returns {disease: [sentences]}.
+    """
+    diseases = list(dict.fromkeys(diseases))
+    if not diseases:
+        return {}
+    q_embs = get_embedder().encode(diseases).tolist()
+    try:
+        # retrieve a few more and filter
+        responses = get_index().query_many(vectors=q_embs, top_k=top_k * 3, include_metadata=True)
+    except Exception as e:
+        print("❌ Vector store query error:", e)
+        return {disease: [] for disease in diseases}
+
+    return {
+        disease: _select_sentences(disease, _get_matches_from_response(resp), top_k, max_sentences)
+        for disease, resp in zip(diseases, responses)
+    }
+
+
+def _suggestion_model_key():
+    # suggestions depend on both the embedder (retrieval) and the generator (or extractive fallback).
+    # Before the lazy load has been attempted this is only a guess (model assumed to load).
+    gen = config.GENERATIVE_MODEL if generator.is_available() else "extractive"
+    return f"{config.EMBEDDING_MODEL}|{gen}"
+
+
+def get_disease_suggestions(diseases, top_k=config.TOP_K):
+    """
+    Retrieve + summarize for several diseases, served from the suggestion cache when possible.
+    Cache misses are retrieved together in one batch. Returns a list aligned with `diseases`.
+    """
+    model_key = _suggestion_model_key()
+    # read before retrieving: if a re-index lands meanwhile, these results stay filed under the old version
+    index_version = suggestion_cache.index_version() if suggestion_cache is not None else None
+    found = {}
+    if suggestion_cache is not None:
+        for disease in diseases:
+            cached = suggestion_cache.get(disease, top_k, model_key)
+            if cached is not None:
+                found[disease] = cached
+
+    missing = [d for d in diseases if d not in found]
+    if missing:
+        chunks_by_disease = retrieve_chunks_for_diseases(missing, top_k=top_k)
+        # generator.summarize_many expects {disease: list of texts (short sentences/chunks)}
+        summaries = generator.summarize_many(chunks_by_disease)
+        # the load has been attempted now: file the results under the backend that actually produced them
+        produced_by = _suggestion_model_key()
+        for disease, chunks in chunks_by_disease.items():
+            suggestion = summaries[disease]
+            found[disease] = suggestion
+            # don't cache failed retrievals or generator errors
+            if suggestion_cache is not None and chunks and not suggestion["suggestion"].startswith("(generator error)"):
+                suggestion_cache.put(disease, top_k, produced_by, suggestion, index_version=index_version)
+
+    return [found[disease] for disease in diseases]
+
+
+def get_disease_suggestion(disease, top_k=config.TOP_K):
+    """Retrieve + summarize for one disease, served from the suggestion cache when possible."""
+    return get_disease_suggestions([disease], top_k=top_k)[0]
+
+
+def warm_suggestion_cache(top_k=config.TOP_K):
+    """Precompute suggestions for every DISEASE_MAP entry."""
+    get_disease_suggestions(list(DISEASE_MAP.values()), top_k=top_k)
+
+
+def preload(warm_cache=False):
+    """
+    Build the embedder, vector store client, generator and patient index up front.
+    Call before forking workers (e.g. gunicorn --preload) so the weights are shared copy-on-write.
+    """
+    with timed("preload_seconds"):
+        get_embedder()
+        get_index()
+        generator.get_generator_pipeline()
+        len(patient_store)
+        if warm_cache:
+            warm_suggestion_cache()
+
 
 def get_patient_info(desynpuf_id):
-    df = load_patient_data()
-    row_df = df[df["DESYNPUF_ID"].astype(str) == str(desynpuf_id)]
-    if row_df.empty:
+    flags = patient_store.get_flags(desynpuf_id)
+    if flags is None:
         return {"error": f"No patient with DESYNPUF_ID={desynpuf_id}"}
 
-    row = row_df.iloc[0].to_dict()
-    diseases = get_patient_diseases(row)
+    diseases = [DISEASE_MAP[col] for col in flags]
 
     if not diseases:
         return {"DESYNPUF_ID": desynpuf_id, "diseases": [], "suggestions": []}
 
-    suggestions = []
-    for disease in diseases:
-        chunks = retrieve_chunks_for_disease(disease, top_k=config.TOP_K)
-        # generator.summarize_context expects a list of texts (short sentences/chunks)
-        suggestion = generator.summarize_context(disease, chunks)
-        suggestions.append(suggestion)
+    suggestions = get_disease_suggestions(diseases, top_k=config.TOP_K)
 
     return {
         "DESYNPUF_ID": desynpuf_id,
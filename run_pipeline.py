@@ -1 +1,215 @@
+"""
+Entry point for the SynPUF ETL in pipeline/scripts.
 
+Stages run as a small DAG:
+    ingest:<file> (one task per Parquet output, run in parallel) → load_duckdb → build_features
+                                                                  → build_feature_store
+
+- Independent ingest tasks run on a process pool. A task only starts while the
+  estimated memory of everything running fits in the budget
+  (runner.memory_budget_gb in pipeline/config/paths.yaml).
+- A task is skipped when its outputs exist and its inputs are unchanged since the
+  last successful run (size + mtime, or content hash with --hash), and none of
+  its upstream tasks reran.
+- Per-task timings are written to pipeline/logs/run_<timestamp>.json.
+
+Usage:
+    python run_pipeline.py                # run what changed
+    python run_pipeline.py --force        # rerun everything
+    python run_pipeline.py --only ingest  # only tasks whose name starts with "ingest"
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent / "pipeline" / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+GB = 1024 ** 3
+
+
+def _run_task(script, func, args):
+    """Executed in a worker process: import the stage script and call one function."""
+    if str(SCRIPTS_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRIPTS_DIR))
+    start = time.perf_counter()
+    getattr(importlib.import_module(script), func)(*args)
+    return time.perf_counter() - start
+
+
+class Task:
+    def __init__(self, name, script, func, args=(), inputs=(), outputs=(), deps=(), mem_gb=0.5):
+        self.name = name
+        self.script = script
+        self.func = func
+        self.args = tuple(args)
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [Path(p) for p in outputs]
+        self.deps = list(deps)
+        self.mem_gb = mem_gb
+
+
+def file_signature(paths, use_hash=False):
+    h = hashlib.sha256()
+    for p in sorted(paths, key=str):
+        p = Path(p)
+        if not p.exists():
+            h.update(f"{p}:missing".encode())
+            continue
+        st = p.stat()
+        h.update(f"{p}:{st.st_size}:{st.st_mtime_ns}".encode())
+        if use_hash:
+            with open(p, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+    return h.hexdigest()
+
+
+def build_tasks(runner_cfg):
+    ingest = importlib.import_module("01_ingest_to_parquet")
+    load = importlib.import_module("02_load_duckdb")
+    features = importlib.import_module("03_build_features")
+    store = importlib.import_module("04_build_feature_store")
+
+    mem_per_input_gb = runner_cfg.get("mem_per_input_gb", 0.5)
+    tasks = []
+    for t in ingest.ingest_tasks():
+        input_gb = sum(Path(p).stat().st_size for p in t["inputs"] if Path(p).exists()) / GB
+        tasks.append(Task(
+            name=f"ingest:{t['name']}",
+            script="01_ingest_to_parquet",
+            func=t["func"],
+            args=(t["inputs"], t["output"]),
+            inputs=t["inputs"],
+            outputs=[t["output"]],
+            mem_gb=max(0.5, input_gb * mem_per_input_gb),
+        ))
+    ingest_names = [t.name for t in tasks]
+    ingest_outputs = [o for t in tasks for o in t.outputs]
+
+    tasks.append(Task("load_duckdb", "02_load_duckdb", "main",
+                      inputs=ingest_outputs, outputs=[load.DB_FILE], deps=ingest_names,
+                      mem_gb=runner_cfg.get("duckdb_mem_gb", 4)))
+    # synpuf.duckdb is not signed by the steps after load_duckdb: both write tables / views into
+    # it, which would make them look out of date on every run. They rerun when load_duckdb
+    # reran (upstream_changed) or when the Parquet their tables come from changed.
+    tasks.append(Task("build_features", "03_build_features", "main",
+                      inputs=ingest_outputs, outputs=[features.FEATURES_OUT], deps=["load_duckdb"],
+                      mem_gb=runner_cfg.get("duckdb_mem_gb", 4)))
+    # also writes to synpuf.duckdb, so it runs after build_features rather than alongside it
+    tasks.append(Task("build_feature_store", "04_build_feature_store", "main",
+                      inputs=[features.FEATURES_OUT], outputs=[store.LATEST_OUT], deps=["build_features"],
+                      mem_gb=runner_cfg.get("duckdb_mem_gb", 4)))
+    return tasks
+
+
+def run(tasks, state_path, log_dir, budget_gb, max_workers, force=False, use_hash=False):
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+    by_name = {t.name: t for t in tasks}
+    pending = list(tasks)
+    done, reran, failed = set(), set(), set()
+    running = {}  # future -> (task, signature, started)
+    timings = []
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # skip / launch every task whose dependencies are finished
+            for task in list(pending):
+                if any(d in failed for d in task.deps):
+                    pending.remove(task)
+                    failed.add(task.name)
+                    timings.append({"task": task.name, "status": "blocked"})
+                    continue
+                if not all(d in done for d in task.deps if d in by_name):
+                    continue
+                signature = file_signature(task.inputs, use_hash)
+                upstream_changed = any(d in reran for d in task.deps)
+                up_to_date = (
+                    not force and not upstream_changed
+                    and all(o.exists() for o in task.outputs)
+                    and state.get(task.name) == signature
+                )
+                if up_to_date:
+                    pending.remove(task)
+                    done.add(task.name)
+                    timings.append({"task": task.name, "status": "skipped"})
+                    print(f"⏭️  {task.name} up to date")
+                    continue
+                in_use = sum(t.mem_gb for t, _, _ in running.values())
+                if running and in_use + task.mem_gb > budget_gb:
+                    continue  # wait for memory to free up
+                pending.remove(task)
+                print(f"▶️  {task.name} (est. {task.mem_gb:.1f} GB)")
+                future = pool.submit(_run_task, task.script, task.func, task.args)
+                running[future] = (task, signature, time.time())
+
+            if not running:
+                if pending:
+                    raise RuntimeError(f"Unschedulable tasks: {[t.name for t in pending]}")
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task, signature, started = running.pop(future)
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    failed.add(task.name)
+                    timings.append({"task": task.name, "status": "failed", "error": str(e),
+                                    "seconds": round(time.time() - started, 3)})
+                    print(f"❌ {task.name} failed: {e}")
+                    continue
+                done.add(task.name)
+                reran.add(task.name)
+                state[task.name] = signature
+                # persist after every task so an interrupted run keeps its progress
+                state_path.write_text(json.dumps(state, indent=2))
+                timings.append({"task": task.name, "status": "ok", "seconds": round(seconds, 3)})
+                print(f"✅ {task.name} in {seconds:.1f}s")
+
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = log_dir / f"run_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    log_path.write_text(json.dumps(timings, indent=2))
+    print(f"Stage timings written to {log_path}")
+    return not failed
+
+
+def main():
+    ingest = importlib.import_module("01_ingest_to_parquet")
+    runner_cfg = ingest.paths.get("runner", {})
+    data_root = Path(ingest.paths["data_root"])
+
+    parser = argparse.ArgumentParser(description="Run the SynPUF ETL pipeline.")
+    parser.add_argument("--force", action="store_true", help="ignore up-to-date checks")
+    parser.add_argument("--hash", action="store_true", help="compare input content hashes instead of size/mtime")
+    parser.add_argument("--only", default=None, help="only run tasks whose name starts with this prefix")
+    parser.add_argument("--memory-gb", type=float, default=runner_cfg.get("memory_budget_gb", 12))
+    parser.add_argument("--workers", type=int, default=runner_cfg.get("max_workers", os.cpu_count()))
+    args = parser.parse_args()
+
+    tasks = build_tasks(runner_cfg)
+    if args.only:
+        selected = {t.name for t in tasks if t.name.startswith(args.only)}
+        tasks = [t for t in tasks if t.name in selected]
+
+    ok = run(
+        tasks,
+        state_path=data_root / "logs" / "pipeline_state.json",
+        log_dir=data_root / "logs",
+        budget_gb=args.memory_gb,
+        max_workers=args.workers,
+        force=args.force,
+        use_hash=args.hash,
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
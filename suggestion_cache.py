@@ -0,0 +1,104 @@
+"""
+Persistent cache for per-disease care suggestions.
+
+A suggestion only depends on (disease, top_k, index version, model name), so the
+Pinecone query + generator call can be reused across patients. Entries live in a
+small SQLite file; re-indexing (embeddings.upload_chunks / ingest.py) bumps the
+index version, which invalidates everything cached against the old index.
+
+Usage:
+    python suggestion_cache.py --warm    # precompute suggestions for every DISEASE_MAP entry
+    python suggestion_cache.py --clear   # bump index version (drops all entries)
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+import config
+
+
+class SuggestionCache:
+    def __init__(self, path=config.SUGGESTION_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS suggestions (
+                    disease TEXT NOT NULL,
+                    top_k INTEGER NOT NULL,
+                    index_version TEXT NOT NULL,
+                    model_name TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (disease, top_k, index_version, model_name)
+                )
+                """
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('index_version', '0')"
+            )
+
+    def index_version(self):
+        # read from disk every time: re-indexing usually happens in another process
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'index_version'"
+            ).fetchone()
+        return row[0] if row else "0"
+
+    def get(self, disease, top_k, model_name):
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT s.payload FROM suggestions s
+                JOIN meta m ON m.key = 'index_version' AND m.value = s.index_version
+                WHERE s.disease = ? AND s.top_k = ? AND s.model_name = ?
+                """,
+                (disease, int(top_k), model_name),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, disease, top_k, model_name, suggestion, index_version=None):
+        version = index_version or self.index_version()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO suggestions VALUES (?, ?, ?, ?, ?, ?)",
+                (disease, int(top_k), version, model_name, json.dumps(suggestion), time.time()),
+            )
+
+    def bump_index_version(self):
+        """Mark the vector index as changed: old entries become unreachable and are deleted."""
+        new_version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE meta SET value = ? WHERE key = 'index_version'", (new_version,)
+            )
+            self._conn.execute("DELETE FROM suggestions WHERE index_version != ?", (new_version,))
+        return new_version
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the disease suggestion cache.")
+    parser.add_argument("--warm", action="store_true", help="precompute suggestions for all diseases")
+    parser.add_argument("--clear", action="store_true", help="invalidate all cached suggestions")
+    args = parser.parse_args()
+
+    if args.clear:
+        print("New index version:", SuggestionCache().bump_index_version())
+    if args.warm:
+        import retriever
+        retriever.warm_suggestion_cache()
+        print("✅ Suggestion cache warmed for", len(retriever.DISEASE_MAP), "diseases")
@@ -1,10 +1,16 @@
+import os
+import sys
 from flask import Flask, render_template, request, redirect, url_for, session
-import duckdb
 import joblib
-import shap
-import numpy as np
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline", "notebooks"))
+from explain import ModelExplainer, top_drivers
+from tree_infer import CompiledForest
+from risk_table import RiskTableWatcher, build_risk_table, write_risk_table
+from db import MemberDB
+from member_store import LiveMemberStore
+
 # ------------------- CONFIG -------------------
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # ⚠️ Change this in production
@@ -13,30 +19,26 @@ app.secret_key = 'your_secret_key'  # ⚠️ Change this in production
 users = {'caremanager': 'password123', 'admin': 'adminpass'}
 
 # DuckDB (⚠️ update this path to your actual .duckdb file)
-con = duckdb.connect(
-    r"C:\Users\ashraf deen\Downloads\Cognitives- Member Risk Stratification and Care Management\Cognitives---Member-Risk-Stratification-and-Care-Management\pipeline\db\synpuf.duckdb",
-    read_only=True
-)
+DB_PATH = r"C:\Users\ashraf deen\Downloads\Cognitives- Member Risk Stratification and Care Management\Cognitives---Member-Risk-Stratification-and-Care-Management\pipeline\db\synpuf.duckdb"
 
-# Parquet paths
-MAIN_PATH = r"C:\Users\ashraf deen\Downloads\Cognitives- Member Risk Stratification and Care Management\Cognitives---Member-Risk-Stratification-and-Care-Management\pipeline\features\ml_features.parquet"
-CHRONIC_PATH = r"C:\Users\ashraf deen\Downloads\Cognitives- Member Risk Stratification and Care Management\Cognitives---Member-Risk-Stratification-and-Care-Management\pipeline\notebooks\combined_features_2010.parquet"
+# Member feature store (pipeline/scripts/04_build_feature_store.py): one row per member with
+# every model feature precomputed, so nothing is re-derived per request
+FEATURE_STORE_PATH = r"C:\Users\ashraf deen\Downloads\Cognitives- Member Risk Stratification and Care Management\Cognitives---Member-Risk-Stratification-and-Care-Management\pipeline\feature_store\member_features.parquet"
 
-# Load parquet data once (keep in memory for fast lookup)
+# Member lookups: Arrow file + hash index memory-mapped next to the Parquet (member_store.py),
+# shared through the page cache by every worker process and reopened when the ETL replaces it
 try:
-    ml_features_df = pd.read_parquet(MAIN_PATH)
-    chronic_features_df = pd.read_parquet(CHRONIC_PATH)
-    # Merge if both contain DESYNPUF_ID
-    if "DESYNPUF_ID" in ml_features_df.columns and "DESYNPUF_ID" in chronic_features_df.columns:
-        merged_features_df = pd.merge(
-            ml_features_df, chronic_features_df,
-            on="DESYNPUF_ID", how="left"
-        )
-    else:
-        merged_features_df = ml_features_df.copy()
+    member_store = LiveMemberStore(FEATURE_STORE_PATH)
 except Exception as e:
-    print("⚠️ Failed to load Parquet features:", e)
-    merged_features_df = pd.DataFrame()
+    print("⚠️ Failed to open member store, falling back to DuckDB lookups:", e)
+    member_store = None
+
+
+def lookup_member(bene_id, columns=None):
+    """Single-row DataFrame for a member (empty if unknown)."""
+    if member_store is not None:
+        return member_store.get(bene_id, columns=columns)
+    return db.get(bene_id, all_columns=columns is None)
 
 # Columns to display
 COLUMNS = [
@@ -48,6 +50,10 @@ COLUMNS = [
     "total_visits", "total_amount"
 ]
 
+# Per-thread cursors, bound parameters, cached count and keyset pages (db.py).
+# The member_features view reads the feature store Parquet, so that file is watched too.
+db = MemberDB(DB_PATH, columns=COLUMNS, watch=[FEATURE_STORE_PATH])
+
 # ------------------- MODELS -------------------
 model_30d = joblib.load("model_30d.pkl")
 model_60d = joblib.load("model_60d.pkl")
@@ -64,33 +70,50 @@ features_60 = ["AGE", "chronic_count_2010", "chronic_sum", "total_visits",
 features_90 = ["AGE", "chronic_sum", "total_visits", "log_total_amount",
                "spend_per_visit"]
 
-# ------------------- UTILS -------------------
-def shap_story(model, X, feature_names):
-    """Generate a story-like narrative from SHAP values"""
-    explainer = shap.TreeExplainer(model)
-    shap_values = explainer.shap_values(X)
+# 30/60/90d tiers in one fused pass over compiled tree arrays (pipeline/notebooks/tree_infer.py)
+try:
+    risk_engine = CompiledForest.from_models({"30d": model_30d, "60d": model_60d, "90d": model_90d})
+    if not set(risk_engine.features) <= set(features_30 + features_60 + features_90):
+        raise ValueError(f"models were trained on unnamed features: {risk_engine.features}")
+except Exception as e:
+    print("⚠️ Compiled inference unavailable, using model.predict:", e)
+    risk_engine = None
+
+# built once at startup instead of a new TreeExplainer per request
+explainer_90d = ModelExplainer(model_90d, features_90)
+
+# Tiers and 90d drivers for every member, precomputed (pipeline/notebooks/risk_table.py).
+# Rebuilt in the background when the feature store changes (nightly ETL) and swapped in once
+# complete; only members missing from it are scored live.
+RISK_TABLE_PATH = os.path.join(os.path.dirname(FEATURE_STORE_PATH), "risk_table_ui.parquet")
+HORIZON_FEATURES = {"30d": features_30, "60d": features_60, "90d": features_90}
+
+
+def build_ui_risk_table():
+    columns = ["DESYNPUF_ID", *dict.fromkeys(features_30 + features_60 + features_90)]
+    table = build_risk_table(
+        pd.read_parquet(FEATURE_STORE_PATH, columns=columns),
+        {"30d": model_30d, "60d": model_60d, "90d": model_90d},
+        HORIZON_FEATURES,
+        explainers={"90d": explainer_90d},
+        engine=risk_engine,
+        class_index="predicted",
+    )
+    write_risk_table(table, RISK_TABLE_PATH)
 
-    if isinstance(shap_values, list):
-        pred_class = int(model.predict(X)[0])
-        shap_vals = shap_values[pred_class][0]
-    else:
-        shap_vals = shap_values[0]
 
-    shap_vals = np.array(shap_vals).flatten().tolist()
-    feat_vals = np.array(X.iloc[0].values).flatten().tolist()
+risk_table = RiskTableWatcher(RISK_TABLE_PATH, sources=[FEATURE_STORE_PATH], rebuild=build_ui_risk_table)
 
-    data = []
-    for f, s, v in zip(feature_names, shap_vals, feat_vals):
-        data.append({
-            "feature": f,
-            "shap_value": float(s),
-            "feature_value": float(v)
-        })
+# ------------------- UTILS -------------------
+def shap_story(explainer, X):
+    """Generate a story-like narrative from SHAP values"""
+    # classifiers: explain the predicted class
+    shap_values = explainer.explain(X, class_index="predicted")
+    return drivers_story(top_drivers(shap_values[0], k=5))
 
-    shap_df = pd.DataFrame(data)
-    shap_df["abs_shap"] = shap_df["shap_value"].abs()
-    shap_df = shap_df.sort_values(by="abs_shap", ascending=False).head(5)
 
+def drivers_story(drivers):
+    """Narrative from the top SHAP drivers (live or read from the risk table)"""
     feature_map = {
         "AGE": "Patient's age",
         "chronic_sum": "Total number of chronic conditions (2008–2010)",
@@ -104,10 +127,10 @@ def shap_story(model, X, feature_names):
     }
 
     story_lines = []
-    for _, row in shap_df.iterrows():
-        f = feature_map.get(row["feature"], row["feature"])
-        s = row["shap_value"]
-        v = row["feature_value"]
+    for d in drivers:
+        f = feature_map.get(d["feature"], d["feature"])
+        s = d["shap_value"]
+        v = float(d["feature_value"])
         effect = "increased" if s > 0 else "reduced"
         story_lines.append(f"- **{f}** (value: {round(v,2)}) {effect} the predicted risk (impact {round(s,3)}).")
 
@@ -169,36 +192,15 @@ def members():
         return redirect(url_for('login'))
 
     bene_id = request.args.get("bene_id", "").strip()
-    page = int(request.args.get("page", 1))
+    page = max(request.args.get("page", 1, type=int), 1)
     per_page = 20
-    offset = (page - 1) * per_page
 
     if bene_id:
-        # First try from DuckDB
-        query = f"""
-            SELECT {",".join(COLUMNS)}
-            FROM combined_features
-            WHERE DESYNPUF_ID = '{bene_id}'
-            LIMIT 1
-        """
-        rows = con.execute(query).fetchdf().to_dict(orient="records")
-
-        # If not found in DB, fallback to Parquet
-        if not rows and not merged_features_df.empty:
-            rows = merged_features_df[merged_features_df["DESYNPUF_ID"] == bene_id]
-            rows = rows[COLUMNS].to_dict(orient="records")
-
+        rows = lookup_member(bene_id, COLUMNS).to_dict(orient="records")
         total_pages = 1
     else:
-        query = f"""
-            SELECT {",".join(COLUMNS)}
-            FROM combined_features
-            LIMIT {per_page} OFFSET {offset}
-        """
-        rows = con.execute(query).fetchdf().to_dict(orient="records")
-
-        total_count = con.execute("SELECT COUNT(*) FROM combined_features").fetchone()[0]
-        total_pages = (total_count // per_page) + (1 if total_count % per_page else 0)
+        rows = db.page(page, per_page)
+        total_pages = db.total_pages(per_page)
 
     return render_template(
         "member_data.html",
@@ -221,47 +223,38 @@ def predict():
     if request.method == "POST":
         bene_id = request.form["bene_id"].strip()
 
-        # Try DuckDB first
-        query = f"SELECT * FROM combined_features WHERE DESYNPUF_ID = '{bene_id}' LIMIT 1"
-        row = con.execute(query).fetchdf()
+        # Precomputed risk table first (one dict lookup, no model calls)
+        stored = risk_table.get(bene_id)
 
-        # If not found, fallback to Parquet
-        if row.empty and not merged_features_df.empty:
-            row = merged_features_df[merged_features_df["DESYNPUF_ID"] == bene_id]
+        # Members added since the last build: shared memory-mapped member store (one hash probe)
+        row = lookup_member(bene_id) if stored is None else None
 
-        if row.empty:
-            prediction = {"error": f"Beneficiary ID {bene_id} not found in DB or Parquet."}
+        if stored is not None:
+            prediction = {h: tier_map[int(stored[h])] for h in ("30d", "60d", "90d")}
+            shap_text = drivers_story(stored["drivers__90d"])
+        elif row.empty:
+            prediction = {"error": f"Beneficiary ID {bene_id} not found."}
         else:
             row = row.iloc[[0]].copy()
 
-            # Feature engineering
-            row["AGE"] = 2010 - pd.to_datetime(row["BENE_BIRTH_DT"]).dt.year
-            row["chronic_trend"] = row["chronic_count_2010"].fillna(0) - row["chronic_count_2008"].fillna(0)
-            row["chronic_sum"] = (
-                row["chronic_count_2008"].fillna(0)
-                + row["chronic_count_2009"].fillna(0)
-                + row["chronic_count_2010"].fillna(0)
-            )
-
-            row["spend_per_visit"] = row["total_amount"] / (row["total_visits"].iloc[0] if row["total_visits"].iloc[0] > 0 else 1)
-            row["log_total_amount"] = np.log1p(row["total_amount"])
-            row["log_avg_claim"] = np.log1p(row["total_amount"] / (row["total_visits"].iloc[0] if row["total_visits"].iloc[0] > 0 else 1))
-            row["visits_per_chronic"] = row["total_visits"] / (1 + row["chronic_count_2010"].fillna(0))
-
             # Extract features
             X30 = row[features_30]
             X60 = row[features_60]
             X90 = row[features_90]
 
             # Predictions
-            pred_30 = tier_map[int(model_30d.predict(X30)[0])]
-            pred_60 = tier_map[int(model_60d.predict(X60)[0])]
-            pred_90 = tier_map[int(model_90d.predict(X90)[0])]
+            if risk_engine is not None:
+                preds = risk_engine.predict(row)
+                pred_30, pred_60, pred_90 = (tier_map[int(preds[h][0])] for h in ("30d", "60d", "90d"))
+            else:
+                pred_30 = tier_map[int(model_30d.predict(X30)[0])]
+                pred_60 = tier_map[int(model_60d.predict(X60)[0])]
+                pred_90 = tier_map[int(model_90d.predict(X90)[0])]
 
             prediction = {"30d": pred_30, "60d": pred_60, "90d": pred_90}
 
             # Narrative for 90d
-            shap_text = shap_story(model_90d, X90, features_90)
+            shap_text = shap_story(explainer_90d, X90)
 
     return render_template("predict.html", prediction=prediction, shap_text=shap_text)
 
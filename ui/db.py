@@ -0,0 +1,104 @@
+"""
+Read-only DuckDB access for the member pages in app.py.
+
+- one cursor per Flask worker thread (cursors of a single read-only connection)
+- fixed statement texts with bound parameters; ids are never formatted into SQL
+- a sorted in-memory index of member ids, rebuilt only when the database or the
+  feature store Parquet behind the member_features view changes; it also gives the row count
+- keyset pagination: page N starts at ids[(N - 1) * per_page], then
+  WHERE DESYNPUF_ID >= ? ORDER BY DESYNPUF_ID LIMIT ?
+  so deep pages cost the same as the first one
+
+    db = MemberDB(DB_PATH, columns=COLUMNS, watch=[FEATURE_STORE_PATH])
+    rows = db.page(3, per_page=20)
+    row = db.get("00013D2EFD8E45D1")
+"""
+import os
+import threading
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+
+class MemberDB:
+    def __init__(self, db_path, table="member_features", key="DESYNPUF_ID", columns=None,
+                 watch=(), check_every=5.0):
+        self.db_path = db_path
+        self.table = table
+        self.key = key
+        self.watch = [db_path, *watch]
+        self.check_every = check_every
+        self._con = duckdb.connect(db_path, read_only=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ids = None
+        self._version = None
+        self._checked_at = 0.0
+
+        select = ", ".join(f'"{c}"' for c in columns) if columns else "*"
+        self._sql = {
+            "page": f'SELECT {select} FROM "{table}" WHERE "{key}" >= ? ORDER BY "{key}" LIMIT ?',
+            "get": f'SELECT {select} FROM "{table}" WHERE "{key}" = ? LIMIT 1',
+            "get_all": f'SELECT * FROM "{table}" WHERE "{key}" = ? LIMIT 1',
+            "ids": f'SELECT "{key}" FROM "{table}" ORDER BY "{key}"',
+        }
+
+    def cursor(self):
+        cur = getattr(self._local, "cursor", None)
+        if cur is None:
+            cur = self._local.cursor = self._con.cursor()
+        return cur
+
+    # ---------- index ----------
+    def _current_version(self):
+        stats = []
+        for p in self.watch:
+            try:
+                st = os.stat(p)
+                stats.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stats.append(None)
+        return tuple(stats)
+
+    def ids(self):
+        """Sorted member ids (numpy array); rebuilt when a watched file changes."""
+        now = time.monotonic()
+        if self._ids is not None and now - self._checked_at < self.check_every:
+            return self._ids
+        with self._lock:
+            version = self._current_version()
+            if self._ids is None or version != self._version:
+                rows = self.cursor().execute(self._sql["ids"]).fetchnumpy()[self.key]
+                self._ids = np.asarray(rows, dtype=object)
+                self._version = version
+            self._checked_at = now
+        return self._ids
+
+    def count(self):
+        return len(self.ids())
+
+    def total_pages(self, per_page):
+        return max(1, -(-self.count() // per_page))
+
+    def contains(self, member_id):
+        ids = self.ids()
+        i = np.searchsorted(ids, member_id)
+        return i < len(ids) and ids[i] == member_id
+
+    # ---------- queries ----------
+    def page(self, page, per_page=20):
+        """Rows of a 1-based page as a list of dicts (empty past the last page)."""
+        ids = self.ids()
+        start = (max(page, 1) - 1) * per_page
+        if start >= len(ids):
+            return []
+        return self.cursor().execute(self._sql["page"], [ids[start], per_page]).fetchdf().to_dict(orient="records")
+
+    def get(self, member_id, all_columns=False):
+        """One member as a DataFrame (empty if the id is unknown)."""
+        if not self.contains(member_id):
+            return pd.DataFrame()
+        sql = self._sql["get_all" if all_columns else "get"]
+        return self.cursor().execute(sql, [member_id]).fetchdf()
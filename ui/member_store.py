@@ -0,0 +1,243 @@
+"""
+Read-optimized member lookups shared by every app.py worker process.
+
+The feature store Parquet is converted once into an uncompressed Arrow IPC file and a
+hash index, both memory-mapped by each worker. The pages live in the OS page cache, so N
+workers share one copy instead of each holding a pandas frame in its own heap.
+
+    member_features.<sig>.arrow     Arrow IPC file (same rows / columns as the Parquet)
+    member_features.<sig>.idx.npy   open-addressing hash table: slot → row offset (-1 = empty)
+    member_features.current         <sig> of the version to open (replaced atomically)
+
+<sig> is the Parquet's mtime and size. Each rebuild writes a new version instead of
+overwriting files other workers have mapped (Windows refuses to replace or delete a
+mapped file), then swaps the pointer; versions nothing maps any more are deleted.
+
+Ids are hashed with pandas.util.hash_array (stable across processes, unlike hash()) and
+probed linearly. A hit is confirmed against the id column, so a lookup is O(1) and never
+scans the table.
+
+    store = MemberStore.open(FEATURE_STORE_PATH)      # builds a new version if the Parquet is newer
+    row = store.get("00013D2EFD8E45D1", columns=COLUMNS)   # single-row DataFrame, empty if unknown
+
+LiveMemberStore follows the Parquet: when the nightly ETL replaces it, a new version is
+built by a single process (lock file, pipeline/notebooks/build_lock.py, so the caller puts
+that directory on sys.path) and every worker reopens them and swaps the store in.
+
+    members = LiveMemberStore(FEATURE_STORE_PATH)
+    row = members.get("00013D2EFD8E45D1", columns=COLUMNS)
+"""
+import glob
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from build_lock import exclusive_build, wait_for_release
+
+
+def _hash(ids):
+    return pd.util.hash_array(np.asarray(ids, dtype=object), categorize=False)
+
+
+def build_hash_index(ids):
+    """Slot table (int64, size = power of two >= 2n) mapping hash(id) → row offset."""
+    n = len(ids)
+    size = 1 << max(int(np.ceil(np.log2(max(2 * n, 2)))), 1)
+    mask = np.uint64(size - 1)
+    table = np.full(size, -1, dtype=np.int64)
+
+    slot = _hash(ids) & mask
+    remaining = np.arange(n)
+    while remaining.size:
+        s = slot[remaining]
+        free = table[s] == -1
+        # several rows may want the same free slot in one round: the first one wins
+        taken, first = np.unique(s[free], return_index=True)
+        winners = remaining[free][first]
+        table[taken] = winners
+        placed = np.zeros(n, dtype=bool)
+        placed[winners] = True
+        remaining = remaining[~placed[remaining]]
+        slot[remaining] = (slot[remaining] + np.uint64(1)) & mask
+    return table
+
+
+class MemberStore:
+    def __init__(self, arrow_path, index_path, key="DESYNPUF_ID"):
+        self.key = key
+        self._source = pa.memory_map(arrow_path, "r")
+        self.table = pa.ipc.open_file(self._source).read_all()    # zero-copy over the mapping
+        self._keys = self.table.column(key)
+        self._slots = np.load(index_path, mmap_mode="r")
+        self._mask = np.uint64(len(self._slots) - 1)
+
+    @staticmethod
+    def _base(parquet_path):
+        return os.path.splitext(parquet_path)[0]
+
+    @staticmethod
+    def source_version(parquet_path):
+        st = os.stat(parquet_path)
+        return f"{st.st_mtime_ns}_{st.st_size}"
+
+    @classmethod
+    def pointer_path(cls, parquet_path):
+        return f"{cls._base(parquet_path)}.current"
+
+    @classmethod
+    def sidecar_paths(cls, parquet_path, version):
+        base = f"{cls._base(parquet_path)}.{version}"
+        return f"{base}.arrow", f"{base}.idx.npy"
+
+    @classmethod
+    def current_version(cls, parquet_path):
+        """Version named by the pointer file, or None."""
+        try:
+            with open(cls.pointer_path(parquet_path), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @classmethod
+    def build(cls, parquet_path, key="DESYNPUF_ID"):
+        """Write a new Arrow file + hash index version, then point the pointer file at it."""
+        version = cls.source_version(parquet_path)
+        arrow_path, index_path = cls.sidecar_paths(parquet_path, version)
+        table = pq.read_table(parquet_path)
+        pid = os.getpid()
+
+        tmp = f"{arrow_path}.{pid}.tmp"
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, arrow_path)
+
+        tmp = f"{index_path}.{pid}.tmp.npy"
+        np.save(tmp, build_hash_index(table.column(key).to_numpy(zero_copy_only=False)))
+        os.replace(tmp, index_path)
+
+        pointer = cls.pointer_path(parquet_path)
+        tmp = f"{pointer}.{pid}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(version)
+        for attempt in range(10):
+            try:
+                os.replace(tmp, pointer)
+                break
+            except PermissionError:    # Windows: a reader has the pointer open for a moment
+                if attempt == 9:
+                    raise
+                time.sleep(0.1)
+        cls.remove_old_versions(parquet_path)
+        return arrow_path, index_path
+
+    @classmethod
+    def remove_old_versions(cls, parquet_path):
+        """Delete sidecar versions other than the current one; ones still mapped are kept for later."""
+        base = cls._base(parquet_path)
+        keep = set(cls.sidecar_paths(parquet_path, cls.current_version(parquet_path)))
+        old = glob.glob(f"{glob.escape(base)}.*.arrow") + glob.glob(f"{glob.escape(base)}.*.idx.npy")
+        old += [f"{base}.arrow", f"{base}.idx.npy"]    # unversioned sidecars of earlier releases
+        for path in old:
+            if path not in keep and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:    # still memory-mapped by a worker (Windows)
+                    pass
+
+    @classmethod
+    def is_stale(cls, parquet_path):
+        version = cls.current_version(parquet_path)
+        return version != cls.source_version(parquet_path) or not all(
+            os.path.exists(p) for p in cls.sidecar_paths(parquet_path, version)
+        )
+
+    @classmethod
+    def open(cls, parquet_path, key="DESYNPUF_ID", wait=300):
+        """
+        Open the current version of the shared store, building a new one first if the Parquet
+        changed. Only one process builds (lock file next to the Parquet); the others wait for it.
+        """
+        if cls.is_stale(parquet_path):
+            lock_path = f"{cls._base(parquet_path)}.build.lock"
+            with exclusive_build(lock_path) as owner:
+                if owner and cls.is_stale(parquet_path):
+                    cls.build(parquet_path, key)
+            if not owner:
+                wait_for_release(lock_path, wait)
+        for attempt in range(3):
+            try:
+                return cls(*cls.sidecar_paths(parquet_path, cls.current_version(parquet_path)), key)
+            except FileNotFoundError:
+                # the pointer moved on (and the old version was deleted) between reading and opening
+                if attempt == 2:
+                    raise
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def offset(self, member_id):
+        """Row offset of member_id, or None."""
+        slot = _hash([member_id])[0] & self._mask
+        while True:
+            row = int(self._slots[slot])
+            if row < 0:
+                return None
+            if self._keys[row].as_py() == member_id:
+                return row
+            slot = (slot + np.uint64(1)) & self._mask
+
+    def get(self, member_id, columns=None):
+        """Single-row DataFrame for member_id (empty DataFrame if unknown)."""
+        row = self.offset(member_id)
+        if row is None:
+            return pd.DataFrame(columns=columns or self.table.column_names)
+        table = self.table.select(columns) if columns else self.table
+        return table.slice(row, 1).to_pandas()
+
+
+class LiveMemberStore:
+    """MemberStore that is reopened (new version built if stale) whenever the Parquet changes."""
+
+    def __init__(self, parquet_path, key="DESYNPUF_ID", check_every=5.0):
+        self.parquet_path = parquet_path
+        self.key = key
+        self.check_every = check_every
+        self._lock = threading.Lock()
+        self._version = self._file_version()
+        self.store = MemberStore.open(parquet_path, key)
+        self._checked_at = time.monotonic()
+
+    def _file_version(self):
+        st = os.stat(self.parquet_path)
+        return st.st_mtime_ns, st.st_size
+
+    def current(self):
+        """The store for the newest Parquet; the previous one keeps serving while it is rebuilt."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_every:
+            return self.store
+        with self._lock:
+            if now - self._checked_at >= self.check_every:
+                try:
+                    version = self._file_version()
+                    if version != self._version:
+                        store = MemberStore.open(self.parquet_path, self.key)
+                        self.store, self._version = store, version    # swap once fully opened
+                        print(f"✅ Member store reopened: {len(store)} members")
+                        MemberStore.remove_old_versions(self.parquet_path)
+                    self._checked_at = time.monotonic()
+                except Exception as e:
+                    print(f"⚠️ Member store refresh failed, serving the previous version: {e}")
+                    self._checked_at = time.monotonic() + 60    # back off before rebuilding again
+        return self.store
+
+    def __len__(self):
+        return len(self.current())
+
+    def get(self, member_id, columns=None):
+        return self.current().get(member_id, columns=columns)
@@ -0,0 +1,286 @@
+"""
+Pluggable vector store used by retriever.py, embeddings.py and ingest.py.
+
+Backends (selected with config.VECTOR_BACKEND):
+  - "pinecone": the hosted Pinecone index (original behaviour)
+  - "local":    chunk embeddings persisted on disk as an L2-normalised float32 matrix
+                (vectors.npy, memory-mapped) plus metadata.json. Queries are exact cosine
+                top-k with one matmul; optional "ivf" (numpy k-means lists) or "hnsw"
+                (faiss, if installed) modes trade exactness for speed on larger corpora.
+
+Both backends accept the same upsert payloads ({"id", "values", "metadata"} dicts or
+(id, values, metadata) tuples) and return query responses shaped like Pinecone's:
+{"matches": [{"id", "score", "metadata"}, ...]}.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import config
+
+
+class VectorStore:
+    def upsert(self, vectors):
+        raise NotImplementedError
+
+    def query(self, vector, top_k, include_metadata=True):
+        raise NotImplementedError
+
+    def query_many(self, vectors, top_k, include_metadata=True):
+        """Run several queries; returns one response per vector, in order."""
+        return [self.query(v, top_k, include_metadata=include_metadata) for v in vectors]
+
+    def flush(self):
+        """Persist buffered upserts (no-op for backends that write through)."""
+
+
+class PineconeVectorStore(VectorStore):
+    def __init__(self, api_key=config.PINECONE_API_KEY, index_name=config.PINECONE_INDEX_NAME,
+                 dimension=config.EMBEDDING_DIM, create=False, cloud="aws", region="us-east-1"):
+        from pinecone import Pinecone, ServerlessSpec
+
+        self.pc = Pinecone(api_key=api_key)
+        if create and index_name not in self.pc.list_indexes().names():
+            print(f"Creating Pinecone index: {index_name} (dim={dimension})")
+            self.pc.create_index(
+                name=index_name,
+                dimension=dimension,
+                metric="cosine",
+                spec=ServerlessSpec(cloud=cloud, region=region)
+            )
+            # Give Pinecone a moment
+            time.sleep(5)
+        self.index = self.pc.Index(index_name)
+
+    def upsert(self, vectors):
+        self.index.upsert(vectors=vectors)
+
+    def query(self, vector, top_k, include_metadata=True):
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata)
+
+    def query_many(self, vectors, top_k, include_metadata=True):
+        # Pinecone has no multi-vector query: issue the requests concurrently instead of in series
+        if len(vectors) <= 1:
+            return super().query_many(vectors, top_k, include_metadata=include_metadata)
+        with ThreadPoolExecutor(max_workers=min(len(vectors), config.PINECONE_MAX_CONCURRENCY)) as pool:
+            return list(pool.map(lambda v: self.query(v, top_k, include_metadata=include_metadata), vectors))
+
+
+def _normalize_rows(mat):
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def _kmeans(data, k, n_iter=10, seed=42):
+    """Plain spherical k-means (rows of data are unit vectors)."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        for c in range(k):
+            members = data[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = _normalize_rows(centroids)
+    return centroids, np.argmax(data @ centroids.T, axis=1)
+
+
+class LocalVectorStore(VectorStore):
+    def __init__(self, path=config.LOCAL_INDEX_DIR, dimension=config.EMBEDDING_DIM,
+                 mode=config.LOCAL_INDEX_MODE, nlist=config.IVF_NLIST, nprobe=config.IVF_NPROBE,
+                 hnsw_m=config.HNSW_M):
+        if mode not in ("flat", "ivf", "hnsw"):
+            raise ValueError(f"Unknown local index mode: {mode}")
+        self.path = path
+        self.dimension = dimension
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self._lock = threading.Lock()
+        self._pending = {}
+        # (vectors, ids, metadata, ann) swapped as one tuple on flush / reload
+        self._state = (np.zeros((0, dimension), dtype=np.float32), [], [], None)
+        self._version = None
+        self._load()
+
+    # ---------- persistence ----------
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _ann_name(self):
+        return {"ivf": "ivf.npz", "hnsw": "hnsw.faiss"}.get(self.mode)
+
+    def _file_version(self):
+        """(mtime, size) of the index files; changes when any process re-indexes."""
+        names = ["vectors.npy", "metadata.json"] + ([self._ann_name()] if self._ann_name() else [])
+        version = []
+        for name in names:
+            try:
+                st = os.stat(self._file(name))
+                version.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def _load(self):
+        version = self._file_version()
+        if not os.path.exists(self._file("vectors.npy")):
+            return
+        vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+        with open(self._file("metadata.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if len(meta["ids"]) != len(vectors):
+            return  # caught between the two renames of another process's flush: retry on the next query
+        self._state = (vectors, meta["ids"], meta["metadata"], self._load_ann(vectors))
+        self._version = version
+
+    def _refresh(self):
+        """Reload if another process (embeddings.py / ingest.py) rewrote the index files."""
+        if self._file_version() == self._version:
+            return
+        with self._lock:
+            if self._file_version() != self._version:
+                try:
+                    self._load()
+                except Exception as e:  # e.g. a file still being written: keep serving the previous index
+                    print(f"⚠️ Vector index reload failed, retrying on the next query: {e}")
+
+    def _load_ann(self, vectors):
+        # an ANN structure written for a different set of vectors (build still running) is ignored
+        if self.mode == "ivf":
+            if not os.path.exists(self._file("ivf.npz")):
+                return None
+            ivf = np.load(self._file("ivf.npz"))
+            if len(ivf["order"]) != len(vectors):
+                return None
+            return {"centroids": ivf["centroids"], "order": ivf["order"], "offsets": ivf["offsets"]}
+        if self.mode == "hnsw":
+            if not os.path.exists(self._file("hnsw.faiss")):
+                return None
+            import faiss
+            ann = faiss.read_index(self._file("hnsw.faiss"))
+            return ann if ann.ntotal == len(vectors) else None
+        return None
+
+    def _build_ann(self, vectors):
+        if self.mode == "ivf" and len(vectors):
+            nlist = min(self.nlist, len(vectors))
+            centroids, assign = _kmeans(np.asarray(vectors), nlist)
+            order = np.argsort(assign, kind="stable").astype(np.int64)
+            offsets = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+            np.savez(self._file("ivf.npz"), centroids=centroids.astype(np.float32), order=order, offsets=offsets)
+        elif self.mode == "hnsw" and len(vectors):
+            try:
+                import faiss
+            except ImportError as e:
+                raise ImportError("LOCAL_INDEX_MODE=hnsw requires faiss (pip install faiss-cpu)") from e
+            ann = faiss.IndexHNSWFlat(self.dimension, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            ann.add(np.ascontiguousarray(vectors, dtype=np.float32))
+            faiss.write_index(ann, self._file("hnsw.faiss"))
+
+    # ---------- writes ----------
+    def upsert(self, vectors):
+        with self._lock:
+            for v in vectors:
+                if isinstance(v, dict):
+                    vid, values, metadata = v["id"], v["values"], v.get("metadata", {})
+                else:
+                    vid, values, metadata = v[0], v[1], (v[2] if len(v) > 2 else {})
+                self._pending[vid] = (np.asarray(values, dtype=np.float32), metadata or {})
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            vectors, ids, metadata, _ = self._state
+            # copy out of the memory map: the backing file is about to be replaced
+            vectors = np.array(vectors)
+            rows = {vid: (vectors[i], metadata[i]) for i, vid in enumerate(ids)}
+            rows.update(self._pending)
+            self._pending = {}
+
+            new_ids = list(rows.keys())
+            new_meta = [rows[vid][1] for vid in new_ids]
+            mat = np.vstack([rows[vid][0] for vid in new_ids]).astype(np.float32)
+            if mat.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dim vectors, got {mat.shape[1]}")
+            mat = _normalize_rows(mat)
+            # serve from memory while files are rewritten (also releases the old mmap on Windows)
+            self._state = (mat, new_ids, new_meta, None)
+
+            os.makedirs(self.path, exist_ok=True)
+            # write to temp files then rename so readers never see a partial index
+            np.save(self._file("vectors.tmp.npy"), mat)
+            with open(self._file("metadata.tmp.json"), "w", encoding="utf-8") as f:
+                json.dump({"ids": new_ids, "metadata": new_meta}, f)
+            os.replace(self._file("vectors.tmp.npy"), self._file("vectors.npy"))
+            os.replace(self._file("metadata.tmp.json"), self._file("metadata.json"))
+            self._build_ann(mat)
+            self._load()
+
+    # ---------- reads ----------
+    @staticmethod
+    def _top_k(scores, top_k):
+        k = min(top_k, scores.shape[-1])
+        if k == 0:
+            return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+        top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1)
+        return np.take_along_axis(top, order, axis=-1)
+
+    def _search(self, state, queries, top_k):
+        """queries: (n_queries, dim) unit vectors -> list of (row_idx, scores) per query."""
+        vectors, _, _, ann = state
+        if self.mode == "hnsw" and ann is not None:
+            scores, idx = ann.search(np.ascontiguousarray(queries, dtype=np.float32), top_k)
+            return [(i[i >= 0], s[i >= 0]) for i, s in zip(idx, scores)]
+
+        if self.mode == "ivf" and ann is not None:
+            offsets, order = ann["offsets"], ann["order"]
+            probes = np.argsort(-(queries @ ann["centroids"].T), axis=1)[:, :self.nprobe]
+            out = []
+            for q, q_probes in zip(queries, probes):
+                candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in q_probes])
+                scores = np.asarray(vectors[candidates]) @ q
+                top = self._top_k(scores, top_k)
+                out.append((candidates[top], scores[top]))
+            return out
+
+        # exact search: every query scored against the whole matrix in one matmul
+        scores = queries @ np.asarray(vectors).T
+        top = self._top_k(scores, top_k)
+        return [(t, s[t]) for t, s in zip(top, scores)]
+
+    def _to_response(self, state, idx, scores, include_metadata):
+        _, ids, metadata, _ = state
+        matches = []
+        for i, s in zip(idx, scores):
+            m = {"id": ids[i], "score": float(s)}
+            if include_metadata:
+                m["metadata"] = metadata[i]
+            matches.append(m)
+        return {"matches": matches}
+
+    def query_many(self, vectors, top_k, include_metadata=True):
+        queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        queries = _normalize_rows(queries)
+        self._refresh()
+        state = self._state   # one snapshot for search + metadata, even if a reload swaps it meanwhile
+        return [self._to_response(state, idx, scores, include_metadata)
+                for idx, scores in self._search(state, queries, top_k)]
+
+    def query(self, vector, top_k, include_metadata=True):
+        return self.query_many([vector], top_k, include_metadata=include_metadata)[0]
+
+
+def get_vector_store(backend=config.VECTOR_BACKEND, create=False, **kwargs):
+    """Build the configured vector store. `create` only applies to Pinecone (create index if missing)."""
+    if backend == "local":
+        return LocalVectorStore(**kwargs)
+    if backend == "pinecone":
+        return PineconeVectorStore(create=create, **kwargs)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")